@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+benchmarks/payload_encoding
+
+Measures payload encoding throughput of each installed json encoder for typical `Alert` payloads.
+
+Run with::
+
+    python benchmarks/payload_encoding.py
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import timeit
+
+from jwt_apns_client.jwt_apns_client import Alert, APNSConnection
+from jwt_apns_client.utils import JSON_ENCODERS
+
+NUMBER = 100000
+
+PAYLOADS = {
+    'string alert': dict(alert='Your order has shipped!', badge=1),
+    'alert': dict(alert=Alert(title='Order update', body='Your order 12345 has shipped and will arrive Tuesday.'),
+                  badge=3, sound='default', category='ORDER_UPDATE', thread='orders'),
+    'localized alert': dict(alert=Alert(title_loc_key='ORDER_TITLE', loc_key='ORDER_SHIPPED',
+                                        loc_args=['Jane', '12345', 'Tuesday'], action_loc_key='VIEW',
+                                        launch_image='order.png'),
+                            badge=1, sound='default'),
+}
+
+
+def main():
+    for encoder_name, encoder in JSON_ENCODERS:
+        if encoder is None:
+            print('%-8s not installed' % encoder_name)
+            continue
+        connection = APNSConnection(json_encoder=encoder)
+        for payload_name, kwargs in sorted(PAYLOADS.items()):
+            seconds = timeit.timeit(lambda: connection.get_request_payload(**kwargs), number=NUMBER)
+            size = len(connection.get_request_payload(**kwargs))
+            print('%-8s %-16s %10.0f payloads/s %5d bytes' % (encoder_name, payload_name, NUMBER / seconds, size))
+
+
+if __name__ == '__main__':
+    main()
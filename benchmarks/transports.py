@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+benchmarks/transports
+
+Compares notification throughput of each transport against a local plaintext HTTP/2 server standing in for
+APNs.  The numbers include the stand-in server's own overhead, so they are only useful relative to each other.
+
+Run from the repository root with::
+
+    python benchmarks/transports.py
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import sys
+import time
+
+from jwt_apns_client.jwt_apns_client import APNSConnection
+from jwt_apns_client.transports import H2Transport, HyperTransport
+from tests.h2server import H2TestServer
+
+NOTIFICATIONS = 5000
+IN_FLIGHT = 100
+
+
+def make_connection(server, transport):
+    return APNSConnection(api_host=server.host, api_port=server.port, secure=False, provider_token=b'token',
+                          topic='com.example.app', transport=transport)
+
+
+def run_blocking(server, transport):
+    connection = make_connection(server, transport)
+    for start in range(0, NOTIFICATIONS, IN_FLIGHT):
+        pending = [connection.request_notification('token%d' % i, alert='Benchmark')
+                   for i in range(start, min(start + IN_FLIGHT, NOTIFICATIONS))]
+        for p in pending:
+            connection.get_notification_response(p)
+    connection.close()
+
+
+def run_asyncio(server):
+    # Imported here, and written without async syntax, so that this script still runs before Python 3.5.
+    import asyncio
+    from jwt_apns_client.aio import AsyncAPNSConnection
+
+    connection = AsyncAPNSConnection(make_connection(server, None))
+    loop = asyncio.new_event_loop()
+    for start in range(0, NOTIFICATIONS, IN_FLIGHT):
+        tasks = [loop.create_task(connection.send_notification('token%d' % i, alert='Benchmark'))
+                 for i in range(start, min(start + IN_FLIGHT, NOTIFICATIONS))]
+        loop.run_until_complete(asyncio.gather(*tasks))
+    loop.run_until_complete(connection.close())
+    loop.close()
+
+
+def main():
+    runs = [
+        ('hyper', lambda server: run_blocking(server, HyperTransport(thread_safe=True))),
+        ('h2', lambda server: run_blocking(server, H2Transport())),
+    ]
+    if sys.version_info >= (3, 5):
+        runs.append(('asyncio', run_asyncio))
+
+    for name, run in runs:
+        with H2TestServer() as server:
+            started = time.time()
+            run(server)
+            seconds = time.time() - started
+        print('%-8s %10.0f notifications/s' % (name, NOTIFICATIONS / seconds))
+
+
+if __name__ == '__main__':
+    main()
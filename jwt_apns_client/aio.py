@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/aio
+
+asyncio HTTP/2 transport and client.  Requires Python 3.5 or later.
+
+Requests are built and responses are parsed by an :class:`jwt_apns_client.jwt_apns_client.APNSConnection`, so
+payloads, headers and provider tokens work exactly as they do for the blocking client.
+"""
+import asyncio
+
+import h2.events
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+
+from .exceptions import ConnectionClosedError, StreamResetError
+from .transports import H2Response, make_ssl_context
+from .utils import APNSReasons
+
+
+class AsyncioTransport(object):
+    """
+    Makes :class:`AsyncH2Connection` connections
+
+    :ivar ssl_context: The :class:`ssl.SSLContext` for TLS connections.  A default context negotiating h2 is
+        used if not set.
+    """
+
+    def __init__(self, ssl_context=None, *args, **kwargs):
+        super(AsyncioTransport, self).__init__(*args, **kwargs)
+        self.ssl_context = ssl_context
+
+    async def make_connection(self, host, port, secure=True):
+        """
+        :returns: A connected :class:`AsyncH2Connection`
+        """
+        conn = AsyncH2Connection(host, port, secure=secure, ssl_context=self.ssl_context)
+        await conn.connect()
+        return conn
+
+
+class AsyncH2Connection(object):
+    """
+    An HTTP/2 client connection using h2 over asyncio streams.  Any number of coroutines may have requests in
+    flight at once, each on its own stream.  A background task reads from the connection and resolves the response
+    for each stream.
+
+    :ivar str host: The host to connect to
+    :ivar int port: The port to connect to
+    :ivar bool secure: Whether to use TLS
+    """
+
+    def __init__(self, host, port=443, secure=True, ssl_context=None, *args, **kwargs):
+        super(AsyncH2Connection, self).__init__(*args, **kwargs)
+        self.host = host
+        self.port = port
+        self.secure = secure
+        self.ssl_context = ssl_context
+        self._conn = None
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._streams = {}
+        self._window_updated = asyncio.Event()
+
+    async def connect(self):
+        if self.secure:
+            reader, writer = await asyncio.open_connection(self.host, self.port,
+                                                           ssl=self.ssl_context or make_ssl_context(),
+                                                           server_hostname=self.host)
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        conn = H2Connection(config=H2Configuration(client_side=True, header_encoding='utf-8'))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        self._reader, self._writer, self._conn = reader, writer, conn
+        self._read_task = asyncio.ensure_future(self._read_loop())
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    async def request(self, method, url, body=None, headers=None):
+        """
+        Send a request.
+
+        :returns: The stream id of the request
+        """
+        conn = self._check_connection()
+        request_headers = [
+            (':method', method),
+            (':scheme', 'https' if self.secure else 'http'),
+            (':authority', self.host),
+            (':path', url),
+        ]
+        request_headers.extend((headers or {}).items())
+        if body:
+            request_headers.append(('content-length', '%d' % len(body)))
+
+        stream_id = conn.get_next_available_stream_id()
+        self._streams[stream_id] = asyncio.get_event_loop().create_future()
+        conn.send_headers(stream_id, request_headers, end_stream=not body)
+        self._writer.write(conn.data_to_send())
+
+        while body:
+            conn = self._check_connection()
+            window = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size)
+            if window <= 0:
+                self._window_updated.clear()
+                await self._window_updated.wait()
+                continue
+            chunk, body = body[:window], body[window:]
+            conn.send_data(stream_id, chunk, end_stream=not body)
+            self._writer.write(conn.data_to_send())
+        await self._writer.drain()
+        return stream_id
+
+    async def get_response(self, stream_id):
+        """
+        Wait for the response to a request.
+
+        :returns: A :class:`jwt_apns_client.transports.H2Response`
+        """
+        try:
+            return await self._streams[stream_id]
+        finally:
+            self._streams.pop(stream_id, None)
+
+    def _check_connection(self):
+        if self._conn is None:
+            raise ConnectionClosedError('Connection to %s:%s is closed' % (self.host, self.port))
+        return self._conn
+
+    async def _read_loop(self):
+        responses = {}
+        error = ConnectionClosedError('Connection to %s:%s closed by server' % (self.host, self.port))
+        try:
+            while True:
+                data = await self._reader.read(65535)
+                conn = self._conn
+                if not data or conn is None:
+                    break
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.ConnectionTerminated):
+                        error = ConnectionClosedError('Connection terminated by server with error code %s'
+                                                      % event.error_code)
+                        return
+                    if isinstance(event, (h2.events.WindowUpdated, h2.events.RemoteSettingsChanged)):
+                        self._window_updated.set()
+                    elif isinstance(event, h2.events.ResponseReceived):
+                        headers = dict(event.headers)
+                        responses[event.stream_id] = (int(headers[':status']), headers, [])
+                    elif isinstance(event, h2.events.DataReceived):
+                        conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                        if event.stream_id in responses:
+                            responses[event.stream_id][2].append(event.data)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        status, headers, body = responses.pop(event.stream_id)
+                        self._resolve(event.stream_id, H2Response(status, headers, b''.join(body)))
+                    elif isinstance(event, h2.events.StreamReset):
+                        responses.pop(event.stream_id, None)
+                        self._resolve(event.stream_id, StreamResetError(
+                            'Stream %d reset with error code %s' % (event.stream_id, event.error_code)))
+                self._writer.write(conn.data_to_send())
+        except (OSError, asyncio.IncompleteReadError) as e:
+            error = e
+        finally:
+            self._shutdown(error)
+
+    def _resolve(self, stream_id, result):
+        future = self._streams.get(stream_id)
+        if future is None or future.done():
+            return
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def _shutdown(self, error):
+        self._conn = None
+        self._window_updated.set()
+        for stream_id in list(self._streams):
+            self._resolve(stream_id, error)
+        if self._writer is not None:
+            self._writer.close()
+
+    async def close(self, error_code=None):
+        """
+        Close the connection.  Requests still waiting for a response fail with
+        :class:`jwt_apns_client.exceptions.ConnectionClosedError`.
+        """
+        if self._conn is not None:
+            self._conn.close_connection(error_code=error_code or 0)
+            self._writer.write(self._conn.data_to_send())
+        self._shutdown(ConnectionClosedError('Connection to %s:%s is closed' % (self.host, self.port)))
+        if self._read_task is not None:
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+
+
+class AsyncAPNSConnection(object):
+    """
+    Sends notifications from asyncio code.
+
+    :ivar apns_connection: The :class:`jwt_apns_client.jwt_apns_client.APNSConnection` which builds requests and
+        parses responses.  Its host, port, and `secure` settings are used for the connection.
+    :ivar transport: Makes the connection.  Defaults to an :class:`AsyncioTransport`.
+    """
+
+    def __init__(self, apns_connection, transport=None, *args, **kwargs):
+        super(AsyncAPNSConnection, self).__init__(*args, **kwargs)
+        self.apns_connection = apns_connection
+        self.transport = transport or AsyncioTransport()
+        self._conn = None
+        self._conn_lock = asyncio.Lock()
+
+    async def get_connection(self):
+        """
+        The HTTP/2 connection to APNs.  The connection is created on first use and reused until closed.
+        """
+        if self._conn is None or self._conn.closed:
+            async with self._conn_lock:
+                if self._conn is None or self._conn.closed:
+                    apns = self.apns_connection
+                    self._conn = await self.transport.make_connection(apns.api_host, apns.api_port,
+                                                                      secure=apns.secure)
+        return self._conn
+
+    async def send_notification(self, device_registration_id, **kwargs):
+        """
+        Send a push notification.
+
+        Takes the same params as :meth:`jwt_apns_client.jwt_apns_client.APNSConnection.send_notification`
+
+        :returns: A :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        """
+        deduplicate = kwargs.pop('deduplicate', True)
+        # Notifications are not rate limited here, so there is nothing to skip.
+        kwargs.pop('rate_limit', None)
+        path, headers, payload = self.apns_connection.build_request(device_registration_id, **kwargs)
+        if deduplicate:
+            self.apns_connection.check_duplicate(headers)
+        try:
+            conn = await self.get_connection()
+            stream_id = await conn.request('POST', path, payload, headers=headers)
+            resp = await conn.get_response(stream_id)
+        except Exception:
+            self.apns_connection.forget_duplicate(headers)
+            raise
+        notification_response = self.apns_connection.make_notification_response(
+            resp.status, resp.read(), host=conn.host, port=conn.port, path=path, payload=payload, headers=headers,
+            device_registration_id=device_registration_id)
+        if self.apns_connection.is_retryable(notification_response):
+            self.apns_connection.forget_duplicate(headers)
+
+        if notification_response.reason == APNSReasons.IDLE_TIMEOUT and conn is self._conn:
+            self._conn = None
+            await conn.close()
+
+        return notification_response
+
+    async def close(self, error_code=None):
+        """
+        Close the HTTP/2 connection with optional error code
+        """
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await conn.close(error_code=error_code)
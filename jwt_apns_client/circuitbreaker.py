@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/circuitbreaker
+
+Circuit breaker to fail fast while APNs is unavailable.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+
+from .exceptions import CircuitOpenError
+from .utils import monotonic
+
+
+class CircuitBreaker(object):
+    """
+    Tracks consecutive failures sending to a host and stops sending while it appears to be down.
+
+    After `failure_threshold` failures in a row the circuit opens and :meth:`before_request` raises
+    :class:`jwt_apns_client.exceptions.CircuitOpenError` immediately rather than waiting on a request to a
+    degraded host.  After `reset_timeout` seconds the circuit is half open and up to `half_open_max_calls`
+    requests are let through as probes.  A successful probe closes the circuit, a failed probe opens it again.  A
+    probe whose outcome is never recorded, such as one whose connection was closed by another thread, is treated
+    as failed once `reset_timeout` seconds have passed so that the circuit can not be left half open for good.
+
+    :ivar int failure_threshold: Consecutive failures which open the circuit
+    :ivar float reset_timeout: Seconds the circuit stays open before probing
+    :ivar int half_open_max_calls: The number of probe requests allowed at once while half open
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1, *args, **kwargs):
+        """
+        :param int failure_threshold: Consecutive failures which open the circuit.  Default is 5.
+        :param float reset_timeout: Seconds the circuit stays open before probing.  Default is 30.
+        :param int half_open_max_calls: The number of probe requests allowed at once while half open.  Default
+            is 1.
+        """
+        super(CircuitBreaker, self).__init__(*args, **kwargs)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failures = 0
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probes = 0
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        One of `CLOSED`, `OPEN` or `HALF_OPEN`
+        """
+        with self._lock:
+            return self._get_state()
+
+    def _get_state(self):
+        now = monotonic()
+        if (self._state == self.HALF_OPEN and self._probes >= self.half_open_max_calls and
+                now - self._probe_started_at >= self.reset_timeout):
+            # The probes never finished, so open the circuit again rather than waiting on them forever
+            self._state = self.OPEN
+            self._opened_at = now
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_request(self):
+        """
+        Check that a request may be made.
+
+        :raises CircuitOpenError: If the circuit is open or all half open probes are already in flight
+        """
+        if self._state == self.CLOSED:
+            return
+        with self._lock:
+            state = self._get_state()
+            if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                self._probe_started_at = monotonic()
+            elif state != self.CLOSED:
+                raise CircuitOpenError('Circuit is open after %d consecutive failures' % self.failures)
+
+    def record_success(self):
+        """
+        Record a successful request, closing the circuit
+        """
+        if self._state == self.CLOSED and not self.failures:
+            return
+        with self._lock:
+            self._reset()
+
+    def record_failure(self):
+        """
+        Record a failed request
+
+        :returns: True if this failure opened the circuit
+        """
+        with self._lock:
+            self.failures += 1
+            state = self._get_state()
+            if state == self.HALF_OPEN or (state == self.CLOSED and self.failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = monotonic()
+                return True
+            return False
+
+    def copy(self):
+        """
+        :returns: A new closed circuit breaker with the same settings, for a connection to another host
+        """
+        return self.__class__(failure_threshold=self.failure_threshold, reset_timeout=self.reset_timeout,
+                              half_open_max_calls=self.half_open_max_calls)
+
+    def reset(self):
+        """
+        Close the circuit and forget previous failures
+        """
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._state = self.CLOSED
+        self.failures = 0
+        self._opened_at = None
+        self._probes = 0
+        self._probe_started_at = None
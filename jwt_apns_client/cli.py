@@ -4,6 +4,8 @@ from __future__ import unicode_literals, absolute_import, print_function, divisi
 import click
 
 from jwt_apns_client.jwt_apns_client import APNSConnection, APNSEnvironments
+from jwt_apns_client.loadtest import run_load_test
+from jwt_apns_client.transports import H2Transport, HyperTransport
 
 click.disable_unicode_literals_warning = True
 
@@ -35,5 +37,37 @@ def send(message, device, environment, key_path, key_id, team_id, topic, *args,
     # print(notification_response.__dict__)
 
 
+@click.command()
+@click.option('--host', default='127.0.0.1', help='The host to send to, such as a local stand-in server')
+@click.option('--port', default=443, type=int, help='The port to send to')
+@click.option('--insecure', is_flag=True, help='Use plaintext HTTP/2 rather than TLS')
+@click.option('--transport', default='h2', type=click.Choice(['h2', 'hyper']), help='The HTTP/2 transport')
+@click.option('--count', default=10000, type=int, help='The number of notifications to send')
+@click.option('--rate', default=0.0, type=float, help='Target notifications per second.  0 sends as fast as possible')
+@click.option('--concurrency', default=100, type=int, help='The most notifications in flight per connection')
+@click.option('--connections', default=1, type=int, help='The number of connections to spread notifications over')
+@click.option('--payload_size', default=0, type=int, help='Pad synthetic alerts to this many characters')
+@click.option('--key_path', help='Path to the .p8 file')
+@click.option('--key_id', help='APNs Key Id')
+@click.option('--team_id', help='APNs Team Id')
+@click.option('--topic', default='com.example.loadtest', help='APNs Topic')
+def loadtest(host, port, insecure, transport, count, rate, concurrency, connections, payload_size, key_path, key_id,
+             team_id, topic, *args, **kwargs):
+    """Send synthetic notifications and report throughput, latency and CPU per message"""
+    conns = []
+    for i in range(connections):
+        conn = APNSConnection(api_host=host, api_port=port, secure=not insecure, apns_key_path=key_path,
+                              team_id=team_id, apns_key_id=key_id, topic=topic,
+                              provider_token=None if key_id else b'loadtest',
+                              transport=H2Transport() if transport == 'h2' else HyperTransport(thread_safe=True))
+        conns.append(conn)
+
+    result = run_load_test(conns, count, rate=rate or None, concurrency=concurrency, payload_size=payload_size)
+    for conn in conns:
+        conn.close()
+    for line in result.report():
+        click.echo(line)
+
+
 if __name__ == "__main__":
     send()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/concurrency
+
+Adaptive limits on the number of notifications in flight at once.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import socket
+import threading
+
+from .exceptions import ConnectionClosedError, StreamResetError
+from .utils import APNSReasons, monotonic
+
+
+class AIMDLimiter(object):
+    """
+    Adjusts the number of notifications in flight at once using additive increase, multiplicative decrease.
+
+    While latency stays close to the lowest latency seen the limit grows by roughly one for each full window of
+    successful responses.  When APNs responds with `TooManyRequests`, `ServiceUnavailable` or another overload
+    error, when a request fails with a connection error, or when latency rises above `latency_tolerance` times the
+    baseline, the limit is multiplied by `backoff_ratio`.  Backing off happens at most once per round trip so that
+    a whole batch of errors from the same overload only counts once.
+
+    :ivar int limit: The current limit
+    :ivar int min_limit: The limit never goes below this
+    :ivar int max_limit: The limit never goes above this
+    :ivar float backoff_ratio: The limit is multiplied by this when backing off
+    :ivar float latency_tolerance: Latency more than this multiple of the baseline latency causes a back off
+    :ivar float baseline_latency: The baseline latency in seconds.  The lowest latency seen, drifting up slowly
+        towards recent latencies so that the limiter adapts if the network path changes.
+    """
+    BACKOFF_STATUSES = (429, 500, 502, 503)
+    BACKOFF_REASONS = (
+        APNSReasons.TOO_MANY_REQUESTS,
+        APNSReasons.INTERNAL_SERVER_ERROR,
+        APNSReasons.SERVICE_UNAVAILABLE,
+        APNSReasons.SHUTDOWN,
+    )
+    # Exceptions which mean the connection or APNs failed.  Others, such as a duplicate notification or an open
+    # circuit, are decided by the client and say nothing about load.
+    BACKOFF_ERRORS = (socket.error, IOError, ConnectionClosedError, StreamResetError)
+    BASELINE_DRIFT = 0.01
+
+    def __init__(self, initial_limit=10, min_limit=1, max_limit=1000, backoff_ratio=0.5, latency_tolerance=2.0,
+                 *args, **kwargs):
+        """
+        :param int initial_limit: The starting limit.  Default is 10.
+        :param int min_limit: The lowest limit.  Default is 1.
+        :param int max_limit: The highest limit.  Default is 1000.
+        :param float backoff_ratio: The limit is multiplied by this when backing off.  Default is 0.5.
+        :param float latency_tolerance: Latency more than this multiple of the baseline latency causes a back off.
+            Default is 2.0.
+        """
+        super(AIMDLimiter, self).__init__(*args, **kwargs)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.baseline_latency = None
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._last_latency = 0
+        self._last_backoff = None
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def is_overloaded(self, response):
+        """
+        Whether a response indicates APNs wants us to slow down
+        """
+        return response.status in self.BACKOFF_STATUSES or response.reason in self.BACKOFF_REASONS
+
+    def is_overload_error(self, error):
+        """
+        Whether an exception raised while sending a notification should cause a back off
+        """
+        return isinstance(error, self.BACKOFF_ERRORS)
+
+    def on_response(self, latency, response):
+        """
+        Update the limit from a response.
+
+        :param float latency: Seconds between sending the request and reading the response
+        :param response: The :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        """
+        with self._lock:
+            self._last_latency = latency
+            if self.is_overloaded(response):
+                self._backoff()
+                return
+
+            if self.baseline_latency is None or latency < self.baseline_latency:
+                self.baseline_latency = latency
+            else:
+                self.baseline_latency += (latency - self.baseline_latency) * self.BASELINE_DRIFT
+
+            if latency > self.baseline_latency * self.latency_tolerance:
+                self._backoff()
+            else:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+    def on_error(self, latency=None):
+        """
+        Back off after a request failed without a response, such as a connection error.
+
+        :param float latency: Seconds between sending the request and the failure, if known
+        """
+        with self._lock:
+            if latency is not None:
+                self._last_latency = latency
+            self._backoff()
+
+    def _backoff(self):
+        now = monotonic()
+        if self._last_backoff is not None and now - self._last_backoff < self._last_latency:
+            return
+        self._last_backoff = now
+        self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
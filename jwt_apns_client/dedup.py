@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/dedup
+
+Drop notifications whose apns-id has already been sent recently.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+from collections import OrderedDict
+
+from .utils import monotonic
+
+
+class DedupCache(object):
+    """
+    Remembers the apns-id of each notification sent for `ttl` seconds so that repeats can be dropped.
+
+    At most `max_size` ids are remembered.  Ids are expired oldest first, and when the cache is full the oldest id
+    is forgotten early to make room, so memory use is fixed no matter how many notifications are sent.
+
+    :ivar float ttl: Seconds an id is remembered for
+    :ivar int max_size: The most ids remembered at once
+    """
+
+    def __init__(self, ttl=300, max_size=100000, clock=None, *args, **kwargs):
+        """
+        :param float ttl: Seconds an id is remembered for.  Default is 300.
+        :param int max_size: The most ids remembered at once.  Default is 100000.
+        :param clock: Function returning the current time in seconds.  Defaults to
+            :func:`jwt_apns_client.utils.monotonic`.
+        """
+        super(DedupCache, self).__init__(*args, **kwargs)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock or monotonic
+        # apns-id to expiry time.  Ids are added in time order, so the oldest is always first.
+        self._expires = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._expire(self.clock())
+            return len(self._expires)
+
+    def __contains__(self, apns_id):
+        with self._lock:
+            self._expire(self.clock())
+            return apns_id in self._expires
+
+    def add(self, apns_id):
+        """
+        Remember an id unless it is already remembered
+
+        :returns: True if the id was added, False if it is a repeat
+        """
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            if apns_id in self._expires:
+                return False
+            self._expires[apns_id] = now + self.ttl
+            if len(self._expires) > self.max_size:
+                self._expires.popitem(last=False)
+            return True
+
+    def discard(self, apns_id):
+        """
+        Forget an id, such as when the notification it was added for failed to send and may be retried
+        """
+        with self._lock:
+            self._expires.pop(apns_id, None)
+
+    def _expire(self, now):
+        expires = self._expires
+        while expires:
+            apns_id = next(iter(expires))
+            if expires[apns_id] > now:
+                break
+            del expires[apns_id]
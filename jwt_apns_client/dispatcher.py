@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/dispatcher
+
+Send notifications in the background and get the responses as futures.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import functools
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .exceptions import QueueFullError
+from .summary import OutcomeSummary
+from .utils import monotonic
+
+logger = logging.getLogger(__name__)
+
+# Queued to tell the I/O thread to stop once everything queued before it has been sent.
+_STOP = object()
+
+
+class Dispatcher(object):
+    """
+    Sends notifications using an :class:`jwt_apns_client.jwt_apns_client.APNSConnection` from a background I/O
+    thread.
+
+    :meth:`submit` queues a notification and returns a :class:`concurrent.futures.Future` immediately.  The I/O
+    thread takes queued notifications in batches, sends every notification in a batch as a separate HTTP/2 stream
+    and then reads their responses, so that many notifications are in flight at once.
+
+    The queue is bounded so that memory use stays bounded when notifications are submitted faster than they can be
+    sent.  When it is full :meth:`submit` blocks or raises :class:`jwt_apns_client.exceptions.QueueFullError`.
+
+    If the connection has a `rate_limiter`, notifications over its limits are set aside until they may be sent
+    rather than delaying the rest of the batch, and the I/O thread only waits on the limiter between batches.
+
+    If the connection is also used outside of the dispatcher it should be created with ``thread_safe=True``.
+
+    :ivar connection: The :class:`jwt_apns_client.jwt_apns_client.APNSConnection` to send notifications with
+    :ivar int max_queue_size: The maximum number of notifications waiting to be sent
+    :ivar int batch_size: The maximum number of notifications in flight at once
+    :ivar bool block: If True then :meth:`submit` waits for room in the queue when it is full, otherwise it raises
+        :class:`jwt_apns_client.exceptions.QueueFullError`
+    :ivar float timeout: Seconds for :meth:`submit` to wait for room in the queue before raising
+        :class:`jwt_apns_client.exceptions.QueueFullError`.  None waits forever.
+    :ivar limiter: Optional :class:`jwt_apns_client.concurrency.AIMDLimiter` which adjusts the number of
+        notifications in flight at once from response latency and errors.  Replaces `batch_size` when set.
+    :ivar result_sink: Optional :class:`jwt_apns_client.sinks.BatchingSink` which every response is added to
+    :ivar int result_sink_errors: The number of responses which could not be added to `result_sink`.  Errors are
+        logged and do not affect sending.
+    """
+
+    def __init__(self, connection, max_queue_size=1000, batch_size=100, block=True, timeout=None, limiter=None,
+                 result_sink=None, *args, **kwargs):
+        """
+        :param connection: The :class:`jwt_apns_client.jwt_apns_client.APNSConnection` to send notifications with
+        :param int max_queue_size: The maximum number of notifications waiting to be sent.  Default is 1000.
+        :param int batch_size: The maximum number of notifications in flight at once.  Default is 100.
+        :param bool block: Whether :meth:`submit` waits for room in a full queue.  Default is True.
+        :param float timeout: Seconds for :meth:`submit` to wait for room in a full queue.  Default is None, which
+            waits forever.
+        :param limiter: A :class:`jwt_apns_client.concurrency.AIMDLimiter` to adjust the number of notifications
+            in flight at once.  Default is None, which always uses `batch_size`.
+        :param result_sink: A :class:`jwt_apns_client.sinks.BatchingSink` to persist responses to.  Default is
+            None.
+        """
+        super(Dispatcher, self).__init__(*args, **kwargs)
+        self.connection = connection
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.block = block
+        self.timeout = timeout
+        self.limiter = limiter
+        self.result_sink = result_sink
+        self.result_sink_errors = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        # Heap of (time they may be sent, sequence, item) for notifications held back by the rate limiter.  Only
+        # used by the I/O thread.
+        self._deferred = []
+        self._sequence = itertools.count()
+        self._thread = None
+        self._shutdown = False
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown(wait=True)
+        return False
+
+    def submit(self, device_registration_id, **kwargs):
+        """
+        Queue a notification to be sent.
+
+        Takes the same params as :meth:`jwt_apns_client.jwt_apns_client.APNSConnection.send_notification`
+
+        :returns: A :class:`concurrent.futures.Future` which resolves to a
+            :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        :raises QueueFullError: If the queue is full and ``block`` is False or ``timeout`` expires
+        """
+        self._start()
+
+        future = Future()
+        # Checked and queued under the lock so that a notification can not be queued behind the stop marker put
+        # by shutdown(), where it would never be sent.
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot submit notifications after shutdown')
+            try:
+                self._queue.put((future, device_registration_id, kwargs), block=self.block, timeout=self.timeout)
+            except queue.Full:
+                raise QueueFullError('Notification queue is full (%d notifications)' % self.max_queue_size)
+        return future
+
+    def send_bulk(self, device_registration_ids, summary=None, **kwargs):
+        """
+        Send the same notification to many devices and wait for every response.  Responses are counted by an
+        :class:`jwt_apns_client.summary.OutcomeSummary` rather than returned, so memory use does not grow with the
+        number of devices.
+
+        Takes the same params as :meth:`jwt_apns_client.jwt_apns_client.APNSConnection.send_notification`
+
+        :param device_registration_ids: An iterable of device tokens
+        :param summary: The :class:`jwt_apns_client.summary.OutcomeSummary` to record outcomes in.  Default is
+            None, which creates a new one.
+        :returns: The :class:`jwt_apns_client.summary.OutcomeSummary`
+        """
+        if summary is None:
+            summary = OutcomeSummary()
+        done = threading.Condition()
+        pending = [0]
+
+        def on_done(device_registration_id, future):
+            summary.add_future(device_registration_id, future)
+            with done:
+                pending[0] -= 1
+                done.notify_all()
+
+        for device_registration_id in device_registration_ids:
+            future = self.submit(device_registration_id, **kwargs)
+            with done:
+                pending[0] += 1
+            future.add_done_callback(functools.partial(on_done, device_registration_id))
+
+        with done:
+            while pending[0] > 0:
+                done.wait()
+        return summary
+
+    @property
+    def concurrency(self):
+        """
+        The current maximum number of notifications in flight at once
+        """
+        if self.limiter is not None:
+            return self.limiter.limit
+        return self.batch_size
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting notifications.  Notifications which have already been submitted are still sent.
+
+        :param bool wait: If True then wait for all submitted notifications to be sent before returning.
+        """
+        with self._lock:
+            if self._shutdown:
+                thread = None
+            else:
+                self._shutdown = True
+                thread = self._thread
+                if thread is not None:
+                    self._queue.put(_STOP)
+        if wait and thread is not None:
+            thread.join()
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None and not self._shutdown:
+                    self._thread = threading.Thread(target=self._run, name='jwt-apns-dispatcher')
+                    self._thread.daemon = True
+                    self._thread.start()
+
+    def _get_batch(self):
+        """
+        Wait for a notification and then take as many more as are queued, up to `concurrency`.  Notifications held
+        back by the rate limiter are taken first once they may be sent.
+        """
+        batch_size = self.concurrency
+        while True:
+            batch = self._pop_deferred(batch_size)
+            if batch:
+                break
+            # Stop taking new notifications while too many are held back, so memory stays bounded.
+            if len(self._deferred) >= self.max_queue_size:
+                time.sleep(self._deferred_timeout())
+                continue
+            try:
+                batch = [self._queue.get(timeout=self._deferred_timeout())]
+                break
+            except queue.Empty:
+                pass
+        while len(batch) < batch_size and batch[-1] is not _STOP and len(self._deferred) < self.max_queue_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _defer(self, delay, item):
+        heapq.heappush(self._deferred, (monotonic() + delay, next(self._sequence), item))
+
+    def _deferred_timeout(self):
+        """
+        :returns: Seconds until the next held back notification may be sent, or None if there are none
+        """
+        if not self._deferred:
+            return None
+        return max(0, self._deferred[0][0] - monotonic())
+
+    def _pop_deferred(self, batch_size):
+        """
+        Take up to `batch_size` held back notifications which may now be sent
+        """
+        batch = []
+        now = monotonic()
+        while self._deferred and self._deferred[0][0] <= now and len(batch) < batch_size:
+            batch.append(heapq.heappop(self._deferred)[2])
+        return batch
+
+    def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = self._get_batch()
+                stop = batch[-1] is _STOP
+                if stop:
+                    batch.pop()
+                self._send_batch(batch)
+                if stop:
+                    break
+            # Nothing more can be submitted, so wait for the rest of the held back notifications.
+            while self._deferred:
+                time.sleep(self._deferred_timeout())
+                batch = self._pop_deferred(self.concurrency)
+                self._send_batch(batch)
+        except Exception as e:
+            logger.error('Notification dispatcher stopped after an error', exc_info=True)
+            self._abandon(e, batch)
+
+    def _abandon(self, error, batch):
+        """
+        Fail every notification which will not be sent now that the I/O thread has stopped, and stop accepting new
+        ones
+        """
+        self._shutdown = True
+        items = list(batch) + [entry[2] for entry in self._deferred]
+        self._deferred = []
+        self._fail(items, error)
+        # Drain the queue, then drain it again under the lock in case a submit was waiting for room.
+        self._fail(self._drain_queue(), error)
+        with self._lock:
+            self._fail(self._drain_queue(), error)
+
+    def _drain_queue(self):
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not _STOP:
+                items.append(item)
+
+    def _fail(self, items, error):
+        for future, device_registration_id, kwargs in items:
+            if not future.done():
+                future.set_exception(error)
+
+    def _send_batch(self, batch):
+        """
+        Send every notification in the batch and then read all of the responses
+        """
+        limiter = self.limiter
+        result_sink = self.result_sink
+        rate_limiter = getattr(self.connection, 'rate_limiter', None)
+        pending = []
+        for future, device_registration_id, kwargs in batch:
+            if rate_limiter is not None and kwargs.get('rate_limit', True):
+                if future.cancelled():
+                    continue
+                topic = kwargs.get('topic') or self.connection.topic
+                # The notification is reserved either way, so it is sent without waiting on the limiter again.
+                kwargs = dict(kwargs, rate_limit=False)
+                delay = rate_limiter.reserve(topic, device_registration_id)
+                if delay > 0:
+                    self._defer(delay, (future, device_registration_id, kwargs))
+                    continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            # Taken once the rate limiter has let the notification through, so that only the request is timed.
+            started = monotonic()
+            try:
+                pending.append((future, started,
+                                self.connection.request_notification(device_registration_id, **kwargs)))
+            except Exception as e:
+                if limiter is not None and limiter.is_overload_error(e):
+                    limiter.on_error(monotonic() - started)
+                future.set_exception(e)
+
+        for future, started, pending_notification in pending:
+            try:
+                response = self.connection.get_notification_response(pending_notification)
+            except Exception as e:
+                if limiter is not None and limiter.is_overload_error(e):
+                    limiter.on_error(monotonic() - started)
+                future.set_exception(e)
+            else:
+                if limiter is not None:
+                    limiter.on_response(monotonic() - started, response)
+                future.set_result(response)
+                if result_sink is not None:
+                    try:
+                        result_sink.add(response)
+                    except Exception:
+                        self.result_sink_errors += 1
+                        logger.error('Error adding a notification response to the result sink', exc_info=True)
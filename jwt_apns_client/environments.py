@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/environments
+
+Send to a mix of production and development device tokens, learning which environment each token belongs to.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+from collections import OrderedDict
+
+from .jwt_apns_client import APNSConnection, APNSEnvironments
+from .utils import APNSReasons
+
+
+class EnvironmentCache(object):
+    """
+    Remembers which :class:`jwt_apns_client.jwt_apns_client.APNSEnvironments` value each device token belongs to.
+
+    By default the most recently used `max_size` tokens are kept in memory.  To remember environments between runs
+    pass a persistent mapping as `store`, such as a :mod:`shelve` or :mod:`dbm` file.  The store is used as is and
+    is not bounded by `max_size`.
+
+    :ivar int max_size: The most tokens kept in memory
+    :ivar store: The mapping of device token to environment
+    """
+
+    def __init__(self, max_size=100000, store=None, *args, **kwargs):
+        """
+        :param int max_size: The most tokens kept in memory when no `store` is given.  Default is 100000.
+        :param store: A persistent mapping of device token to environment.  Default is None, which keeps tokens in
+            memory.
+        """
+        super(EnvironmentCache, self).__init__(*args, **kwargs)
+        self.max_size = max_size
+        self.store = store
+        self._lru = OrderedDict() if store is None else None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._lru if self.store is None else self.store)
+
+    def get(self, device_registration_id):
+        """
+        :returns: The environment of the device token or None if it is not known
+        """
+        with self._lock:
+            if self.store is not None:
+                environment = self.store.get(device_registration_id)
+                if isinstance(environment, bytes):
+                    environment = environment.decode('ascii')
+                return environment
+            environment = self._lru.pop(device_registration_id, None)
+            if environment is not None:
+                self._lru[device_registration_id] = environment
+            return environment
+
+    def set(self, device_registration_id, environment):
+        """
+        Remember the environment of a device token
+        """
+        with self._lock:
+            if self.store is not None:
+                self.store[device_registration_id] = environment
+                return
+            self._lru.pop(device_registration_id, None)
+            self._lru[device_registration_id] = environment
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+
+class AutoPendingNotification(object):
+    """
+    A notification sent by an :class:`AutoEnvironmentConnection` whose response has not been read yet.
+
+    :ivar pending_notification: The :class:`jwt_apns_client.jwt_apns_client.PendingNotification`
+    :ivar str environment: The environment the notification was sent to
+    :ivar dict notification_kwargs: The notification params, used to resend the notification to the other
+        environment
+    """
+
+    def __init__(self, pending_notification, environment, notification_kwargs=None, *args, **kwargs):
+        super(AutoPendingNotification, self).__init__(*args, **kwargs)
+        self.pending_notification = pending_notification
+        self.environment = environment
+        self.notification_kwargs = notification_kwargs or {}
+
+    @property
+    def device_registration_id(self):
+        return self.pending_notification.device_registration_id
+
+
+class AutoEnvironmentConnection(object):
+    """
+    Sends notifications to a mix of production and development device tokens.
+
+    Connections to both :data:`jwt_apns_client.jwt_apns_client.PROD_API_HOST` and
+    :data:`jwt_apns_client.jwt_apns_client.DEV_API_HOST` are held.  A token is first sent to the environment
+    remembered for it in `environment_cache`, or to `default_environment`.  If APNs responds with
+    :attr:`jwt_apns_client.utils.APNSReasons.BAD_DEVICE_TOKEN` the notification is sent once more to the other
+    environment, and if that succeeds the token's environment is remembered so that later notifications go
+    straight to the right host.
+
+    Has the same sending methods as :class:`jwt_apns_client.jwt_apns_client.APNSConnection`, so it may be used
+    with a :class:`jwt_apns_client.dispatcher.Dispatcher`.
+
+    :ivar connections: dict of :class:`jwt_apns_client.jwt_apns_client.APNSEnvironments` value to
+        :class:`jwt_apns_client.jwt_apns_client.APNSConnection`
+    :ivar environment_cache: The :class:`EnvironmentCache`
+    :ivar str default_environment: The environment to send tokens which are not in the cache to
+    """
+
+    def __init__(self, environment_cache=None, default_environment=APNSEnvironments.PROD, **kwargs):
+        """
+        Takes the same keyword params as :class:`jwt_apns_client.jwt_apns_client.APNSConnection` except for
+        `environment` and `api_host`.  The `circuit_breaker` is used for production and a copy of it for
+        development.  The `dedup_cache`, `rate_limiter`, `token_store`, `tracer` and `transport` are shared by both
+        connections, so a notification is deduplicated and rate limited whichever environment it goes to.
+
+        :param environment_cache: An :class:`EnvironmentCache`.  Default is None, which creates one.
+        :param str default_environment: The environment to send tokens which are not in the cache to.  Default is
+            production.
+        """
+        self.environment_cache = environment_cache if environment_cache is not None else EnvironmentCache()
+        self.default_environment = default_environment
+        prod = APNSConnection(environment=APNSEnvironments.PROD, **kwargs)
+        # Both environments accept the same provider token.  With a token store each connection gets it from the
+        # store so that both refresh it when it expires.
+        if kwargs.get('token_store') is None:
+            kwargs.setdefault('provider_token', prod.provider_token)
+        # Each host fails independently, so each gets its own circuit.
+        if kwargs.get('circuit_breaker') is not None:
+            kwargs['circuit_breaker'] = kwargs['circuit_breaker'].copy()
+        dev = APNSConnection(environment=APNSEnvironments.DEV, **kwargs)
+        self.connections = {APNSEnvironments.PROD: prod, APNSEnvironments.DEV: dev}
+        super(AutoEnvironmentConnection, self).__init__()
+
+    def get_environment(self, device_registration_id):
+        """
+        :returns: The environment a notification to the device token will be sent to first
+        """
+        return self.environment_cache.get(device_registration_id) or self.default_environment
+
+    def send_notification(self, device_registration_id, **kwargs):
+        """
+        Send a push notification to the device token's environment, retrying once on the other environment if the
+        token is not valid for the first.
+
+        Takes the same params as :meth:`jwt_apns_client.jwt_apns_client.APNSConnection.send_notification`
+
+        :returns: A :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        """
+        return self.get_notification_response(self.request_notification(device_registration_id, **kwargs))
+
+    def request_notification(self, device_registration_id, **kwargs):
+        """
+        Send the request for a push notification without waiting for the response.
+
+        :returns: An :class:`AutoPendingNotification`
+        """
+        environment = self.get_environment(device_registration_id)
+        pending = self.connections[environment].request_notification(device_registration_id, **kwargs)
+        return AutoPendingNotification(pending, environment, kwargs)
+
+    def get_notification_response(self, pending_notification):
+        """
+        Wait for and read the response to a notification sent with :meth:`request_notification`.  If the device
+        token was not valid for the environment it was sent to then it is sent to the other environment and that
+        response is returned.
+
+        :param pending_notification: An :class:`AutoPendingNotification`
+        :returns: A :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        """
+        environment = pending_notification.environment
+        response = self.connections[environment].get_notification_response(pending_notification.pending_notification)
+        if response.reason != APNSReasons.BAD_DEVICE_TOKEN:
+            return response
+
+        other = APNSEnvironments.DEV if environment == APNSEnvironments.PROD else APNSEnvironments.PROD
+        device_registration_id = pending_notification.device_registration_id
+        # Resend under the apns-id of the first attempt, which was already checked against the dedup cache, so that
+        # a generated id is not replaced and the retry is not rejected as a duplicate of the first attempt.
+        retry_kwargs = dict(pending_notification.notification_kwargs, deduplicate=False)
+        apns_id = (pending_notification.pending_notification.headers or {}).get('apns-id')
+        if apns_id is not None:
+            retry_kwargs['apns_id'] = apns_id
+        retry = self.connections[other].send_notification(device_registration_id, **retry_kwargs)
+        if retry.status == 200:
+            self.environment_cache.set(device_registration_id, other)
+        return retry
+
+    def close(self, error_code=None):
+        """
+        Close the HTTP/2 connections with optional error code
+        """
+        for connection in self.connections.values():
+            connection.close(error_code=error_code)
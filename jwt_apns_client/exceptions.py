@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/exceptions
+
+Exceptions raised by the client
+"""
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+
+class APNSClientError(Exception):
+    """
+    Base class for errors raised by jwt_apns_client
+    """
+
+
+class QueueFullError(APNSClientError):
+    """
+    Raised when a notification cannot be queued for sending because the queue is full
+    """
+
+
+class CircuitOpenError(APNSClientError):
+    """
+    Raised instead of sending a notification while the circuit breaker is open after repeated failures
+    """
+
+
+class ConnectionClosedError(APNSClientError):
+    """
+    Raised for requests which were waiting for a response when the connection closed
+    """
+
+
+class StreamResetError(APNSClientError):
+    """
+    Raised when the server resets a stream before responding
+    """
+
+
+class DuplicateNotificationError(APNSClientError):
+    """
+    Raised instead of sending a notification whose apns-id was already sent within the deduplication window
+    """
+
+
+class InsecureTokenStoreError(APNSClientError):
+    """
+    Raised when a token store directory could be read or replaced by another user
+    """
@@ -7,16 +7,27 @@ Client for handling HTTP/2 and JWT based connections to Apple's APNs.
 from __future__ import unicode_literals, absolute_import, print_function, division
 
 import json
+import threading
 import time
+import uuid
 
-from hyper import HTTPConnection
-
-from .utils import APNSReasons, make_provider_token
+from .exceptions import ConnectionClosedError, DuplicateNotificationError
+from .templates import PayloadTemplate
+from .tracing import TraceEvent, TraceEvents
+from .transports import HyperTransport
+from .utils import APNSReasons, get_json_encoder, make_provider_token, monotonic
 
 ALGORITHM = 'ES256'
 PROD_API_HOST = 'api.push.apple.com'
 DEV_API_HOST = 'api.development.push.apple.com'
 API_PORT = '443'
+# Apple's alternate port, for when outbound connections to 443 are blocked or failing.
+ALTERNATE_API_PORT = 2197
+# Responses to notifications which may succeed if sent again.  All 5xx statuses are also retryable.
+RETRYABLE_STATUSES = (429,)
+RETRYABLE_REASONS = (APNSReasons.IDLE_TIMEOUT, APNSReasons.SHUTDOWN)
+# The start of every compactly encoded payload, where pre-encoded values can be spliced into the aps dict.
+APS_JSON_PREFIX = b'{"aps":{'
 
 
 class APNSEnvironments(object):
@@ -35,6 +46,10 @@ class Alert(object):
     More information on the data may be found in Apple's documentation at
     https://developer.apple.com/library/content/documentation/NetworkingInternet/Conceptual/RemoteNotificationsPG/PayloadKeyReference.html
 
+    The payload dict and its json encoding are built on first use and cached until a field is set again, so an
+    Alert reused for many notifications is only encoded once.  Assign a new list to `title_loc_args` or `loc_args`
+    rather than changing one in place.
+
     :ivar str title: The alert title
     :ivar str body: The alert body
     :ivar str title_loc_key: Localizable string for the title
@@ -44,6 +59,11 @@ class Alert(object):
     :ivar [str] loc_args: Variable string values for format specifiers in loc_key
     :ivar str launch_image: Filename of an image in the app bundle to be used as a launch image.
     """
+    FIELDS = ('title', 'body', 'title_loc_key', 'title_loc_args', 'action_loc_key', 'loc_key', 'loc_args',
+              'launch_image')
+    # (attribute, APNs payload key) for each field
+    PAYLOAD_KEYS = tuple((field, field.replace('_', '-')) for field in FIELDS)
+    __slots__ = FIELDS + ('_payload_dict', '_payload_json')
 
     def __init__(self, *args, **kwargs):
         self.title = kwargs.pop('title', None)
@@ -56,21 +76,39 @@ class Alert(object):
         self.launch_image = kwargs.pop('launch_image', None)
         super(Alert, self).__init__(*args, **kwargs)
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in Alert.FIELDS:
+            object.__setattr__(self, '_payload_dict', None)
+            object.__setattr__(self, '_payload_json', None)
+
     def get_payload_dict(self):
         """
         Returns the APNs payload data from the object instance as a dictionary suitable for encoding
-        as JSON for use in API requests.
-        """
-        payload = {}
-        props = ['title', 'body', 'title_loc_key', 'title_loc_args', 'action_loc_key', 'loc_key', 'loc_args',
-                 'launch_image']
-        for k in props:
-            val = getattr(self, k, None)
-            apns_key = k.replace('_', '-')
-            if val is not None:
-                payload[apns_key] = val
+        as JSON for use in API requests.  The same dict is returned until a field is changed, so it must not be
+        modified.
+        """
+        payload = self._payload_dict
+        if payload is None:
+            payload = {}
+            for k, apns_key in self.PAYLOAD_KEYS:
+                val = getattr(self, k)
+                if val is not None:
+                    payload[apns_key] = val
+            object.__setattr__(self, '_payload_dict', payload)
         return payload
 
+    def get_payload_json(self, json_encoder):
+        """
+        Returns the payload dict encoded as json bytes by `json_encoder`.  The encoding is cached until a field is
+        changed or a different encoder is used.
+        """
+        cached = self._payload_json
+        if cached is None or cached[0] is not json_encoder:
+            cached = (json_encoder, json_encoder(self.get_payload_dict()))
+            object.__setattr__(self, '_payload_json', cached)
+        return cached[1]
+
 
 class APNSConnection(object):
     """
@@ -87,6 +125,26 @@ class APNSConnection(object):
         the specified environment.
     :ivar int api_port: The port to make the http2 connection on.  Default is 443.
     :ivar str provider_token: The base64 encoded jwt provider token
+    :ivar json_encoder: Function used to encode payloads as compact json bytes.
+    :ivar bool thread_safe: If True the connection may be shared by multiple threads.  Notifications sent
+        concurrently are multiplexed as separate streams on a single HTTP/2 connection.
+    :ivar rate_limiter: Optional :class:`jwt_apns_client.ratelimit.RateLimiter`.  Notifications over its limits are
+        delayed until they may be sent.
+    :ivar bool secure: Whether to use TLS.  Default is True.
+    :ivar circuit_breaker: Optional :class:`jwt_apns_client.circuitbreaker.CircuitBreaker`.  While it is open
+        notifications fail immediately with :class:`jwt_apns_client.exceptions.CircuitOpenError`.
+    :ivar [(str, int)] api_hosts: The (host, port) to connect to followed by any hosts to fail over to when the
+        circuit breaker opens
+    :ivar transport: Makes the HTTP/2 connections, such as a :class:`jwt_apns_client.transports.HyperTransport`
+        or :class:`jwt_apns_client.transports.H2Transport`
+    :ivar token_store: Optional :class:`jwt_apns_client.tokenstore.FileTokenStore` used to share the provider token
+        with other processes.  The token is fetched from the store again once it is older than the store's
+        `max_age`.
+    :ivar bool generate_apns_id: If True then notifications sent without an `apns_id` are given a random one
+    :ivar dedup_cache: Optional :class:`jwt_apns_client.dedup.DedupCache`.  Notifications whose apns-id it has
+        seen within its window fail immediately with :class:`jwt_apns_client.exceptions.DuplicateNotificationError`.
+    :ivar tracer: Optional :class:`jwt_apns_client.tracing.Tracer` which is sent events for each request, connection
+        and provider token refresh
     """
     def __init__(self, *args, **kwargs):
         """
@@ -102,6 +160,25 @@ class APNSConnection(object):
                 the specified environment.
             :param int api_port: The port to make the http2 connection on.  Default is 443.
             :param str provider_token: The base64 encoded jwt provider token
+            :param json_encoder: A function to encode payloads to json bytes or the name of one of
+                :data:`jwt_apns_client.utils.JSON_ENCODERS`.  Defaults to the fastest installed encoder.
+            :param bool thread_safe: Set to True to share the connection between threads.  Default is False.
+            :param rate_limiter: A :class:`jwt_apns_client.ratelimit.RateLimiter` to limit the rate notifications
+                are sent per topic or device.  Default is None.
+            :param bool secure: Whether to use TLS.  Default is True.
+            :param circuit_breaker: A :class:`jwt_apns_client.circuitbreaker.CircuitBreaker` which counts server
+                errors and connection errors.  Default is None.
+            :param [(str, int)] failover_hosts: (host, port) tuples to fail over to, in order, when the circuit
+                breaker opens.  For example ``[(PROD_API_HOST, ALTERNATE_API_PORT)]``.  Default is None.
+            :param token_store: A :class:`jwt_apns_client.tokenstore.FileTokenStore` to get the provider token from
+                so that it is shared with other processes.  Default is None.
+            :param transport: The transport to make HTTP/2 connections with.  Defaults to a
+                :class:`jwt_apns_client.transports.HyperTransport`.
+            :param bool generate_apns_id: Set to True to give notifications sent without an `apns_id` a random
+                UUID.  Default is False.
+            :param dedup_cache: A :class:`jwt_apns_client.dedup.DedupCache` to drop notifications whose apns-id was
+                already sent.  Default is None.
+            :param tracer: A :class:`jwt_apns_client.tracing.Tracer` to send trace events to.  Default is None.
         """
         self.algorithm = kwargs.pop('algorithm', ALGORITHM)
         self.topic = kwargs.pop('topic', None)
@@ -115,18 +192,87 @@ class APNSConnection(object):
                                    PROD_API_HOST if self.environment == APNSEnvironments.PROD else DEV_API_HOST)
         self.api_port = kwargs.pop('api_port', 443)
         self.provider_token = kwargs.pop('provider_token', None)
+        json_encoder = kwargs.pop('json_encoder', None)
+        self.json_encoder = json_encoder if callable(json_encoder) else get_json_encoder(json_encoder)
+        self.thread_safe = kwargs.pop('thread_safe', False)
+        self.rate_limiter = kwargs.pop('rate_limiter', None)
+        self.secure = kwargs.pop('secure', True)
+        self.circuit_breaker = kwargs.pop('circuit_breaker', None)
+        self.api_hosts = [(self.api_host, self.api_port)] + list(kwargs.pop('failover_hosts', None) or [])
+        self._api_host_index = 0
+        self._failovers = 0
+        self.token_store = kwargs.pop('token_store', None)
+        self.transport = kwargs.pop('transport', None) or HyperTransport(thread_safe=self.thread_safe)
+        self._provider_token_issued_at = None
+        self.generate_apns_id = kwargs.pop('generate_apns_id', False)
+        self.dedup_cache = kwargs.pop('dedup_cache', None)
+        self.tracer = kwargs.pop('tracer', None)
 
         if not self.provider_token and self.apns_key_id and self.team_id:
-            self.provider_token = self.make_provider_token()
+            if self.token_store is not None:
+                self.refresh_provider_token()
+            else:
+                self.provider_token = self.make_provider_token()
 
         self._conn = None
+        self._opening = None
+        self._conn_lock = threading.Lock()
         super(APNSConnection, self).__init__(*args, **kwargs)
 
     @property
     def connection(self):
-        if not self._conn:
-            self._conn = HTTPConnection(host=self.api_host, port=self.api_port)
-        return self._conn
+        """
+        The HTTP/2 connection to APNs.  The connection is created on first use and reused until closed.
+        """
+        conn = self._conn
+        if conn is None:
+            with self._conn_lock:
+                if self._conn is None:
+                    self._conn = self.make_connection()
+                    # Transports connect during the first request, so the open event is sent once it has been made.
+                    self._opening = (self._conn, monotonic())
+                conn = self._conn
+        return conn
+
+    def make_connection(self):
+        """
+        Create a new connection to the API host using the `transport`.
+
+        :returns: A connection, such as a hyper connection
+        """
+        return self.transport.make_connection(self.api_host, self.api_port, secure=self.secure)
+
+    def fail_over(self):
+        """
+        Switch to the next host in `api_hosts`.  The current connection is closed and the next request connects
+        to the new host.
+        """
+        with self._conn_lock:
+            self._api_host_index = (self._api_host_index + 1) % len(self.api_hosts)
+            self.api_host, self.api_port = self.api_hosts[self._api_host_index]
+            conn, self._conn = self._conn, None
+        if conn:
+            conn.close()
+
+    def _record_failure(self, conn):
+        """
+        Record a server or connection error with the circuit breaker, failing over to the next host if the circuit
+        opens and there is a host which has not been tried yet.
+        """
+        breaker = self.circuit_breaker
+        # Errors on a connection which has already been replaced belong to the old host.
+        if breaker is None or conn is not self._conn:
+            return
+        if breaker.record_failure() and self._failovers < len(self.api_hosts) - 1:
+            self._failovers += 1
+            self.fail_over()
+            breaker.reset()
+
+    def _record_success(self):
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            self._failovers = 0
+            breaker.record_success()
 
     def get_payload_data(self, alert=None, badge=None, sound=None, content=None, category=None, thread=None):
         """
@@ -168,7 +314,7 @@ class APNSConnection(object):
         }
         return data
 
-    def get_request_headers(self, token=None, topic=None, priority=10, expiration=0):
+    def get_request_headers(self, token=None, topic=None, priority=10, expiration=0, apns_id=None):
         """
         See details on topic, expiration, priority values, etc. at
         https://developer.apple.com/library/content/documentation/NetworkingInternet/Conceptual/RemoteNotificationsPG/CommunicatingwithAPNs.html#//apple_ref/doc/uid/TP40008194-CH11-SW1
@@ -177,13 +323,14 @@ class APNSConnection(object):
         :param topic: the message topic
         :param priority (int): the message priority.  10 for immediate, 5 to consider power consumption. Default is 10.
         :param expiration (int): The message expiration.  Default is 0.
+        :param str apns_id: A UUID identifying the notification.  Not sent if None, in which case APNs generates one.
         :returns: A dict of the http request headers
         """
         if topic is None:
             topic = self.topic
 
         if token is None:
-            token = self.provider_token
+            token = self.get_provider_token()
 
         request_headers = {
             'apns-expiration': u'%s' % expiration,
@@ -191,12 +338,14 @@ class APNSConnection(object):
             'apns-topic': u'%s' % topic,
             'authorization': 'bearer %s' % token.decode('ascii')
         }
+        if apns_id is not None:
+            request_headers['apns-id'] = u'%s' % apns_id
 
         return request_headers
 
     def get_request_payload(self, alert=None, badge=None, sound=None, content=None, category=None, thread=None):
         """
-        Returns the request payload as utf-8 encoded json
+        Returns the request payload as compact, utf-8 encoded json
 
         More information about these values may be found in Apple's documentation at
         https://developer.apple.com/library/content/documentation/NetworkingInternet/Conceptual/RemoteNotificationsPG/PayloadKeyReference.html
@@ -210,8 +359,33 @@ class APNSConnection(object):
         :param str thread: An app specific identifier for grouping notifications.
         :returns: The JSON encoded request payload
         """
+        if isinstance(alert, Alert):
+            # Splice the alert's cached json into the rest of the payload rather than encoding it again.
+            encoded = self.json_encoder(self.get_payload_data(None, badge, sound, content, category, thread))
+            if encoded.startswith(APS_JSON_PREFIX):
+                rest = encoded[len(APS_JSON_PREFIX):]
+                return b''.join((APS_JSON_PREFIX, b'"alert":', alert.get_payload_json(self.json_encoder),
+                                 b'' if rest == b'}}' else b',', rest))
+        data = self.get_payload_data(alert, badge, sound, content, category, thread)
+        return self.json_encoder(data)
+
+    def make_payload_template(self, alert=None, badge=None, sound=None, content=None, category=None, thread=None):
+        """
+        Returns a :class:`jwt_apns_client.templates.PayloadTemplate` for sending personalized notifications.
+        String values, including those of an `Alert`, may contain :meth:`str.format` style replacement fields
+        which are filled in per device by :meth:`jwt_apns_client.templates.PayloadTemplate.render`.
+
+        :param alert: May be a `Alert` instance or a string
+        :param int badge: Include to modify the badge of the app's icon
+        :param str sound: The name of a sound in the app's bundle or Librar/Sounds folder.
+        :param int content: Set to 1 for a silent notification.
+        :param str category: String which represents the notification's type.  This should correspond
+            with a value in the `identifier` property of one of the app's registered categories.
+        :param str thread: An app specific identifier for grouping notifications.
+        :returns: A :class:`jwt_apns_client.templates.PayloadTemplate`
+        """
         data = self.get_payload_data(alert, badge, sound, content, category, thread)
-        return json.dumps(data).encode('utf-8')
+        return PayloadTemplate(data, json_encoder=self.json_encoder)
 
     def make_provider_token(self, issuer=None, issued_at=None, algorithm=None, secret=None, headers=None):
         """
@@ -235,6 +409,26 @@ class APNSConnection(object):
 
         return make_provider_token(issuer=issuer, issued_at=issued_at, secret=secret, headers=headers)
 
+    def get_provider_token(self):
+        """
+        Returns the provider token, getting a new one from the `token_store` if the current one has expired.
+        """
+        if self._provider_token_issued_at is not None and \
+                time.time() - self._provider_token_issued_at >= self.token_store.max_age:
+            self.refresh_provider_token()
+        return self.provider_token
+
+    def refresh_provider_token(self):
+        """
+        Get the current provider token from the `token_store`.  A new token is only signed if no other process
+        has already stored a current one.
+        """
+        self.provider_token, self._provider_token_issued_at = self.token_store.get_token(
+            self.team_id, self.apns_key_id, lambda issued_at: self.make_provider_token(issued_at=issued_at))
+        if self.tracer is not None and self.tracer.active:
+            self.tracer.emit(TraceEvent(TraceEvents.TOKEN_REFRESH, monotonic()))
+        return self.provider_token
+
     def get_secret(self):
         secret = ''
         if self.apns_key_path:
@@ -274,44 +468,282 @@ class APNSConnection(object):
         :param str category: String which represents the notification's type.  This should correspond
             with a value in the `identifier` property of one of the app's registered categories.
         :param str thread: An app specific identifier for grouping notifications.
+        :param bytes payload: A json payload to send as is, such as one rendered from a
+            :class:`jwt_apns_client.templates.PayloadTemplate`.  The other payload params are ignored if this
+            is specified.
+        :param str topic: The APNs topic.  Defaults to self.topic.
+        :param int priority: 10 for immediate delivery, 5 to consider power consumption.  Default is 10.
+        :param int expiration: The message expiration.  Default is 0.
+        :param str apns_id: A UUID identifying the notification.  Generated if not specified and
+            `generate_apns_id` is True.
+        :param bool deduplicate: Set to False to skip checking `dedup_cache`, such as when resending a notification
+            which was already checked under the same apns_id.  Default is True.
+        :param bool rate_limit: Set to False to send without waiting on `rate_limiter`, such as when the
+            notification was already reserved with :meth:`jwt_apns_client.ratelimit.RateLimiter.reserve`.  Default
+            is True.
         :returns: A :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        :raises DuplicateNotificationError: If `dedup_cache` is set and a notification with the same apns_id was
+            already sent within its window
+        """
+        return self.get_notification_response(self.request_notification(device_registration_id, **kwargs))
+
+    def build_request(self, device_registration_id, **kwargs):
         """
-        # TODO: Should we accept ALL params which the various chain of methods accept too allow for full
-        # customization on send_notification() call?
-        headers = self.get_request_headers()
-        payload = self.get_request_payload(**kwargs)
+        Build the HTTP request for a notification.  Does no I/O, so the request may be sent by any transport.
+
+        Takes the same params as :meth:`send_notification`.
+
+        :returns: A tuple of the request path, the dict of request headers and the payload as bytes
+        """
+        apns_id = kwargs.pop('apns_id', None)
+        if apns_id is None and self.generate_apns_id:
+            apns_id = uuid.uuid4()
+        headers = self.get_request_headers(topic=kwargs.pop('topic', None) or self.topic,
+                                           priority=kwargs.pop('priority', 10),
+                                           expiration=kwargs.pop('expiration', 0),
+                                           apns_id=apns_id)
+        payload = kwargs.pop('payload', None)
+        if payload is None:
+            payload = self.get_request_payload(**kwargs)
         path = u'/%d/device/%s' % (self.api_version, device_registration_id)
+        return path, headers, payload
 
-        conn = self.connection
-        conn.request(
-            'POST',
-            path,
-            payload,
-            headers=headers
-        )
-        resp = conn.get_response()
-        status = resp.status
+    def make_notification_response(self, status, data, host='', port=443, path='', payload=None, headers=None,
+                                   device_registration_id=''):
+        """
+        Build the :class:`jwt_apns_client.jwt_apns_client.NotificationResponse` from the status and body of a
+        response.  Does no I/O.
+
+        :param int status: The HTTP status code of the response
+        :param bytes data: The response body
+        :param str host: Host the request was made to
+        :param int port: The port the request was made to
+        :param str path: Path of the HTTP request
+        :param bytes payload: The JSON payload
+        :param dict headers: The request headers
+        :param str device_registration_id: The registration id of the device the notification was sent to
+        :returns: A :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        """
         reason = ''
-        data = resp.read()
         if not status == 200:
+            if isinstance(data, bytes):
+                data = data.decode('utf-8')
             data_dict = json.loads(data)
             reason = data_dict.get('reason', '')
 
-        notification_response = NotificationResponse(status=status, reason=reason, host=conn.host, port=conn.port,
-                                                     path=path, payload=payload, headers=headers)
+        return NotificationResponse(status=status, reason=reason, host=host, port=port, path=path, payload=payload,
+                                    headers=headers, device_registration_id=device_registration_id)
+
+    def request_notification(self, device_registration_id, **kwargs):
+        """
+        Send the request for a push notification without waiting for the response.  Many notifications may be
+        requested before reading their responses with :meth:`get_notification_response`, each on its own HTTP/2
+        stream.
 
-        if reason == APNSReasons.IDLE_TIMEOUT:
-            self.close()
+        Takes the same params as :meth:`send_notification`.
+
+        :returns: A :class:`jwt_apns_client.jwt_apns_client.PendingNotification`
+        """
+        trace = None
+        tracer = self.tracer
+        if tracer is not None and tracer.active:
+            trace = (monotonic(), tracer.sample())
+            tracer.emit(TraceEvent(TraceEvents.REQUEST_START, trace[0], device_registration_id=device_registration_id,
+                                   host=self.api_host, port=self.api_port), trace[1])
+
+        topic = kwargs.get('topic') or self.topic
+        deduplicate = kwargs.pop('deduplicate', True)
+        rate_limit = kwargs.pop('rate_limit', True)
+        path, headers, payload = self.build_request(device_registration_id, **kwargs)
+        if deduplicate:
+            self.check_duplicate(headers)
+
+        try:
+            if self.rate_limiter is not None and rate_limit:
+                self.rate_limiter.acquire(topic, device_registration_id)
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request()
+
+            conn = self.connection
+            # Read the response for the stream this request was sent on so that concurrent requests from other
+            # threads each get their own response back.
+            try:
+                stream_id = conn.request(
+                    'POST',
+                    path,
+                    payload,
+                    headers=headers
+                )
+            except Exception as e:
+                self._record_failure(conn)
+                if isinstance(e, ConnectionClosedError):
+                    # The connection can not be used again, so the next request makes a new one.
+                    self._close_connection(conn)
+                raise
+            if self._opening is not None:
+                self._connection_opened(conn)
+        except Exception as e:
+            # The notification was not sent, so it may be retried with the same apns-id.
+            self.forget_duplicate(headers)
+            if trace is not None:
+                self._trace_request(TraceEvents.REQUEST_ERROR, trace, device_registration_id=device_registration_id,
+                                    error=e)
+            raise
+        if trace is not None:
+            self._trace_request(TraceEvents.HEADERS_SENT, trace, stream_id=stream_id,
+                                device_registration_id=device_registration_id, host=conn.host, port=conn.port)
+        return PendingNotification(connection=conn, stream_id=stream_id, device_registration_id=device_registration_id,
+                                   path=path, payload=payload, headers=headers, trace=trace)
+
+    def get_notification_response(self, pending_notification):
+        """
+        Wait for and read the response to a notification sent with :meth:`request_notification`
+
+        :param pending_notification: A :class:`jwt_apns_client.jwt_apns_client.PendingNotification`
+        :returns: A :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        """
+        conn = pending_notification.connection
+        try:
+            stream_id = pending_notification.stream_id
+            # hyper's HTTPConnection sends its first plaintext request over HTTP/1.1, which has no stream id and
+            # whose get_response() takes no arguments.
+            resp = conn.get_response(stream_id) if stream_id is not None else conn.get_response()
+            status = resp.status
+            data = resp.read()
+        except Exception as e:
+            self._record_failure(conn)
+            if isinstance(e, ConnectionClosedError):
+                self._close_connection(conn)
+            self.forget_duplicate(pending_notification.headers)
+            if pending_notification.trace is not None:
+                self._trace_request(TraceEvents.REQUEST_ERROR, pending_notification.trace,
+                                    stream_id=pending_notification.stream_id,
+                                    device_registration_id=pending_notification.device_registration_id,
+                                    host=conn.host, port=conn.port, error=e)
+            raise
+
+        if status >= 500:
+            self._record_failure(conn)
+        else:
+            self._record_success()
+
+        pending = pending_notification
+        notification_response = self.make_notification_response(status, data, host=conn.host, port=conn.port,
+                                                                path=pending.path, payload=pending.payload,
+                                                                headers=pending.headers,
+                                                                device_registration_id=pending.device_registration_id)
+        if self.is_retryable(notification_response):
+            self.forget_duplicate(pending.headers)
+        if pending.trace is not None:
+            self._trace_request(TraceEvents.RESPONSE_RECEIVED, pending.trace, stream_id=pending.stream_id,
+                                device_registration_id=pending.device_registration_id, host=conn.host, port=conn.port,
+                                status=status, reason=notification_response.reason)
+
+        if notification_response.reason == APNSReasons.IDLE_TIMEOUT:
+            self._close_connection(conn)
 
         return notification_response
 
+    def check_duplicate(self, headers):
+        """
+        Record the apns-id of a request in `dedup_cache`.  Does nothing if there is no cache or the request has no
+        apns-id.
+
+        :param dict headers: The request headers
+        :raises DuplicateNotificationError: If the apns-id was already sent within the cache's window
+        """
+        apns_id = headers.get('apns-id')
+        if self.dedup_cache is not None and apns_id is not None and not self.dedup_cache.add(apns_id):
+            raise DuplicateNotificationError('Notification %s was already sent' % apns_id)
+
+    def is_retryable(self, notification_response):
+        """
+        :returns: True if APNs did not accept the notification but the same notification may succeed if sent again,
+            such as after a 429 TooManyRequests, a server error or the connection being shut down
+        """
+        return (notification_response.status in RETRYABLE_STATUSES or notification_response.status >= 500 or
+                notification_response.reason in RETRYABLE_REASONS)
+
+    def forget_duplicate(self, headers):
+        """
+        Remove the apns-id of a request which failed from `dedup_cache` so that it may be retried
+        """
+        apns_id = (headers or {}).get('apns-id')
+        if self.dedup_cache is not None and apns_id is not None:
+            self.dedup_cache.discard(apns_id)
+
     def close(self, error_code=None):
         """
         Close the HTTP/2 connection with optional error code
         """
-        if self._conn:
-            self._conn.close(error_code=error_code)
-        self._conn = None
+        with self._conn_lock:
+            conn, self._conn = self._conn, None
+        if conn:
+            conn.close(error_code=error_code)
+            self._trace_connection(TraceEvents.CONNECTION_CLOSE, conn)
+
+    def _close_connection(self, conn, error_code=None):
+        """
+        Close a specific connection, only clearing it if it is still the current connection.  Another thread
+        may already have replaced a connection which has gone away with a new one.
+        """
+        with self._conn_lock:
+            if self._conn is conn:
+                self._conn = None
+        conn.close(error_code=error_code)
+        self._trace_connection(TraceEvents.CONNECTION_CLOSE, conn)
+
+    def _trace_request(self, name, trace, **kwargs):
+        """
+        Send an event for a request which started tracing at :meth:`request_notification`
+
+        :param tuple trace: The (start time, sampled) of the request
+        """
+        started_at, sampled = trace
+        now = monotonic()
+        self.tracer.emit(TraceEvent(name, now, duration=now - started_at, **kwargs), sampled)
+
+    def _connection_opened(self, conn):
+        """
+        Send the open event for a new connection once a request on it has been sent
+        """
+        with self._conn_lock:
+            opening = self._opening
+            if opening is None or opening[0] is not conn:
+                return
+            self._opening = None
+        self._trace_connection(TraceEvents.CONNECTION_OPEN, conn, duration=monotonic() - opening[1])
+
+    def _trace_connection(self, name, conn, duration=None):
+        tracer = self.tracer
+        if tracer is not None and tracer.active:
+            tracer.emit(TraceEvent(name, monotonic(), host=getattr(conn, 'host', None),
+                                   port=getattr(conn, 'port', None), duration=duration))
+
+
+class PendingNotification(object):
+    """
+    A notification which has been sent but whose response has not been read yet.
+
+    :ivar connection: The transport connection the request was sent on
+    :ivar int stream_id: The HTTP/2 stream id of the request
+    :ivar str device_registration_id: The registration id of the device the notification was sent to
+    :ivar str path: Path of the HTTP request
+    :ivar bytes payload: The JSON payload
+    :ivar dict headers: request headers
+    :ivar tuple trace: The (start time, sampled) of the request if it is being traced, otherwise None
+    """
+
+    def __init__(self, connection=None, stream_id=None, device_registration_id='', path='', payload=None,
+                 headers=None, trace=None, *args, **kwargs):
+        super(PendingNotification, self).__init__(*args, **kwargs)
+        self.connection = connection
+        self.stream_id = stream_id
+        self.device_registration_id = device_registration_id
+        self.path = path
+        self.payload = payload
+        self.headers = headers
+        self.trace = trace
 
 
 class NotificationResponse(object):
@@ -325,9 +757,11 @@ class NotificationResponse(object):
     :ivar str host: Host the request was made to
     :ivar int port: The port the request was made to
     :ivar str path: Path of the HTTP request
+    :ivar str device_registration_id: The registration id of the device the notification was sent to
     """
 
-    def __init__(self, status=200, reason='', host='', port=443, path='', payload=None, headers=None, *args, **kwargs):
+    def __init__(self, status=200, reason='', host='', port=443, path='', payload=None, headers=None,
+                 device_registration_id='', *args, **kwargs):
         super(NotificationResponse, self).__init__(*args, **kwargs)
         self.status = status
         self.reason = reason
@@ -336,3 +770,4 @@ class NotificationResponse(object):
         self.host = host
         self.port = port
         self.path = path
+        self.device_registration_id = device_registration_id
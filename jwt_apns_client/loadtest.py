@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/loadtest
+
+Drive connections with synthetic notifications and measure throughput, latency and CPU cost.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import functools
+import itertools
+import math
+import threading
+import time
+
+from .dispatcher import Dispatcher
+from .ratelimit import TokenBucket
+from .summary import OutcomeSummary
+from .utils import monotonic
+
+process_time = getattr(time, 'process_time', None) or time.clock
+
+
+def make_token(index):
+    """
+    :returns: A synthetic 64 character hex device token
+    """
+    return '%064x' % index
+
+
+def make_alert(index, size=0):
+    """
+    :returns: A synthetic alert, padded to at least `size` characters
+    """
+    alert = 'Load test notification %d' % index
+    return alert + 'x' * (size - len(alert))
+
+
+class LoadTestResult(object):
+    """
+    The measurements from :func:`run_load_test`
+
+    :ivar int count: The number of notifications sent
+    :ivar float elapsed: Wall clock seconds from the first notification being submitted to the last response
+    :ivar float cpu_time: CPU seconds used by this process over the same period, on all threads
+    :ivar [float] latencies: Sorted seconds from submitting each notification to getting its response
+    :ivar summary: :class:`jwt_apns_client.summary.OutcomeSummary` of the responses
+    """
+
+    def __init__(self, count, elapsed, cpu_time, latencies, summary, *args, **kwargs):
+        super(LoadTestResult, self).__init__(*args, **kwargs)
+        self.count = count
+        self.elapsed = elapsed
+        self.cpu_time = cpu_time
+        self.latencies = sorted(latencies)
+        self.summary = summary
+
+    @property
+    def requests_per_second(self):
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def cpu_per_message(self):
+        """
+        CPU seconds used per notification
+        """
+        return self.cpu_time / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """
+        :param float percent: The percentile, from 0 to 100
+        :returns: The latency in seconds which `percent` of notifications were at or below, using the nearest rank
+        """
+        if not self.latencies:
+            return 0.0
+        rank = max(int(math.ceil(percent / 100.0 * len(self.latencies))), 1)
+        return self.latencies[rank - 1]
+
+    def report(self):
+        """
+        :returns: The results as lines of text
+        """
+        lines = [
+            'Notifications: %d in %.2fs' % (self.count, self.elapsed),
+            'Requests/sec:  %.1f' % self.requests_per_second,
+            'Latency:       p50 %.2fms  p95 %.2fms  p99 %.2fms' % tuple(
+                self.percentile(p) * 1000 for p in (50, 95, 99)),
+            'CPU/message:   %.1fus' % (self.cpu_per_message * 1000000),
+            'Succeeded:     %d' % self.summary.succeeded,
+            'Failed:        %d' % self.summary.failed,
+        ]
+        for reason, count in self.summary.reasons.most_common():
+            lines.append('  %s: %d' % (reason or 'no reason', count))
+        for error, count in self.summary.errors.most_common():
+            lines.append('  %s: %d' % (error, count))
+        return lines
+
+
+def run_load_test(connections, count, rate=None, concurrency=100, payload_size=0, **kwargs):
+    """
+    Send `count` synthetic notifications, spread round robin over `connections`, and measure the results.
+
+    Each connection is driven by its own :class:`jwt_apns_client.dispatcher.Dispatcher` with up to `concurrency`
+    notifications in flight.  Notifications are submitted as fast as the dispatchers accept them unless `rate` is
+    set.
+
+    :param connections: A list of :class:`jwt_apns_client.jwt_apns_client.APNSConnection`
+    :param int count: The number of notifications to send
+    :param float rate: Target notifications per second over all connections.  Default is None, which does not limit
+        the rate.
+    :param int concurrency: The most notifications in flight per connection.  Default is 100.
+    :param int payload_size: Pad synthetic alerts to this many characters.  Default is 0.
+    :param kwargs: Other params for
+        :meth:`jwt_apns_client.jwt_apns_client.APNSConnection.send_notification`
+    :returns: A :class:`LoadTestResult`
+    """
+    dispatchers = [Dispatcher(connection, max_queue_size=concurrency * 2, batch_size=concurrency)
+                   for connection in connections]
+    bucket = TokenBucket(rate, capacity=1) if rate else None
+    summary = OutcomeSummary()
+    latencies = []
+    done = threading.Condition()
+    pending = [0]
+
+    def on_done(device_registration_id, started, future):
+        finished = monotonic()
+        summary.add_future(device_registration_id, future)
+        with done:
+            latencies.append(finished - started)
+            pending[0] -= 1
+            done.notify_all()
+
+    started_cpu = process_time()
+    started_at = monotonic()
+    for index, dispatcher in zip(range(count), itertools.cycle(dispatchers)):
+        if bucket is not None:
+            wait = bucket.reserve()
+            if wait:
+                time.sleep(wait)
+        token = make_token(index)
+        started = monotonic()
+        future = dispatcher.submit(token, alert=make_alert(index, payload_size), **kwargs)
+        with done:
+            pending[0] += 1
+        future.add_done_callback(functools.partial(on_done, token, started))
+
+    with done:
+        while pending[0] > 0:
+            done.wait()
+    elapsed = monotonic() - started_at
+    cpu_time = process_time() - started_cpu
+
+    for dispatcher in dispatchers:
+        dispatcher.shutdown()
+    return LoadTestResult(count, elapsed, cpu_time, latencies, summary)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/ratelimit
+
+Token bucket rate limits on sending notifications per topic and per device.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+from collections import OrderedDict
+
+from .utils import monotonic
+
+
+class TokenBucket(object):
+    """
+    A token bucket which refills at `rate` tokens per second up to `capacity` tokens.
+
+    Taking a token never fails.  If the bucket is empty the token is borrowed from the future and the caller is
+    told how long to wait for it, so each call is constant time and waiting callers are spaced exactly `1 / rate`
+    seconds apart.
+
+    :ivar float rate: Tokens added per second
+    :ivar float capacity: The most tokens the bucket holds, which is the largest burst allowed
+    """
+
+    def __init__(self, rate, capacity=None, *args, **kwargs):
+        """
+        :param float rate: Tokens added per second
+        :param float capacity: The most tokens the bucket holds.  Defaults to one second worth of tokens.
+        """
+        super(TokenBucket, self).__init__(*args, **kwargs)
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self.updated_at = monotonic()
+
+    def set_rate(self, rate, capacity=None):
+        """
+        Change the rate, keeping the tokens currently in the bucket
+        """
+        self._refill(monotonic())
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, now=None):
+        """
+        Take a token.
+
+        :param float now: The current :func:`jwt_apns_client.utils.monotonic` time.  Looked up if not specified.
+        :returns: Seconds to wait before using the token.  0 if a token was available.
+        """
+        self._refill(monotonic() if now is None else now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+
+class RateLimiter(object):
+    """
+    Limits the rate notifications are sent per topic and, optionally, per device.  Notifications over the limit
+    are delayed rather than rejected.
+
+    Rates may be changed at any time with :meth:`set_rate`, :meth:`set_default_rate` and :meth:`set_device_rate`.
+
+    :ivar float default_rate: Notifications per second for topics without a rate of their own.  None for no limit.
+    :ivar float device_rate: Notifications per second to a single device.  None for no limit.
+    :ivar int max_devices: The number of per device buckets to keep.  The least recently used are discarded.
+    """
+
+    def __init__(self, rates=None, default_rate=None, device_rate=None, max_devices=10000, *args, **kwargs):
+        """
+        :param dict rates: Notifications per second keyed by topic
+        :param float default_rate: Notifications per second for topics not in `rates`.  Default is None, which is
+            no limit.
+        :param float device_rate: Notifications per second to a single device.  Default is None, which is no limit.
+        :param int max_devices: The number of per device buckets to keep.  Default is 10000.
+        """
+        super(RateLimiter, self).__init__(*args, **kwargs)
+        self.default_rate = default_rate
+        self.default_capacity = None
+        self.device_rate = device_rate
+        self.device_capacity = None
+        self.max_devices = max_devices
+        self._topic_buckets = {}
+        # topics whose bucket was made from default_rate rather than a rate of their own
+        self._default_topics = set()
+        self._device_buckets = OrderedDict()
+        self._lock = threading.Lock()
+        for topic, rate in (rates or {}).items():
+            self.set_rate(topic, rate)
+
+    def set_rate(self, topic, rate, capacity=None):
+        """
+        Set the rate limit for a topic.
+
+        :param str topic: The APNs topic
+        :param float rate: Notifications per second.  None removes the topic's own rate so that `default_rate`
+            applies.
+        :param float capacity: The largest burst allowed.  Defaults to one second worth of notifications.
+        """
+        with self._lock:
+            self._default_topics.discard(topic)
+            if rate is None:
+                self._topic_buckets.pop(topic, None)
+            elif topic in self._topic_buckets:
+                self._topic_buckets[topic].set_rate(rate, capacity)
+            else:
+                self._topic_buckets[topic] = TokenBucket(rate, capacity)
+
+    def set_default_rate(self, rate, capacity=None):
+        """
+        Set the rate limit for topics without a rate of their own, including topics already being limited by
+        `default_rate`.
+
+        :param float rate: Notifications per second.  None for no limit.
+        :param float capacity: The largest burst allowed.  Defaults to one second worth of notifications.
+        """
+        with self._lock:
+            self.default_rate = rate
+            self.default_capacity = capacity
+            for topic in self._default_topics:
+                if rate is None:
+                    del self._topic_buckets[topic]
+                else:
+                    self._topic_buckets[topic].set_rate(rate, capacity)
+            if rate is None:
+                self._default_topics.clear()
+
+    def set_device_rate(self, rate, capacity=None):
+        """
+        Set the rate limit for each device.
+
+        :param float rate: Notifications per second.  None for no limit.
+        :param float capacity: The largest burst allowed.  Defaults to one second worth of notifications.
+        """
+        with self._lock:
+            self.device_rate = rate
+            self.device_capacity = capacity
+            self._device_buckets.clear()
+
+    def _get_topic_bucket(self, topic):
+        bucket = self._topic_buckets.get(topic)
+        if bucket is None and self.default_rate is not None:
+            bucket = self._topic_buckets[topic] = TokenBucket(self.default_rate, self.default_capacity)
+            self._default_topics.add(topic)
+        return bucket
+
+    def _get_device_bucket(self, device_registration_id):
+        buckets = self._device_buckets
+        bucket = buckets.pop(device_registration_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.device_rate, self.device_capacity)
+            if len(buckets) >= self.max_devices:
+                buckets.popitem(last=False)
+        buckets[device_registration_id] = bucket
+        return bucket
+
+    def reserve(self, topic, device_registration_id=None):
+        """
+        Reserve a notification to send.
+
+        :param str topic: The APNs topic
+        :param str device_registration_id: The device the notification is for
+        :returns: Seconds to wait before sending the notification
+        """
+        now = monotonic()
+        delay = 0
+        with self._lock:
+            bucket = self._get_topic_bucket(topic)
+            if bucket is not None:
+                delay = bucket.reserve(now)
+            if self.device_rate is not None and device_registration_id is not None:
+                delay = max(delay, self._get_device_bucket(device_registration_id).reserve(now))
+        return delay
+
+    def acquire(self, topic, device_registration_id=None):
+        """
+        Wait until a notification may be sent.
+
+        :param str topic: The APNs topic
+        :param str device_registration_id: The device the notification is for
+        :returns: The number of seconds waited
+        """
+        delay = self.reserve(topic, device_registration_id)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/scheduler
+
+Send notifications at a future time.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel(object):
+    """
+    A hashed timer wheel.  Items are placed in one of `slots` buckets by the tick they are due in, so adding and
+    cancelling an item are constant time however many items are pending.  Items due more than one revolution of
+    the wheel ahead share a bucket with nearer items and are skipped until their own tick comes around.
+
+    :ivar float tick: Seconds per tick.  Items are released up to one tick late.
+    :ivar int slots: The number of buckets
+    """
+
+    def __init__(self, tick=1.0, slots=3600, start=None, *args, **kwargs):
+        """
+        :param float tick: Seconds per tick.  Default is 1.
+        :param int slots: The number of buckets.  Default is 3600, one hour at the default tick.
+        :param float start: The time of tick 0.  Defaults to now.
+        """
+        super(TimerWheel, self).__init__(*args, **kwargs)
+        self.tick = float(tick)
+        self.slots = slots
+        self.start = time.time() if start is None else start
+        self._buckets = [{} for i in range(slots)]
+        self._ticks = {}
+        self._current_tick = 0
+
+    def __len__(self):
+        return len(self._ticks)
+
+    def __contains__(self, item_id):
+        return item_id in self._ticks
+
+    def add(self, when, item_id, item):
+        """
+        Add an item due at time `when`.  Items already due are released on the next :meth:`advance`.
+
+        :param float when: The time the item is due, as returned by :func:`time.time`
+        :param item_id: A unique id for cancelling the item
+        :param item: The item
+        """
+        if item_id in self._ticks:
+            raise ValueError('Duplicate id %s' % item_id)
+        # Round up so that items are never released before they are due.
+        tick = max(self._current_tick, int(math.ceil((when - self.start) / self.tick)))
+        self._buckets[tick % self.slots][item_id] = (tick, item)
+        self._ticks[item_id] = tick
+
+    def cancel(self, item_id):
+        """
+        Remove a pending item
+
+        :returns: True if the item was pending
+        """
+        tick = self._ticks.pop(item_id, None)
+        if tick is None:
+            return False
+        del self._buckets[tick % self.slots][item_id]
+        return True
+
+    def next_tick_time(self):
+        """
+        The time the next tick starts
+        """
+        return self.start + (self._current_tick + 1) * self.tick
+
+    def advance(self, now):
+        """
+        Move the wheel forward to `now`
+
+        :returns: A list of the items which are due
+        """
+        due = []
+        target = int((now - self.start) // self.tick)
+        # After an idle period there may be more ticks to catch up on than there are buckets.  Each bucket only
+        # needs to be visited once.
+        first = max(self._current_tick, target - self.slots + 1)
+        for tick in range(first, target + 1):
+            bucket = self._buckets[tick % self.slots]
+            if not bucket:
+                continue
+            for item_id, (item_tick, item) in list(bucket.items()):
+                if item_tick <= target:
+                    del bucket[item_id]
+                    del self._ticks[item_id]
+                    due.append(item)
+        self._current_tick = max(self._current_tick, target)
+        return due
+
+
+class Scheduler(object):
+    """
+    Holds notifications until their send time and then submits them to a
+    :class:`jwt_apns_client.dispatcher.Dispatcher`.
+
+    Pending notifications are kept in a :class:`TimerWheel`, so scheduling and cancelling are constant time with
+    millions of notifications pending.  The scheduler thread sleeps while nothing is pending and otherwise wakes once
+    per tick.
+
+    A notification which cannot be submitted, such as when the dispatcher's queue is full or it has been shut down,
+    is passed to its callback as a future with the exception set.  If it has no callback, or the callback raises,
+    the exception is passed to `on_error` and the scheduler carries on with the other due notifications.
+
+    :ivar dispatcher: The :class:`jwt_apns_client.dispatcher.Dispatcher` notifications are submitted to when due
+    :ivar on_error: Function called with exceptions raised while submitting notifications or calling their
+        callbacks.  If None they are logged.
+    """
+
+    def __init__(self, dispatcher, tick=1.0, slots=3600, on_error=None, *args, **kwargs):
+        """
+        :param dispatcher: The :class:`jwt_apns_client.dispatcher.Dispatcher` to submit notifications to
+        :param float tick: Seconds per tick.  Notifications are sent up to one tick late.  Default is 1.
+        :param int slots: The number of timer wheel buckets.  Default is 3600.
+        :param on_error: Function called with exceptions raised while submitting notifications without a callback,
+            or raised by callbacks.  Default is None, which logs them.
+        """
+        super(Scheduler, self).__init__(*args, **kwargs)
+        self.dispatcher = dispatcher
+        self.on_error = on_error
+        self._wheel = TimerWheel(tick=tick, slots=slots)
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._thread = threading.Thread(target=self._run, name='jwt-apns-scheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
+        return False
+
+    def __len__(self):
+        return len(self._wheel)
+
+    def schedule(self, when, device_registration_id, notification_id=None, callback=None, **kwargs):
+        """
+        Send a notification at a future time.
+
+        Takes the same notification params as
+        :meth:`jwt_apns_client.jwt_apns_client.APNSConnection.send_notification`
+
+        :param float when: The time to send the notification, as returned by :func:`time.time`
+        :param str device_registration_id: The registration id of the device to send the notification to
+        :param str notification_id: A unique id for cancelling the notification.  Generated if not specified.
+        :param callback: Called with the :class:`concurrent.futures.Future` of the notification's response once it
+            has been submitted to the dispatcher, or with a future holding the exception if it could not be
+            submitted
+        :returns: The notification id
+        """
+        notification_id = notification_id or uuid.uuid4().hex
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule notifications after shutdown')
+            was_empty = not self._wheel
+            self._wheel.add(when, notification_id, (device_registration_id, callback, kwargs))
+            if was_empty or when <= time.time():
+                self._condition.notify()
+        return notification_id
+
+    def schedule_after(self, delay, device_registration_id, **kwargs):
+        """
+        Send a notification after `delay` seconds.  Takes the same params as :meth:`schedule`.
+
+        :returns: The notification id
+        """
+        return self.schedule(time.time() + delay, device_registration_id, **kwargs)
+
+    def cancel(self, notification_id):
+        """
+        Cancel a scheduled notification
+
+        :returns: True if the notification was cancelled, False if it was already sent or never scheduled
+        """
+        with self._condition:
+            return self._wheel.cancel(notification_id)
+
+    def shutdown(self, wait=True):
+        """
+        Stop the scheduler.  Notifications which are not due yet are discarded.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify()
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._shutdown:
+                    if not self._wheel:
+                        self._condition.wait()
+                        continue
+                    due = self._wheel.advance(time.time())
+                    if due:
+                        break
+                    self._condition.wait(max(0, self._wheel.next_tick_time() - time.time()))
+                if self._shutdown:
+                    return
+
+            # Submit outside of the lock, since submit blocks while the dispatcher's queue is full.
+            for device_registration_id, callback, kwargs in due:
+                self._submit(device_registration_id, callback, kwargs)
+
+    def _submit(self, device_registration_id, callback, kwargs):
+        """
+        Submit a due notification.  Errors are handled here so that one notification cannot stop the scheduler.
+        """
+        try:
+            future = self.dispatcher.submit(device_registration_id, **kwargs)
+        except Exception as e:
+            if callback is None:
+                self._handle_error(e)
+                return
+            future = Future()
+            future.set_exception(e)
+        if callback is not None:
+            try:
+                callback(future)
+            except Exception as e:
+                self._handle_error(e)
+
+    def _handle_error(self, error):
+        if self.on_error is not None:
+            self.on_error(error)
+        else:
+            logger.error('Error sending scheduled notification', exc_info=True)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/sharding
+
+Consistent hash routing of device tokens to shards such as processes, nodes or connections.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import bisect
+import hashlib
+import struct
+import threading
+
+
+def hash_key(key):
+    """
+    :returns: A 64 bit integer hash of a string which is the same in every process and on every platform
+    """
+    if not isinstance(key, bytes):
+        key = key.encode('utf-8')
+    return struct.unpack('>Q', hashlib.md5(key).digest()[:8])[0]
+
+
+class HashRing(object):
+    """
+    Maps device tokens to shards with consistent hashing, so that each device's notifications always go to the
+    same shard.
+
+    Every shard is placed at `replicas` points on a ring of hash values, scaled by its weight, and a token belongs
+    to the shard at the first point after the token's hash.  When a shard is added it only takes tokens from the
+    others, and when one is removed only its tokens move, so about ``1 / len(shards)`` of tokens change shard
+    rather than nearly all of them.
+
+    Shards may be any object, such as a node name, a worker index or an
+    :class:`jwt_apns_client.jwt_apns_client.APNSConnection`.  Points are placed using each shard's `name`, which
+    defaults to ``str(shard)``.  Give shards explicit names when separate processes must agree on the routing.
+
+    :ivar int replicas: Points on the ring per unit of shard weight
+    """
+
+    def __init__(self, shards=None, replicas=100, *args, **kwargs):
+        """
+        :param shards: Shards to add, each with a weight of 1 and named by ``str(shard)``.  Default is None.
+        :param int replicas: Points on the ring per unit of shard weight.  More points spread tokens more evenly.
+            Default is 100.
+        """
+        super(HashRing, self).__init__(*args, **kwargs)
+        self.replicas = replicas
+        self._shards = {}
+        # Sorted hash points and the (name, shard) at each point, replaced together so that readers need no lock.
+        self._ring = ((), ())
+        self._lock = threading.Lock()
+        for shard in shards or ():
+            self.add_shard(shard)
+
+    def __len__(self):
+        return len(self._shards)
+
+    @property
+    def shards(self):
+        """
+        The shards on the ring
+        """
+        return [shard for shard, weight in self._shards.values()]
+
+    def add_shard(self, shard, name=None, weight=1):
+        """
+        Add a shard, or change the weight of one already on the ring
+
+        :param shard: The shard
+        :param str name: The name its points are placed by.  Defaults to ``str(shard)``.
+        :param float weight: The shard's share of tokens relative to the other shards.  Default is 1.
+        """
+        name = name if name is not None else '%s' % shard
+        with self._lock:
+            self._shards[name] = (shard, weight)
+            self._rebuild()
+
+    def remove_shard(self, shard=None, name=None):
+        """
+        Remove a shard by the shard itself or by its name
+        """
+        name = name if name is not None else '%s' % shard
+        with self._lock:
+            if self._shards.pop(name, None) is not None:
+                self._rebuild()
+
+    def _rebuild(self):
+        points = []
+        for name, (shard, weight) in self._shards.items():
+            for i in range(int(round(self.replicas * weight))):
+                points.append((hash_key('%s-%d' % (name, i)), name, shard))
+        # Sort by name too, so that the ring is the same whatever order shards were added in.
+        points.sort(key=lambda point: (point[0], point[1]))
+        self._ring = (tuple(point[0] for point in points), tuple(point[1:] for point in points))
+
+    def _lookup(self, device_registration_id):
+        hashes, entries = self._ring
+        if not hashes:
+            raise LookupError('No shards on the hash ring')
+        i = bisect.bisect(hashes, hash_key(device_registration_id))
+        return entries[i % len(entries)]
+
+    def get_shard(self, device_registration_id):
+        """
+        :returns: The shard the device token belongs to
+        :raises LookupError: If there are no shards
+        """
+        return self._lookup(device_registration_id)[1]
+
+    def get_shard_name(self, device_registration_id):
+        """
+        :returns: The name of the shard the device token belongs to
+        :raises LookupError: If there are no shards
+        """
+        return self._lookup(device_registration_id)[0]
+
+    def route(self, device_registration_ids):
+        """
+        Pair each device token in a stream with its shard.
+
+        :param device_registration_ids: An iterable of device tokens
+        :returns: An iterator of (shard, device token) tuples
+        """
+        for device_registration_id in device_registration_ids:
+            yield self.get_shard(device_registration_id), device_registration_id
+
+    def filter(self, device_registration_ids, shard, name=None):
+        """
+        Yield only the device tokens in a stream which belong to one shard.  Each node of a distributed bulk send
+        can read the full token stream and send just its own share.
+
+        :param device_registration_ids: An iterable of device tokens
+        :param shard: The shard to keep tokens for
+        :param str name: The shard's name.  Defaults to ``str(shard)``.
+        """
+        name = name if name is not None else '%s' % shard
+        for device_registration_id in device_registration_ids:
+            if self._lookup(device_registration_id)[0] == name:
+                yield device_registration_id
+
+    def partition(self, device_registration_ids):
+        """
+        Split device tokens into a list per shard
+
+        :param device_registration_ids: An iterable of device tokens
+        :returns: A dict of shard name to list of device tokens
+        """
+        partitions = dict((name, []) for name in self._shards)
+        for device_registration_id in device_registration_ids:
+            partitions.setdefault(self._lookup(device_registration_id)[0], []).append(device_registration_id)
+        return partitions
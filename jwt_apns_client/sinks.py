@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/sinks
+
+Persist notification outcomes in batches without slowing down sending.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import csv
+import io
+import json
+import logging
+import sqlite3
+import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .utils import monotonic
+
+logger = logging.getLogger(__name__)
+
+# Fields of each NotificationResponse which are persisted
+RESULT_FIELDS = ('device_registration_id', 'status', 'reason')
+
+# Queued to tell the flush thread to stop once everything queued before it has been written.
+_STOP = object()
+
+
+def get_result(response):
+    """
+    :returns: A dict of the `RESULT_FIELDS` of a :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+    """
+    return dict((field, getattr(response, field)) for field in RESULT_FIELDS)
+
+
+class ResultSink(object):
+    """
+    Base class for sinks which persist notification outcomes.  Sinks are written to from a single thread by a
+    :class:`BatchingSink`.
+    """
+
+    def write_batch(self, responses):
+        """
+        Persist a batch of outcomes
+
+        :param responses: A list of :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release any resources held by the sink
+        """
+
+
+class CallbackSink(ResultSink):
+    """
+    Calls a function with each batch of responses
+
+    :ivar callback: Function which takes a list of :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+    """
+
+    def __init__(self, callback, *args, **kwargs):
+        super(CallbackSink, self).__init__(*args, **kwargs)
+        self.callback = callback
+
+    def write_batch(self, responses):
+        self.callback(responses)
+
+
+class JSONLinesSink(ResultSink):
+    """
+    Appends one json object per outcome to a file
+
+    :ivar str path: The file to append to
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        super(JSONLinesSink, self).__init__(*args, **kwargs)
+        self.path = path
+        self._file = None
+
+    def write_batch(self, responses):
+        if self._file is None:
+            self._file = io.open(self.path, 'a', encoding='utf-8')
+        self._file.write(''.join('%s\n' % json.dumps(get_result(r)) for r in responses))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CSVSink(ResultSink):
+    """
+    Appends one row per outcome to a csv file.  A header row is written if the file is new or empty.
+
+    :ivar str path: The file to append to
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        super(CSVSink, self).__init__(*args, **kwargs)
+        self.path = path
+        self._file = None
+        self._writer = None
+
+    def write_batch(self, responses):
+        if self._file is None:
+            if sys.version_info < (3,):
+                self._file = open(self.path, 'ab')
+            else:
+                self._file = io.open(self.path, 'a', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            if self._file.tell() == 0:
+                self._writer.writerow([str(field) for field in RESULT_FIELDS])
+        self._writer.writerows([[getattr(r, field) for field in RESULT_FIELDS] for r in responses])
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SQLiteSink(ResultSink):
+    """
+    Inserts one row per outcome into a SQLite table, which is created if it does not exist.  Each batch is
+    inserted in a single transaction.
+
+    :ivar str path: The database file
+    :ivar str table: The table name
+    """
+
+    def __init__(self, path, table='notification_results', *args, **kwargs):
+        super(SQLiteSink, self).__init__(*args, **kwargs)
+        self.path = path
+        self.table = table
+        self._db = None
+
+    def write_batch(self, responses):
+        # SQLite connections may only be used on the thread which created them, so connect on first write.
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute('CREATE TABLE IF NOT EXISTS "%s" (device_registration_id TEXT, status INTEGER, '
+                             'reason TEXT)' % self.table)
+        with self._db:
+            self._db.executemany('INSERT INTO "%s" (%s) VALUES (?, ?, ?)' % (self.table, ', '.join(RESULT_FIELDS)),
+                                 [[getattr(r, field) for field in RESULT_FIELDS] for r in responses])
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class BatchingSink(object):
+    """
+    Buffers notification outcomes and writes them to a :class:`ResultSink` in batches from a background thread,
+    so that persisting outcomes never holds up sending.
+
+    A batch is written once `batch_size` outcomes are buffered or `flush_interval` seconds after the first outcome
+    in the batch arrived, whichever comes first.  If the sink raises an error the batch is dropped and counted in
+    `failed_batches` and `failed_results`, and the error is passed to `on_error` or logged.
+
+    :ivar sink: The :class:`ResultSink` to write to
+    :ivar int batch_size: The most outcomes written at once
+    :ivar float flush_interval: The longest an outcome waits before being written
+    :ivar on_error: Function called with the exception and the batch when writing a batch fails
+    :ivar int failed_batches: The number of batches which could not be written
+    :ivar int failed_results: The number of outcomes in batches which could not be written
+    """
+
+    def __init__(self, sink, batch_size=1000, flush_interval=1.0, max_queue_size=100000, on_error=None,
+                 *args, **kwargs):
+        """
+        :param sink: The :class:`ResultSink` to write to
+        :param int batch_size: The most outcomes written at once.  Default is 1000.
+        :param float flush_interval: The longest an outcome waits before being written.  Default is 1 second.
+        :param int max_queue_size: The most outcomes buffered.  :meth:`add` blocks while the buffer is full.
+            Default is 100000.
+        :param on_error: Function called with the exception and the batch when writing a batch fails.  Default is
+            None, which logs errors.
+        """
+        super(BatchingSink, self).__init__(*args, **kwargs)
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self.failed_batches = 0
+        self.failed_results = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='jwt-apns-result-sink')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def add(self, response):
+        """
+        Buffer an outcome to be written
+
+        :param response: A :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        """
+        if self._closed:
+            raise RuntimeError('cannot add results after close')
+        self._queue.put(response)
+
+    def close(self, wait=True):
+        """
+        Write everything buffered and close the sink
+
+        :param bool wait: If True then wait for everything to be written before returning
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        try:
+            while True:
+                batch = [self._queue.get()]
+                if batch[0] is _STOP:
+                    return
+                deadline = monotonic() + self.flush_interval
+                stop = False
+                while len(batch) < self.batch_size:
+                    timeout = deadline - monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        response = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if response is _STOP:
+                        stop = True
+                        break
+                    batch.append(response)
+                self._write(batch)
+                if stop:
+                    return
+        finally:
+            self.sink.close()
+
+    def _write(self, batch):
+        try:
+            self.sink.write_batch(batch)
+        except Exception as e:
+            self.failed_batches += 1
+            self.failed_results += len(batch)
+            if self.on_error is not None:
+                self.on_error(e, batch)
+            else:
+                logger.error('Error writing %d notification results', len(batch), exc_info=True)
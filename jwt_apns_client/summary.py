@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/summary
+
+Aggregate the outcomes of a bulk send without keeping every response.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import io
+import random
+import threading
+from collections import Counter
+
+from .sinks import ResultSink
+
+
+class OutcomeSummary(ResultSink):
+    """
+    Counts notification outcomes by status and reason.  Only the counters, a fixed size random sample of failed
+    responses and the failed device tokens are kept, so memory use does not grow with the number of successful
+    notifications.  Failed tokens can be written to a file instead of being kept in memory.
+
+    An OutcomeSummary is a :class:`jwt_apns_client.sinks.ResultSink`, so it can also be used with a
+    :class:`jwt_apns_client.sinks.BatchingSink`.
+
+    :ivar statuses: :class:`collections.Counter` of responses by HTTP status
+    :ivar reasons: :class:`collections.Counter` of failed responses by reason, such as
+        :attr:`jwt_apns_client.utils.APNSReasons.UNREGISTERED`
+    :ivar errors: :class:`collections.Counter` of notifications which raised an exception, by exception class name
+    :ivar list sample: Up to `sample_size` failed responses chosen uniformly at random
+    :ivar set failed_tokens: The device tokens which failed.  Empty if `failed_tokens_path` is set.
+    :ivar str failed_tokens_path: File which failed device tokens are appended to, one per line
+    """
+
+    def __init__(self, sample_size=100, failed_tokens_path=None, random_seed=None, *args, **kwargs):
+        """
+        :param int sample_size: The number of failed responses to keep as a sample.  Default is 100.
+        :param str failed_tokens_path: File to append failed device tokens to rather than keeping them in memory.
+            Default is None.
+        :param random_seed: Seed for choosing the sample.  Default is None.
+        """
+        super(OutcomeSummary, self).__init__(*args, **kwargs)
+        self.sample_size = sample_size
+        self.failed_tokens_path = failed_tokens_path
+        self.statuses = Counter()
+        self.reasons = Counter()
+        self.errors = Counter()
+        self.sample = []
+        self.failed_tokens = set()
+        self._failures_seen = 0
+        self._failed_tokens_file = None
+        self._random = random.Random(random_seed)
+        self._lock = threading.Lock()
+
+    @property
+    def total(self):
+        """
+        The number of outcomes recorded
+        """
+        return sum(self.statuses.values()) + sum(self.errors.values())
+
+    @property
+    def succeeded(self):
+        """
+        The number of notifications accepted by APNs
+        """
+        return self.statuses[200]
+
+    @property
+    def failed(self):
+        """
+        The number of notifications which were rejected or raised an exception
+        """
+        return self.total - self.succeeded
+
+    def add(self, response):
+        """
+        Record a response
+
+        :param response: A :class:`jwt_apns_client.jwt_apns_client.NotificationResponse`
+        """
+        with self._lock:
+            self.statuses[response.status] += 1
+            if response.status != 200:
+                self.reasons[response.reason] += 1
+                self._add_failure(response.device_registration_id, response)
+
+    def add_error(self, device_registration_id, error):
+        """
+        Record a notification which raised an exception rather than getting a response
+
+        :param str device_registration_id: The device token of the notification
+        :param Exception error: The exception raised
+        """
+        with self._lock:
+            self.errors[type(error).__name__] += 1
+            self._add_failure(device_registration_id, None)
+
+    def add_future(self, device_registration_id, future):
+        """
+        Record the outcome of a completed future from :meth:`jwt_apns_client.dispatcher.Dispatcher.submit`
+        """
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.add_error(device_registration_id, error)
+        else:
+            self.add(future.result())
+
+    def write_batch(self, responses):
+        for response in responses:
+            self.add(response)
+
+    def close(self):
+        with self._lock:
+            if self._failed_tokens_file is not None:
+                self._failed_tokens_file.close()
+                self._failed_tokens_file = None
+
+    def as_dict(self):
+        """
+        :returns: A dict of the counters suitable for json encoding
+        """
+        with self._lock:
+            return {
+                'total': self.total,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'statuses': dict(self.statuses),
+                'reasons': dict(self.reasons),
+                'errors': dict(self.errors),
+            }
+
+    def _add_failure(self, device_registration_id, response):
+        if device_registration_id:
+            if self.failed_tokens_path is None:
+                self.failed_tokens.add(device_registration_id)
+            else:
+                if self._failed_tokens_file is None:
+                    self._failed_tokens_file = io.open(self.failed_tokens_path, 'a', encoding='utf-8')
+                self._failed_tokens_file.write('%s\n' % device_registration_id)
+
+        if response is None:
+            return
+        # Reservoir sampling, so that every failure is equally likely to be in the sample.
+        self._failures_seen += 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append(response)
+        else:
+            i = self._random.randrange(self._failures_seen)
+            if i < self.sample_size:
+                self.sample[i] = response
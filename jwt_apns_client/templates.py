@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/templates
+
+Pre-serialized payload templates for sending personalized notifications in bulk.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import re
+import string
+import uuid
+
+from .utils import json_dumps
+
+
+class PayloadTemplate(object):
+    """
+    An APNs payload which has been encoded to json once with placeholders for per-device values.
+
+    Any string in the payload may contain :meth:`str.format` style replacement fields such as
+    ``'Hi {name}, your order {order_id} shipped'``.  The payload is encoded once when the template is created and
+    split into static byte fragments around the replacement fields, so rendering a personalized payload only
+    json escapes the per-device values and joins the fragments.
+
+    Replacement fields are only supported inside strings.  Literal braces must be doubled, as with
+    :meth:`str.format`.
+
+    :ivar dict data: The payload data the template was built from
+    :ivar json_encoder: Function used to encode the payload and the per-device values
+    """
+    formatter = string.Formatter()
+
+    def __init__(self, data, json_encoder=None, *args, **kwargs):
+        """
+        :param dict data: The payload data, such as is returned by
+            :meth:`jwt_apns_client.jwt_apns_client.APNSConnection.get_payload_data`
+        :param json_encoder: Function used to encode json as bytes.  Defaults to
+            :func:`jwt_apns_client.utils.json_dumps`
+        """
+        super(PayloadTemplate, self).__init__(*args, **kwargs)
+        self.data = data
+        self.json_encoder = json_encoder or json_dumps
+        self._fragments, self._fields = self._compile(data)
+
+    def _compile(self, data):
+        """
+        Encode the payload with a unique marker in place of each replacement field and then split the encoded
+        payload on those markers.
+
+        :returns: A tuple of the list of byte fragments and the list of (field_name, conversion, format_spec)
+            tuples.  There is always one more fragment than there are fields.
+        """
+        nonce = uuid.uuid4().hex
+        fields = []
+
+        def mark(value):
+            if isinstance(value, dict):
+                return dict((k, mark(v)) for k, v in value.items())
+            if isinstance(value, (list, tuple)):
+                return [mark(v) for v in value]
+            if not isinstance(value, type('')):
+                return value
+            parts = []
+            for literal, field_name, format_spec, conversion in self.formatter.parse(value):
+                parts.append(literal)
+                if field_name is not None:
+                    parts.append('@%s:%d@' % (nonce, len(fields)))
+                    fields.append((field_name, conversion, format_spec))
+            return ''.join(parts)
+
+        encoded = self.json_encoder(mark(data))
+        pieces = re.split(('@%s:\\d+@' % nonce).encode('ascii'), encoded)
+        return pieces, fields
+
+    @property
+    def field_names(self):
+        """
+        The names of the replacement fields in the template in the order they appear in the payload.
+        """
+        return [field_name for field_name, conversion, format_spec in self._fields]
+
+    def escape(self, value):
+        """
+        Encode a string as it should appear inside of a json string, without the surrounding quotes.
+        """
+        return self.json_encoder(value)[1:-1]
+
+    def render(self, *args, **kwargs):
+        """
+        Build the json payload for a single device.
+
+        Positional and keyword arguments are used to look up replacement fields exactly as they would be
+        by :meth:`str.format`.
+
+        :returns: The utf-8 encoded json payload
+        """
+        formatter = self.formatter
+        fragments = self._fragments
+        parts = [fragments[0]]
+        for i, (field_name, conversion, format_spec) in enumerate(self._fields, 1):
+            value = formatter.get_field(field_name, args, kwargs)[0]
+            if conversion:
+                value = formatter.convert_field(value, conversion)
+            parts.append(self.escape(formatter.format_field(value, format_spec)))
+            parts.append(fragments[i])
+        return b''.join(parts)
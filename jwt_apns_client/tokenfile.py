@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/tokenfile
+
+Read device tokens for large campaigns from memory mapped files.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import binascii
+import mmap
+import os
+
+
+class TokenFile(object):
+    """
+    Iterates the device tokens in a file without reading the whole file into memory.  The file is memory mapped and
+    each token is copied out of the mapping only as it is reached.
+
+    Files are either one hex token per line or, when `record_size` is set, fixed width binary tokens with no
+    separators, such as 32 byte raw APNs tokens, which are hex encoded as they are read.
+
+    A byte range of the file may be selected with `start` and `stop`, or split evenly between senders with
+    :meth:`shard`.  For line delimited files a range includes every line which starts inside it, so adjacent ranges
+    never split or repeat a token.
+
+    :ivar str path: The path of the token file
+    :ivar int record_size: The size of each binary token in bytes.  None for line delimited tokens.
+    :ivar int start: The byte offset to start at
+    :ivar int stop: The byte offset to stop at.  None for the end of the file.
+    """
+
+    def __init__(self, path, record_size=None, start=0, stop=None, *args, **kwargs):
+        """
+        :param str path: The path of the token file
+        :param int record_size: The size of each binary token in bytes.  Default is None, for one token per line.
+        :param int start: The byte offset to start at.  Default is 0.
+        :param int stop: The byte offset to stop at.  Default is None, which reads to the end of the file.
+        """
+        super(TokenFile, self).__init__(*args, **kwargs)
+        self.path = path
+        self.record_size = record_size
+        self.start = start
+        self.stop = stop
+
+    def shard(self, index, count):
+        """
+        Split the file into `count` roughly equal byte ranges.
+
+        :param int index: Which range to return, from 0 to `count - 1`
+        :param int count: The number of ranges
+        :returns: A :class:`TokenFile` for the range
+        """
+        if not 0 <= index < count:
+            raise ValueError('Shard index %d is out of range for %d shards' % (index, count))
+        start = self.start
+        stop = os.path.getsize(self.path) if self.stop is None else self.stop
+        unit = self.record_size or 1
+        units = -(-(stop - start) // unit)
+        per_shard = -(-units // count)
+        shard_start = min(stop, start + index * per_shard * unit)
+        shard_stop = min(stop, shard_start + per_shard * unit)
+        return TokenFile(self.path, record_size=self.record_size, start=shard_start, stop=shard_stop)
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            stop = size if self.stop is None else min(self.stop, size)
+            if self.start >= stop:
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if self.record_size:
+                    for token in self._iter_records(mapped, stop):
+                        yield token
+                else:
+                    for token in self._iter_lines(mapped, stop, size):
+                        yield token
+            finally:
+                mapped.close()
+
+    def _iter_records(self, mapped, stop):
+        record_size = self.record_size
+        hexlify = binascii.hexlify
+        # Skip a partial record at the start of the range.
+        pos = -(-self.start // record_size) * record_size
+        while pos + record_size <= stop:
+            yield hexlify(mapped[pos:pos + record_size]).decode('ascii')
+            pos += record_size
+
+    def _iter_lines(self, mapped, stop, size):
+        pos = self.start
+        # A line which started before the range belongs to the previous range.
+        if pos > 0 and mapped[pos - 1:pos] != b'\n':
+            pos = mapped.find(b'\n', pos)
+            if pos == -1:
+                return
+            pos += 1
+
+        find = mapped.find
+        while pos < stop:
+            end = find(b'\n', pos)
+            if end == -1:
+                end = size
+            token = mapped[pos:end].strip()
+            if token:
+                yield token.decode('ascii')
+            pos = end + 1
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/tokenstore
+
+Share provider tokens between processes so that each key is only signed once per rotation.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import getpass
+import json
+import os
+import re
+import stat
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .exceptions import InsecureTokenStoreError
+
+# Apple rejects provider tokens more than an hour old and responds with TooManyProviderTokenUpdates if they
+# are replaced more often than every 20 minutes.
+DEFAULT_TOKEN_MAX_AGE = 50 * 60
+
+
+def get_default_directory():
+    """
+    :returns: A directory in the system temp directory which is only used by the current user
+    """
+    user = os.getuid() if hasattr(os, 'getuid') else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), 'jwt_apns_client-%s' % user)
+
+
+class FileTokenStore(object):
+    """
+    Stores provider tokens in files so that every process on a host, such as every gunicorn or celery worker,
+    uses the same token for a key.
+
+    Each team id and key id has its own file.  The file is locked while it is read and, if the token is missing
+    or older than `max_age`, while a new token is signed and written, so that only one process signs each token.
+    Locking uses :func:`fcntl.flock` and is skipped on platforms without it.
+
+    The tokens are live credentials, so the directory is created readable only by the current user and token files
+    are created with mode 0600.  :class:`jwt_apns_client.exceptions.InsecureTokenStoreError` is raised if the
+    directory is a symlink, belongs to another user or may be written by other users.
+
+    :ivar str directory: The directory the token files are kept in
+    :ivar float max_age: Seconds a token is used before a new one is signed
+    """
+
+    def __init__(self, directory=None, max_age=DEFAULT_TOKEN_MAX_AGE, *args, **kwargs):
+        """
+        :param str directory: The directory to keep token files in.  Defaults to a directory for the current
+            user in the system temp directory.
+        :param float max_age: Seconds a token is used before a new one is signed.  Default is 50 minutes.
+        """
+        super(FileTokenStore, self).__init__(*args, **kwargs)
+        self.directory = directory or get_default_directory()
+        self.max_age = max_age
+
+    def get_path(self, team_id, apns_key_id):
+        """
+        The path of the file for a team id and key id
+        """
+        name = re.sub(r'[^A-Za-z0-9_-]', '_', '%s.%s' % (team_id, apns_key_id))
+        return os.path.join(self.directory, '%s.json' % name)
+
+    def check_directory(self):
+        """
+        Create the directory if it does not exist and check that no other user can tamper with it
+
+        :raises InsecureTokenStoreError: If the directory is a symlink, is owned by another user or is writable by
+            other users
+        """
+        try:
+            os.makedirs(self.directory, 0o700)
+        except OSError:
+            if not os.path.isdir(self.directory):
+                raise
+
+        if not hasattr(os, 'geteuid'):
+            return
+        st = os.lstat(self.directory)
+        if stat.S_ISLNK(st.st_mode):
+            raise InsecureTokenStoreError('Token store directory %s is a symlink' % self.directory)
+        if st.st_uid != os.geteuid():
+            raise InsecureTokenStoreError('Token store directory %s is owned by another user' % self.directory)
+        if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise InsecureTokenStoreError('Token store directory %s is writable by other users' % self.directory)
+
+    def get_token(self, team_id, apns_key_id, make_token):
+        """
+        Get the current provider token, signing and storing a new one if there is no current token.
+
+        :param str team_id: The app team id
+        :param str apns_key_id: The apns key id
+        :param make_token: Function which takes the time the token is issued at and returns a new JWT provider
+            token.  Only called if there is no current token.
+        :returns: A tuple of the token as bytes and the time it was issued at
+        """
+        self.check_directory()
+        # Never follow a symlink planted in place of the token file.
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0)
+        fd = os.open(self.get_path(team_id, apns_key_id), flags, 0o600)
+        with os.fdopen(fd, 'r+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    data = json.loads(f.read())
+                except ValueError:
+                    data = {}
+
+                now = time.time()
+                issued_at = data.get('issued_at', 0)
+                if data.get('token') and 0 <= now - issued_at < self.max_age:
+                    return data['token'].encode('ascii'), issued_at
+
+                token = make_token(now)
+                if not isinstance(token, bytes):
+                    token = token.encode('ascii')
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'token': token.decode('ascii'), 'issued_at': now}))
+                f.flush()
+                return token, now
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
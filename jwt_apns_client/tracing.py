@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/tracing
+
+Sampled trace events for requests, connections and provider tokens.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import random
+import threading
+from collections import deque
+
+
+class TraceEvents(object):
+    """
+    Class to act as enum of trace event names
+    """
+    REQUEST_START = 'request_start'
+    HEADERS_SENT = 'headers_sent'
+    RESPONSE_RECEIVED = 'response_received'
+    REQUEST_ERROR = 'request_error'
+    CONNECTION_OPEN = 'connection_open'
+    CONNECTION_CLOSE = 'connection_close'
+    TOKEN_REFRESH = 'token_refresh'
+
+
+class TraceEvent(object):
+    """
+    Something which happened while sending notifications
+
+    :ivar str name: One of :class:`TraceEvents`
+    :ivar float timestamp: :func:`jwt_apns_client.utils.monotonic` time of the event
+    :ivar int stream_id: The HTTP/2 stream id of the request, once it is known
+    :ivar str device_registration_id: The device token of the request
+    :ivar str host: The host of the connection
+    :ivar int port: The port of the connection
+    :ivar float duration: Seconds since the request started, for response and error events.  For connection open
+        events, seconds from creating the connection until the first request on it was sent, which includes the
+        TCP and TLS handshakes since transports connect during the first request.
+    :ivar int status: The HTTP status of the response
+    :ivar str reason: The reason APNs gave for rejecting the notification
+    :ivar Exception error: The exception raised, for error events
+    """
+    __slots__ = ('name', 'timestamp', 'stream_id', 'device_registration_id', 'host', 'port', 'duration', 'status',
+                 'reason', 'error')
+
+    def __init__(self, name, timestamp, stream_id=None, device_registration_id=None, host=None, port=None,
+                 duration=None, status=None, reason=None, error=None):
+        self.name = name
+        self.timestamp = timestamp
+        self.stream_id = stream_id
+        self.device_registration_id = device_registration_id
+        self.host = host
+        self.port = port
+        self.duration = duration
+        self.status = status
+        self.reason = reason
+        self.error = error
+
+    def __repr__(self):
+        fields = ', '.join('%s=%r' % (k, getattr(self, k)) for k in self.__slots__[2:] if getattr(self, k) is not None)
+        return '<TraceEvent %s at %.6f %s>' % (self.name, self.timestamp, fields)
+
+
+class Tracer(object):
+    """
+    Delivers :class:`TraceEvent` objects to subscribers.
+
+    Requests are sampled when they start.  The events of a request which was not sampled are only delivered to
+    subscribers added with ``sampled=False``, except that failed requests are always delivered.  Connection and
+    token events are always delivered.
+
+    Pass a tracer to :class:`jwt_apns_client.jwt_apns_client.APNSConnection` with the `tracer` param.  Events are
+    only built while the tracer has subscribers, so an idle tracer costs a couple of attribute checks per request.
+
+    :ivar float sample_rate: The fraction of requests traced, from 0 to 1
+    """
+
+    def __init__(self, sample_rate=1.0, *args, **kwargs):
+        """
+        :param float sample_rate: The fraction of requests traced, from 0 to 1.  Default is 1.
+        """
+        super(Tracer, self).__init__(*args, **kwargs)
+        self.sample_rate = sample_rate
+        self.active = False
+        self._sampled_subscribers = ()
+        self._all_subscribers = ()
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback, sampled=True):
+        """
+        Add a subscriber.  Subscribers are called on the thread the event happened on.
+
+        :param callback: Function called with each :class:`TraceEvent`
+        :param bool sampled: If False then the callback gets the events of every request rather than only those
+            of sampled requests.  Default is True.
+        """
+        with self._lock:
+            if sampled:
+                self._sampled_subscribers += (callback,)
+            else:
+                self._all_subscribers += (callback,)
+            self.active = True
+
+    def unsubscribe(self, callback):
+        """
+        Remove a subscriber
+        """
+        with self._lock:
+            self._sampled_subscribers = tuple(s for s in self._sampled_subscribers if s != callback)
+            self._all_subscribers = tuple(s for s in self._all_subscribers if s != callback)
+            self.active = bool(self._sampled_subscribers or self._all_subscribers)
+
+    def sample(self):
+        """
+        :returns: True if a request starting now should be traced for sampled subscribers
+        """
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def emit(self, event, sampled=True):
+        """
+        Deliver an event to the subscribers
+
+        :param event: The :class:`TraceEvent`
+        :param bool sampled: Whether the request the event belongs to was sampled
+        """
+        for callback in self._all_subscribers:
+            callback(event)
+        if sampled or event.error is not None or (event.status is not None and event.status != 200):
+            for callback in self._sampled_subscribers:
+                callback(event)
+
+
+class SlowRequestLog(object):
+    """
+    Keeps the response and error events of requests which took at least `threshold` seconds.  Subscribe it to a
+    :class:`Tracer` with :meth:`attach` so that it sees every request regardless of sampling.
+
+    :ivar float threshold: Seconds a request must take to be logged
+    :ivar entries: :class:`collections.deque` of the most recent slow :class:`TraceEvent` objects
+    """
+
+    def __init__(self, threshold=1.0, max_entries=1000, *args, **kwargs):
+        """
+        :param float threshold: Seconds a request must take to be logged.  Default is 1.
+        :param int max_entries: The most events kept.  Default is 1000.
+        """
+        super(SlowRequestLog, self).__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.entries = deque(maxlen=max_entries)
+
+    def __call__(self, event):
+        if event.name in (TraceEvents.RESPONSE_RECEIVED, TraceEvents.REQUEST_ERROR) and \
+                event.duration is not None and event.duration >= self.threshold:
+            self.entries.append(event)
+
+    def attach(self, tracer):
+        """
+        Subscribe to every request traced by `tracer`
+
+        :returns: self
+        """
+        tracer.subscribe(self, sampled=False)
+        return self
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+jwt_apns_client/transports
+
+HTTP/2 transports which send the requests built by :class:`jwt_apns_client.jwt_apns_client.APNSConnection`.
+
+A transport makes connections to a host.  Connections have the subset of hyper's connection interface which the
+client uses: `request()` sends a request and returns its stream id, `get_response(stream_id)` returns an object
+with a `status` and a `read()` method, `close(error_code=None)`, and `host` and `port` attributes.  A request sent
+over HTTP/1.1, such as the first plaintext request on hyper's `HTTPConnection`, has a stream id of None and its
+response is read with `get_response()`.  A connection which raises
+:class:`jwt_apns_client.exceptions.ConnectionClosedError` is closed and replaced with a new one.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import select
+import socket
+import ssl
+import threading
+
+import h2.events
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+from hyper import HTTPConnection, HTTP20Connection
+
+from .exceptions import ConnectionClosedError, StreamResetError
+from .utils import monotonic
+
+
+class HyperTransport(object):
+    """
+    Makes connections using hyper.
+
+    hyper's `HTTPConnection` starts out as an HTTP/1.1 connection and replaces itself with an HTTP/2 connection
+    during the first request, which is not safe to do from multiple threads at once. When `thread_safe` is set an
+    `HTTP20Connection` is used directly instead, which allows concurrent requests from multiple threads as separate
+    streams.
+
+    :ivar bool thread_safe: Whether connections may be shared between threads
+    """
+
+    def __init__(self, thread_safe=False, *args, **kwargs):
+        super(HyperTransport, self).__init__(*args, **kwargs)
+        self.thread_safe = thread_safe
+
+    def make_connection(self, host, port, secure=True):
+        """
+        :returns: A hyper connection
+        """
+        if self.thread_safe:
+            return HTTP20Connection(host=host, port=port, secure=secure)
+        return HTTPConnection(host=host, port=port, secure=secure)
+
+
+class H2Transport(object):
+    """
+    Makes :class:`H2SocketConnection` connections, which use the h2 state machine directly over a socket.
+    Connections are always safe to share between threads.
+
+    TLS sessions are cached per host so that reconnecting, such as after an `IdleTimeout`, resumes the previous
+    session rather than doing a full handshake.
+
+    :ivar ssl_context: The :class:`ssl.SSLContext` for TLS connections.  A default context negotiating h2 is
+        used if not set.  Sessions can only be resumed with a context which is reused, so the default context is
+        created once per transport.
+    :ivar float timeout: Socket timeout in seconds
+    :ivar session_cache: The :class:`TLSSessionCache`.  None disables session resumption.
+    """
+
+    def __init__(self, ssl_context=None, timeout=None, session_cache=True, *args, **kwargs):
+        """
+        :param ssl_context: The :class:`ssl.SSLContext` for TLS connections.  Default is None, which uses a context
+            negotiating h2.
+        :param float timeout: Socket timeout in seconds.  Default is None, which never times out.
+        :param session_cache: A :class:`TLSSessionCache` to share between transports, True to create one or None
+            to disable session resumption.  Sessions are only resumed by transports with the same `ssl_context`.
+            Default is True.
+        """
+        super(H2Transport, self).__init__(*args, **kwargs)
+        self.ssl_context = ssl_context or make_ssl_context()
+        self.timeout = timeout
+        self.session_cache = TLSSessionCache() if session_cache is True else session_cache
+
+    def make_connection(self, host, port, secure=True):
+        """
+        :returns: A :class:`H2SocketConnection`
+        """
+        return H2SocketConnection(host, port, secure=secure, ssl_context=self.ssl_context, timeout=self.timeout,
+                                  session_cache=self.session_cache)
+
+    def get_stats(self):
+        """
+        :returns: A dict of TLS handshake stats from :meth:`TLSSessionCache.get_stats`, or an empty dict if session
+            resumption is disabled.
+        """
+        return self.session_cache.get_stats() if self.session_cache is not None else {}
+
+
+class TLSSessionCache(object):
+    """
+    Keeps the most recent TLS session for each host and port so that new connections can resume it, and records
+    how long handshakes take and how often sessions are resumed.
+
+    A session can only be resumed with the :class:`ssl.SSLContext` which created it, so sessions are also kept per
+    context and a cache may be shared by transports with different contexts.
+
+    :ivar int handshakes: The number of TLS handshakes
+    :ivar int resumed: The number of handshakes which resumed a cached session
+    :ivar float handshake_time: Total seconds spent in handshakes
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TLSSessionCache, self).__init__(*args, **kwargs)
+        self.handshakes = 0
+        self.resumed = 0
+        self.handshake_time = 0.0
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, host, port, context=None):
+        """
+        :returns: The cached :class:`ssl.SSLSession` for the host and context or None
+        """
+        return self._sessions.get((context, host, port))
+
+    def set(self, host, port, session, context=None):
+        if session is not None:
+            self._sessions[(context, host, port)] = session
+
+    def record_handshake(self, seconds, resumed):
+        with self._lock:
+            self.handshakes += 1
+            self.handshake_time += seconds
+            if resumed:
+                self.resumed += 1
+
+    def get_stats(self):
+        """
+        :returns: A dict with the number of `handshakes`, the number `resumed`, the `resumption_rate`, and the
+            `handshake_time` and `mean_handshake_time` in seconds
+        """
+        with self._lock:
+            return {
+                'handshakes': self.handshakes,
+                'resumed': self.resumed,
+                'resumption_rate': self.resumed / self.handshakes if self.handshakes else 0.0,
+                'handshake_time': self.handshake_time,
+                'mean_handshake_time': self.handshake_time / self.handshakes if self.handshakes else 0.0,
+            }
+
+
+def make_ssl_context():
+    """
+    Returns a default :class:`ssl.SSLContext` which negotiates HTTP/2
+    """
+    context = ssl.create_default_context()
+    context.set_alpn_protocols(['h2'])
+    return context
+
+
+class H2Response(object):
+    """
+    A complete response to a request on an :class:`H2SocketConnection`
+
+    :ivar int status: The HTTP status code
+    :ivar dict headers: The response headers
+    """
+
+    def __init__(self, status, headers, body, *args, **kwargs):
+        super(H2Response, self).__init__(*args, **kwargs)
+        self.status = status
+        self.headers = headers
+        self._body = body
+
+    def read(self):
+        return self._body
+
+
+class _Stream(object):
+
+    def __init__(self):
+        self.status = None
+        self.headers = {}
+        self.data = []
+        self.ended = False
+        self.error = None
+
+
+class H2SocketConnection(object):
+    """
+    A thread safe HTTP/2 client connection using h2 over a blocking socket.
+
+    Requests from any number of threads are sent as separate streams.  Whichever thread is waiting for a response
+    reads from the socket and stores the events for every stream, so each thread gets the response for its own
+    stream.
+
+    The connection is never reopened once it has been closed, whether by :meth:`close`, the server or an error,
+    so that a new socket's stream ids cannot be confused with those of requests still waiting on the old one.
+    Requests then raise :class:`jwt_apns_client.exceptions.ConnectionClosedError` and a new connection must be made.
+
+    :ivar str host: The host to connect to
+    :ivar int port: The port to connect to
+    :ivar bool secure: Whether to use TLS
+    """
+
+    def __init__(self, host, port=443, secure=True, ssl_context=None, timeout=None, session_cache=None, *args,
+                 **kwargs):
+        super(H2SocketConnection, self).__init__(*args, **kwargs)
+        self.host = host
+        self.port = port
+        self.secure = secure
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.session_cache = session_cache
+        self._sock = None
+        self._conn = None
+        self._streams = {}
+        self._closed = False
+        # _lock guards the h2 state machine, the streams and writes to the socket.  _read_lock makes sure only one
+        # thread reads from the socket at a time.  _read_lock is never acquired while holding _lock.
+        self._lock = threading.RLock()
+        self._read_lock = threading.Lock()
+
+    def connect(self):
+        """
+        Connect to the server.  A no-op if already connected.
+        """
+        with self._lock:
+            if self._sock is not None:
+                return
+            if self._closed:
+                raise ConnectionClosedError('Connection to %s:%s is closed' % (self.host, self.port))
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+            try:
+                if self.secure:
+                    context = self.ssl_context or make_ssl_context()
+                    sock = self.wrap_socket(context, sock)
+                conn = H2Connection(config=H2Configuration(client_side=True, header_encoding='utf-8'))
+                conn.initiate_connection()
+                sock.sendall(conn.data_to_send())
+            except Exception:
+                sock.close()
+                raise
+            self._sock, self._conn = sock, conn
+
+    @property
+    def closed(self):
+        """
+        True once the connection has been closed and can no longer be used
+        """
+        return self._closed
+
+    def wrap_socket(self, context, sock):
+        """
+        Start TLS on a connected socket, resuming a cached session if there is one
+
+        :returns: The wrapped socket
+        """
+        cache = self.session_cache
+        if cache is None:
+            return context.wrap_socket(sock, server_hostname=self.host)
+
+        session = cache.get(self.host, self.port, context)
+        started = monotonic()
+        if session is not None:
+            try:
+                sock = context.wrap_socket(sock, server_hostname=self.host, session=session)
+            except ValueError:
+                # The session can not be used with this context.  The failed wrap closed the socket, so connect
+                # again and do a full handshake.
+                sock = context.wrap_socket(socket.create_connection((self.host, self.port), self.timeout),
+                                           server_hostname=self.host)
+        else:
+            sock = context.wrap_socket(sock, server_hostname=self.host)
+        cache.record_handshake(monotonic() - started, getattr(sock, 'session_reused', False))
+        cache.set(self.host, self.port, getattr(sock, 'session', None), context)
+        return sock
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        Send a request.
+
+        :returns: The stream id of the request
+        """
+        self.connect()
+        request_headers = [
+            (':method', method),
+            (':scheme', 'https' if self.secure else 'http'),
+            (':authority', self.host),
+            (':path', url),
+        ]
+        request_headers.extend((headers or {}).items())
+        if body:
+            request_headers.append(('content-length', '%d' % len(body)))
+
+        with self._lock:
+            conn = self._check_connection()
+            stream_id = conn.get_next_available_stream_id()
+            self._streams[stream_id] = _Stream()
+            conn.send_headers(stream_id, request_headers, end_stream=not body)
+            self._sock.sendall(conn.data_to_send())
+
+        while body:
+            with self._lock:
+                conn = self._check_connection()
+                window = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size)
+                if window > 0:
+                    chunk, body = body[:window], body[window:]
+                    conn.send_data(stream_id, chunk, end_stream=not body)
+                    self._sock.sendall(conn.data_to_send())
+                    continue
+            # Wait for the server to open the flow control window.
+            self._receive()
+        return stream_id
+
+    def get_response(self, stream_id):
+        """
+        Wait for the response to a request.
+
+        :returns: A :class:`H2Response`
+        """
+        stream = self._streams[stream_id]
+        while not stream.ended:
+            self._receive(stream)
+        with self._lock:
+            self._streams.pop(stream_id, None)
+        if stream.error is not None:
+            raise stream.error
+        return H2Response(stream.status, stream.headers, b''.join(stream.data))
+
+    def _check_connection(self):
+        if self._conn is None:
+            raise ConnectionClosedError('Connection to %s:%s is closed' % (self.host, self.port))
+        return self._conn
+
+    def _receive(self, stream=None):
+        """
+        Read from the socket once and handle the events.  Returns without reading if `stream` has already been
+        completed by another thread.
+        """
+        with self._read_lock:
+            if stream is not None and stream.ended:
+                return
+            sock = self._sock
+            if sock is None:
+                self._fail_streams(ConnectionClosedError('Connection to %s:%s is closed' % (self.host, self.port)))
+                return
+            try:
+                # Wait for data without holding _lock so that other threads can keep sending.  The read itself
+                # happens under _lock because an SSL socket must not be read from and written to at the same time.
+                if not (hasattr(sock, 'pending') and sock.pending()):
+                    if not select.select([sock], [], [], self.timeout)[0]:
+                        raise socket.timeout('timed out')
+                with self._lock:
+                    if self._sock is not sock:
+                        return
+                    data = sock.recv(65535)
+                    if not data:
+                        raise ConnectionClosedError('Connection to %s:%s closed by server' % (self.host, self.port))
+                    conn = self._conn
+                    for event in conn.receive_data(data):
+                        self._handle_event(conn, event)
+                    outgoing = conn.data_to_send()
+                    if outgoing:
+                        sock.sendall(outgoing)
+            except (socket.error, IOError, ConnectionClosedError) as e:
+                self._reset(e)
+                if not isinstance(e, ConnectionClosedError):
+                    raise
+
+    def _handle_event(self, conn, event):
+        if isinstance(event, h2.events.ConnectionTerminated):
+            self._reset(ConnectionClosedError('Connection terminated by server with error code %s'
+                                              % event.error_code))
+            return
+
+        stream = self._streams.get(getattr(event, 'stream_id', None))
+        if isinstance(event, h2.events.DataReceived):
+            conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+        if stream is None:
+            return
+
+        if isinstance(event, h2.events.ResponseReceived):
+            stream.headers = dict(event.headers)
+            stream.status = int(stream.headers[':status'])
+        elif isinstance(event, h2.events.DataReceived):
+            stream.data.append(event.data)
+        elif isinstance(event, h2.events.StreamEnded):
+            stream.ended = True
+        elif isinstance(event, h2.events.StreamReset):
+            stream.error = StreamResetError('Stream %d reset with error code %s' % (event.stream_id, event.error_code))
+            stream.ended = True
+
+    def _fail_streams(self, error):
+        with self._lock:
+            for stream in self._streams.values():
+                if not stream.ended:
+                    stream.error = error
+                    stream.ended = True
+
+    def _reset(self, error):
+        """
+        Drop the socket, fail every stream still waiting for a response and mark the connection closed
+        """
+        with self._lock:
+            sock, self._sock, self._conn = self._sock, None, None
+            self._closed = True
+            self._fail_streams(error)
+        if sock is not None:
+            # With TLS 1.3 the session ticket arrives after the handshake, so cache the session again now.
+            if self.session_cache is not None and getattr(sock, 'session', None) is not None:
+                self.session_cache.set(self.host, self.port, sock.session, getattr(sock, 'context', None))
+            sock.close()
+
+    def close(self, error_code=None):
+        """
+        Close the connection.  Requests still waiting for a response fail with :class:`ConnectionClosedError`.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close_connection(error_code=error_code or 0)
+                try:
+                    self._sock.sendall(self._conn.data_to_send())
+                except (socket.error, IOError):
+                    pass
+        self._reset(ConnectionClosedError('Connection to %s:%s is closed' % (self.host, self.port)))
@@ -6,9 +6,27 @@ General utility classes and functions
 """
 from __future__ import absolute_import, unicode_literals, print_function, division
 
+import json
 import jwt
 import time
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Clock for measuring intervals.  time.monotonic() is not available on python 2.
+monotonic = getattr(time, 'monotonic', time.time)
+
+# Compact separators.  The default json separators add a space after every comma and colon, which counts
+# against the APNs payload size limit.
+JSON_SEPARATORS = (',', ':')
+
 
 class APNSReasons(object):
     """
@@ -93,3 +111,45 @@ def make_provider_token(issuer, secret, issued_at=None, headers=None):
         headers=headers
     )
     return token
+
+
+def _orjson_dumps(data):
+    return orjson.dumps(data)
+
+
+def _ujson_dumps(data):
+    return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+
+def _json_dumps(data):
+    return json.dumps(data, separators=JSON_SEPARATORS, ensure_ascii=False).encode('utf-8')
+
+
+# Available json encoders in order of preference.  Each takes the data to encode and returns compact, utf-8
+# encoded json as bytes.
+JSON_ENCODERS = [
+    ('orjson', _orjson_dumps if orjson is not None else None),
+    ('ujson', _ujson_dumps if ujson is not None else None),
+    ('json', _json_dumps),
+]
+
+
+def get_json_encoder(name=None):
+    """
+    Get a function for encoding APNs payloads as compact, utf-8 encoded json.
+
+    :param str name: The encoder to use. One of `orjson`, `ujson` or `json`.  If not specified then the fastest
+        installed encoder is used, falling back to the standard library `json` module.
+    :returns: A function which takes the data to encode and returns bytes
+    """
+    for encoder_name, encoder in JSON_ENCODERS:
+        if name is None and encoder is not None:
+            return encoder
+        if name == encoder_name:
+            if encoder is None:
+                raise ValueError('json encoder %s is not installed' % name)
+            return encoder
+    raise ValueError('Unknown json encoder %s' % name)
+
+
+json_dumps = get_json_encoder()
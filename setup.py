@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import sys
+
 from setuptools import setup
+from setuptools.command.build_py import build_py
 
 with open('README.rst') as readme_file:
     readme = readme_file.read()
@@ -15,8 +18,30 @@ requirements = [
     'cryptography>=1.5.3',
     'PyJWT>=1.4.2',
     'hyper>=0.7.0',
+    'h2>=2.5.0',
 ]
 
+if sys.version_info < (3,):
+    requirements.append('futures>=3.0.5')
+
+extras_requirements = {
+    'orjson': ['orjson'],
+    'ujson': ['ujson'],
+}
+
+# Modules which use syntax added in Python 3.5, left out of builds for earlier versions so that the installed
+# package byte compiles.
+PY35_MODULES = ('aio',)
+
+
+class BuildPy(build_py):
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 5):
+            modules = [m for m in modules if m[1] not in PY35_MODULES]
+        return modules
+
+
 test_requirements = [
     # TODO: put package test requirements here
 ]
@@ -34,13 +59,16 @@ setup(
     ],
     package_dir={'jwt_apns_client':
                  'jwt_apns_client'},
+    cmdclass={'build_py': BuildPy},
     entry_points={
         'console_scripts': [
-            'jwt_apns_client=jwt_apns_client.cli:main'
+            'jwt_apns_client=jwt_apns_client.cli:main',
+            'jwt_apns_loadtest=jwt_apns_client.cli:loadtest',
         ]
     },
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     zip_safe=False,
     keywords='jwt_apns_client',
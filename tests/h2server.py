@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+A minimal plaintext HTTP/2 server standing in for APNs in tests.
+
+Responds 200 to every notification, except for device tokens starting with `bad` which get a 400
+`BadDeviceToken` response.
+
+Pass an `ssl.SSLContext` to serve over TLS.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import json
+import socket
+import threading
+
+import h2.events
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+
+
+class H2TestServer(object):
+
+    def __init__(self, ssl_context=None):
+        self.ssl_context = ssl_context
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.host, self.port = self.sock.getsockname()
+        self.requests = []
+        self.connections = 0
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.sock.close()
+        return False
+
+    def _serve(self):
+        while True:
+            try:
+                client, address = self.sock.accept()
+            except (socket.error, OSError):
+                return
+            if self.ssl_context is not None:
+                try:
+                    client = self.ssl_context.wrap_socket(client, server_side=True)
+                except (socket.error, OSError):
+                    continue
+            self.connections += 1
+            t = threading.Thread(target=self._handle, args=(client,))
+            t.daemon = True
+            t.start()
+
+    def _handle(self, client):
+        conn = H2Connection(config=H2Configuration(client_side=False, header_encoding='utf-8'))
+        conn.initiate_connection()
+        client.sendall(conn.data_to_send())
+        headers = {}
+        bodies = {}
+        while True:
+            try:
+                data = client.recv(65535)
+            except (socket.error, OSError):
+                return
+            if not data:
+                return
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    headers[event.stream_id] = dict(event.headers)
+                    bodies[event.stream_id] = b''
+                elif isinstance(event, h2.events.DataReceived):
+                    bodies[event.stream_id] += event.data
+                    conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    self._respond(conn, event.stream_id, headers.pop(event.stream_id),
+                                  bodies.pop(event.stream_id))
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    client.close()
+                    return
+            try:
+                client.sendall(conn.data_to_send())
+            except (socket.error, OSError):
+                # The client dropped the connection before reading the response.
+                return
+
+    def _respond(self, conn, stream_id, headers, body):
+        self.requests.append((headers, body))
+        token = headers[':path'].rsplit('/', 1)[1]
+        if token.startswith('bad'):
+            status, data = '400', json.dumps({'reason': 'BadDeviceToken'}).encode('utf-8')
+        else:
+            status, data = '200', b''
+        response_headers = [(':status', status), ('apns-id', headers.get('apns-id', 'server-id'))]
+        conn.send_headers(stream_id, response_headers, end_stream=not data)
+        if data:
+            conn.send_data(stream_id, data, end_stream=True)
+
+
+def make_certificate(directory):
+    """
+    Write a self signed certificate and key for 127.0.0.1 to `directory`.
+
+    :returns: A tuple of the certificate path and the key path
+    """
+    import datetime
+    import ipaddress
+    import os
+
+    from cryptography import x509
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, '127.0.0.1')])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1)) \
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]),
+                       critical=False) \
+        .sign(key, hashes.SHA256(), default_backend())
+
+    cert_path = os.path.join(directory, 'cert.pem')
+    key_path = os.path.join(directory, 'key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_aio
+----------------------------------
+
+Tests for `jwt_apns_client.aio` module.
+"""
+
+import sys
+import unittest
+
+from jwt_apns_client.jwt_apns_client import APNSConnection
+from jwt_apns_client.utils import APNSReasons
+
+from .h2server import H2TestServer
+
+# The tests themselves avoid async syntax so that this module still imports, and is skipped, on older versions.
+if sys.version_info >= (3, 5):
+    import asyncio
+
+    from jwt_apns_client.aio import AsyncAPNSConnection
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio support requires Python 3.5 or later')
+class AsyncAPNSConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def make_connection(self, server):
+        return AsyncAPNSConnection(APNSConnection(api_host=server.host, api_port=server.port, secure=False,
+                                                  provider_token=b'token', topic='com.example.app'))
+
+    def test_send_notification(self):
+        with H2TestServer() as server:
+            connection = self.make_connection(server)
+            try:
+                response = self.loop.run_until_complete(connection.send_notification('token1', alert='Testing'))
+            finally:
+                self.loop.run_until_complete(connection.close())
+        self.assertEqual(200, response.status)
+        headers, body = server.requests[0]
+        self.assertEqual('/3/device/token1', headers[':path'])
+        self.assertEqual(b'{"aps":{"alert":"Testing"}}', body)
+
+    def test_concurrent_notifications(self):
+        tokens = ['token%d' % i if i % 3 else 'bad%d' % i for i in range(30)]
+
+        with H2TestServer() as server:
+            connection = self.make_connection(server)
+            try:
+                tasks = [self.loop.create_task(connection.send_notification(token, alert='Testing'))
+                         for token in tokens]
+                responses = self.loop.run_until_complete(asyncio.gather(*tasks))
+            finally:
+                self.loop.run_until_complete(connection.close())
+        self.assertEqual(1, server.connections)
+        for token, response in zip(tokens, responses):
+            self.assertTrue(response.path.endswith(token))
+            if token.startswith('bad'):
+                self.assertEqual(APNSReasons.BAD_DEVICE_TOKEN, response.reason)
+            else:
+                self.assertEqual(200, response.status)
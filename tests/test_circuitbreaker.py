@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_circuitbreaker
+----------------------------------
+
+Tests for `jwt_apns_client.circuitbreaker` module.
+"""
+
+import os
+import socket
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client import jwt_apns_client
+from jwt_apns_client.circuitbreaker import CircuitBreaker
+from jwt_apns_client.exceptions import CircuitOpenError
+from jwt_apns_client.utils import APNSReasons
+
+from .test_jwt_apns_client import make_http_response_mock
+
+KEY_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_files', 'apns_key.p8')
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    @mock.patch('jwt_apns_client.circuitbreaker.monotonic', return_value=100.0)
+    def test_opens_after_threshold(self, monotonic_mock):
+        breaker = CircuitBreaker(failure_threshold=3)
+        self.assertFalse(breaker.record_failure())
+        self.assertFalse(breaker.record_failure())
+        breaker.before_request()
+        self.assertTrue(breaker.record_failure())
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        self.assertFalse(breaker.record_failure())
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+    @mock.patch('jwt_apns_client.circuitbreaker.monotonic', return_value=100.0)
+    def test_half_open_probe(self, monotonic_mock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, half_open_max_calls=1)
+        breaker.record_failure()
+        monotonic_mock.return_value = 110.0
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+        breaker.before_request()
+        # only one probe at a time
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        breaker.before_request()
+
+    @mock.patch('jwt_apns_client.circuitbreaker.monotonic', return_value=100.0)
+    def test_failed_probe_reopens(self, monotonic_mock):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10)
+        for i in range(5):
+            breaker.record_failure()
+        monotonic_mock.return_value = 110.0
+        breaker.before_request()
+        self.assertTrue(breaker.record_failure())
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+
+    @mock.patch('jwt_apns_client.circuitbreaker.monotonic', return_value=100.0)
+    def test_unfinished_probe_expires(self, monotonic_mock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        breaker.record_failure()
+        monotonic_mock.return_value = 110.0
+        breaker.before_request()
+        monotonic_mock.return_value = 115.0
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+        # the probe never finished, so it counts as a failed probe
+        monotonic_mock.return_value = 120.0
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        monotonic_mock.return_value = 130.0
+        breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+
+class APNSConnectionCircuitBreakerTest(unittest.TestCase):
+
+    def make_connection(self, **kwargs):
+        return jwt_apns_client.APNSConnection(
+            team_id='TEAMID',
+            apns_key_id='KEYID',
+            apns_key_path=KEY_FILE_PATH,
+            environment=jwt_apns_client.APNSEnvironments.PROD,
+            **kwargs)
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_fails_fast_when_open(self, HTTPConnectionMock):
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock(
+            status=503, reason=APNSReasons.SHUTDOWN)
+        connection = self.make_connection(circuit_breaker=CircuitBreaker(failure_threshold=2))
+        for i in range(2):
+            self.assertEqual(503, connection.send_notification(device_registration_id='asdf12345').status)
+        with self.assertRaises(CircuitOpenError):
+            connection.send_notification(device_registration_id='asdf12345')
+        self.assertEqual(2, HTTPConnectionMock.return_value.request.call_count)
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_connection_errors_open_circuit(self, HTTPConnectionMock):
+        HTTPConnectionMock.return_value.request.side_effect = socket.error('Connection refused')
+        connection = self.make_connection(circuit_breaker=CircuitBreaker(failure_threshold=1))
+        with self.assertRaises(socket.error):
+            connection.send_notification(device_registration_id='asdf12345')
+        with self.assertRaises(CircuitOpenError):
+            connection.send_notification(device_registration_id='asdf12345')
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_probe_failing_on_replaced_connection(self, HTTPConnectionMock):
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock(
+            status=503, reason=APNSReasons.SHUTDOWN)
+        connection = self.make_connection(circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+        connection.send_notification(device_registration_id='asdf12345')
+
+        pending = connection.request_notification(device_registration_id='asdf12345')
+        # another thread replaces the connection before the probe's response is read
+        connection._close_connection(pending.connection)
+        HTTPConnectionMock.return_value.get_response.side_effect = socket.error('Connection reset')
+        with self.assertRaises(socket.error):
+            connection.get_notification_response(pending)
+
+        HTTPConnectionMock.return_value.get_response.side_effect = None
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock(status=200)
+        self.assertEqual(200, connection.send_notification(device_registration_id='asdf12345').status)
+        self.assertEqual(CircuitBreaker.CLOSED, connection.circuit_breaker.state)
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_fails_over_to_alternate_port(self, HTTPConnectionMock):
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock(
+            status=500, reason=APNSReasons.INTERNAL_SERVER_ERROR)
+        connection = self.make_connection(
+            circuit_breaker=CircuitBreaker(failure_threshold=1),
+            failover_hosts=[(jwt_apns_client.PROD_API_HOST, jwt_apns_client.ALTERNATE_API_PORT)])
+        connection.send_notification(device_registration_id='asdf12345')
+        self.assertEqual(jwt_apns_client.ALTERNATE_API_PORT, connection.api_port)
+        self.assertEqual(CircuitBreaker.CLOSED, connection.circuit_breaker.state)
+
+        connection.send_notification(device_registration_id='asdf12345')
+        HTTPConnectionMock.assert_called_with(host=jwt_apns_client.PROD_API_HOST,
+                                              port=jwt_apns_client.ALTERNATE_API_PORT, secure=True)
+        # every host has been tried, so the circuit stays open
+        with self.assertRaises(CircuitOpenError):
+            connection.send_notification(device_registration_id='asdf12345')
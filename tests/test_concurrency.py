@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_concurrency
+----------------------------------
+
+Tests for `jwt_apns_client.concurrency` module.
+"""
+
+import socket
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client.concurrency import AIMDLimiter
+from jwt_apns_client.dispatcher import Dispatcher
+from jwt_apns_client.exceptions import CircuitOpenError, DuplicateNotificationError
+from jwt_apns_client.jwt_apns_client import APNSConnection, NotificationResponse
+from jwt_apns_client.utils import APNSReasons
+
+OK = NotificationResponse(status=200)
+TOO_MANY_REQUESTS = NotificationResponse(status=429, reason=APNSReasons.TOO_MANY_REQUESTS)
+
+
+class AIMDLimiterTest(unittest.TestCase):
+
+    def test_increases_while_latency_is_flat(self):
+        """
+        The limit should grow by about one per window of successful responses.
+        """
+        limiter = AIMDLimiter(initial_limit=10)
+        for i in range(10):
+            limiter.on_response(0.05, OK)
+        self.assertEqual(10, limiter.limit)
+        limiter.on_response(0.05, OK)
+        self.assertEqual(11, limiter.limit)
+        self.assertEqual(0.05, limiter.baseline_latency)
+
+    def test_never_exceeds_max_limit(self):
+        limiter = AIMDLimiter(initial_limit=2, max_limit=3)
+        for i in range(100):
+            limiter.on_response(0.05, OK)
+        self.assertEqual(3, limiter.limit)
+
+    @mock.patch('jwt_apns_client.concurrency.monotonic')
+    def test_backs_off_on_too_many_requests(self, monotonic_mock):
+        monotonic_mock.return_value = 100.0
+        limiter = AIMDLimiter(initial_limit=40)
+        limiter.on_response(0.05, TOO_MANY_REQUESTS)
+        self.assertEqual(20, limiter.limit)
+
+    @mock.patch('jwt_apns_client.concurrency.monotonic')
+    def test_backs_off_on_service_unavailable(self, monotonic_mock):
+        monotonic_mock.return_value = 100.0
+        limiter = AIMDLimiter(initial_limit=40)
+        limiter.on_response(0.05, NotificationResponse(status=503, reason=APNSReasons.SERVICE_UNAVAILABLE))
+        self.assertEqual(20, limiter.limit)
+
+    @mock.patch('jwt_apns_client.concurrency.monotonic')
+    def test_backs_off_on_latency_spike(self, monotonic_mock):
+        monotonic_mock.return_value = 100.0
+        limiter = AIMDLimiter(initial_limit=40, latency_tolerance=2.0)
+        limiter.on_response(0.05, OK)
+        limiter.on_response(0.5, OK)
+        self.assertEqual(20, limiter.limit)
+
+    @mock.patch('jwt_apns_client.concurrency.monotonic')
+    def test_backs_off_once_per_round_trip(self, monotonic_mock):
+        """
+        A batch of errors from the same overload should only back off once.
+        """
+        monotonic_mock.return_value = 100.0
+        limiter = AIMDLimiter(initial_limit=40, min_limit=2)
+        for i in range(10):
+            limiter.on_response(0.05, TOO_MANY_REQUESTS)
+        self.assertEqual(20, limiter.limit)
+
+        monotonic_mock.return_value = 100.1
+        limiter.on_error()
+        self.assertEqual(10, limiter.limit)
+
+        for i in range(10):
+            monotonic_mock.return_value += 1
+            limiter.on_error()
+        self.assertEqual(2, limiter.limit)
+
+
+class DispatcherLimiterTest(unittest.TestCase):
+
+    def test_concurrency_follows_limiter(self):
+        limiter = AIMDLimiter(initial_limit=7)
+        dispatcher = Dispatcher(mock.Mock(spec=APNSConnection), batch_size=100, limiter=limiter)
+        self.assertEqual(7, dispatcher.concurrency)
+
+    def test_responses_update_limiter(self):
+        connection = mock.Mock(spec=APNSConnection)
+        connection.get_notification_response.return_value = TOO_MANY_REQUESTS
+        limiter = mock.Mock(spec=AIMDLimiter, limit=10)
+        with Dispatcher(connection, limiter=limiter) as dispatcher:
+            response = dispatcher.submit('asdf12345', alert='Testing').result(timeout=5)
+        self.assertEqual(429, response.status)
+        latency, limited_response = limiter.on_response.call_args[0]
+        self.assertIs(TOO_MANY_REQUESTS, limited_response)
+        self.assertTrue(latency >= 0)
+
+    def test_only_connection_errors_back_off(self):
+        connection = mock.Mock(spec=APNSConnection)
+        limiter = AIMDLimiter(initial_limit=64)
+        errors = [DuplicateNotificationError('Notification id1 was already sent'), CircuitOpenError('open'),
+                  KeyError('name'), socket.error('Connection reset by peer')]
+        with Dispatcher(connection, batch_size=1, limiter=limiter) as dispatcher:
+            for error in errors:
+                connection.request_notification.side_effect = error
+                self.assertIs(error, dispatcher.submit('asdf12345').exception(timeout=5))
+                if not isinstance(error, socket.error):
+                    self.assertEqual(64, limiter.limit)
+        self.assertEqual(32, limiter.limit)
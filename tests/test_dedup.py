@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_dedup
+----------------------------------
+
+Tests for `jwt_apns_client.dedup` module.
+"""
+
+import socket
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client import jwt_apns_client
+from jwt_apns_client.dedup import DedupCache
+from jwt_apns_client.exceptions import DuplicateNotificationError
+from jwt_apns_client.utils import APNSReasons
+
+from .test_jwt_apns_client import make_http_response_mock
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class DedupCacheTest(unittest.TestCase):
+
+    def test_add_rejects_repeats(self):
+        cache = DedupCache()
+        self.assertTrue(cache.add('id1'))
+        self.assertFalse(cache.add('id1'))
+        self.assertTrue(cache.add('id2'))
+        self.assertIn('id1', cache)
+
+    def test_ids_expire(self):
+        clock = FakeClock()
+        cache = DedupCache(ttl=10, clock=clock)
+        cache.add('id1')
+        clock.now = 5
+        cache.add('id2')
+        clock.now = 10
+        self.assertNotIn('id1', cache)
+        self.assertIn('id2', cache)
+        self.assertTrue(cache.add('id1'))
+
+    def test_size_is_bounded(self):
+        cache = DedupCache(max_size=2)
+        for apns_id in ('id1', 'id2', 'id3'):
+            cache.add(apns_id)
+        self.assertEqual(2, len(cache))
+        self.assertNotIn('id1', cache)
+
+    def test_discard(self):
+        cache = DedupCache()
+        cache.add('id1')
+        cache.discard('id1')
+        cache.discard('id2')
+        self.assertTrue(cache.add('id1'))
+
+
+class APNSConnectionDedupTest(unittest.TestCase):
+
+    def make_connection(self):
+        return jwt_apns_client.APNSConnection(provider_token=b'token', dedup_cache=DedupCache())
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_repeat_is_not_sent(self, HTTPConnectionMock):
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock()
+        connection = self.make_connection()
+        connection.send_notification('asdf12345', alert='Testing', apns_id='id1')
+        with self.assertRaises(DuplicateNotificationError):
+            connection.send_notification('asdf12345', alert='Testing', apns_id='id1')
+        connection.send_notification('asdf12345', alert='Testing')
+        connection.send_notification('asdf12345', alert='Testing')
+        self.assertEqual(3, HTTPConnectionMock.return_value.request.call_count)
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_failed_send_may_be_retried(self, HTTPConnectionMock):
+        HTTPConnectionMock.return_value.request.side_effect = socket.error('Connection refused')
+        connection = self.make_connection()
+        with self.assertRaises(socket.error):
+            connection.send_notification('asdf12345', alert='Testing', apns_id='id1')
+
+        HTTPConnectionMock.return_value.request.side_effect = None
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock(
+            status=503, reason=APNSReasons.SERVICE_UNAVAILABLE)
+        self.assertEqual(503, connection.send_notification('asdf12345', alert='Testing', apns_id='id1').status)
+        self.assertNotIn('id1', connection.dedup_cache)
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_too_many_requests_may_be_retried(self, HTTPConnectionMock):
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock(
+            status=429, reason=APNSReasons.TOO_MANY_REQUESTS)
+        connection = self.make_connection()
+        self.assertEqual(429, connection.send_notification('asdf12345', alert='Testing', apns_id='id1').status)
+        self.assertNotIn('id1', connection.dedup_cache)
+
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock()
+        self.assertEqual(200, connection.send_notification('asdf12345', alert='Testing', apns_id='id1').status)
+        self.assertIn('id1', connection.dedup_cache)
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_idle_timeout_may_be_retried(self, HTTPConnectionMock):
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock(
+            status=400, reason=APNSReasons.IDLE_TIMEOUT)
+        connection = self.make_connection()
+        connection.send_notification('asdf12345', alert='Testing', apns_id='id1')
+        self.assertNotIn('id1', connection.dedup_cache)
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_rejected_notification_is_remembered(self, HTTPConnectionMock):
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock(
+            status=410, reason=APNSReasons.UNREGISTERED)
+        connection = self.make_connection()
+        connection.send_notification('asdf12345', alert='Testing', apns_id='id1')
+        with self.assertRaises(DuplicateNotificationError):
+            connection.send_notification('asdf12345', alert='Testing', apns_id='id1')
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_dispatcher
+----------------------------------
+
+Tests for `jwt_apns_client.dispatcher` module.
+"""
+
+import threading
+import unittest
+from concurrent.futures import Future
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client import dispatcher as dispatcher_module
+from jwt_apns_client.dispatcher import Dispatcher
+from jwt_apns_client.exceptions import QueueFullError
+from jwt_apns_client.jwt_apns_client import APNSConnection, NotificationResponse, PendingNotification
+from jwt_apns_client.ratelimit import RateLimiter
+
+
+def make_connection_mock():
+    """
+    An APNSConnection mock which responds with a 200 for every notification and records the order requests and
+    responses are made in.
+    """
+    connection = mock.Mock(spec=APNSConnection)
+    connection.calls = []
+
+    def request_notification(device_registration_id, **kwargs):
+        connection.calls.append(('request', device_registration_id))
+        return PendingNotification(device_registration_id=device_registration_id, payload=kwargs)
+
+    def get_notification_response(pending):
+        connection.calls.append(('response', pending.device_registration_id))
+        return NotificationResponse(status=200, path='/3/device/%s' % pending.device_registration_id)
+
+    connection.request_notification.side_effect = request_notification
+    connection.get_notification_response.side_effect = get_notification_response
+    return connection
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def test_submit_returns_future_with_response(self):
+        connection = make_connection_mock()
+        with Dispatcher(connection) as dispatcher:
+            future = dispatcher.submit('asdf12345', alert='Testing', badge=1)
+            response = future.result(timeout=5)
+        self.assertEqual(200, response.status)
+        self.assertEqual('/3/device/asdf12345', response.path)
+        connection.request_notification.assert_called_once_with('asdf12345', alert='Testing', badge=1)
+
+    def test_requests_are_batched(self):
+        """
+        All of the notifications in a batch should be requested before any responses are read.
+        """
+        connection = make_connection_mock()
+        dispatcher = Dispatcher(connection, batch_size=10)
+        # Queue everything before the I/O thread starts so that it is all taken as one batch.
+        for i in range(3):
+            dispatcher._queue.put((Future(), 'token%d' % i, {}))
+        dispatcher._start()
+        dispatcher.shutdown(wait=True)
+        self.assertEqual(
+            [('request', 'token0'), ('request', 'token1'), ('request', 'token2'),
+             ('response', 'token0'), ('response', 'token1'), ('response', 'token2')],
+            connection.calls)
+
+    def test_rate_limited_notifications_do_not_hold_up_batch(self):
+        """
+        A notification over its topic's rate limit should be sent in a later batch rather than delaying the others.
+        """
+        connection = make_connection_mock()
+        connection.topic = 'com.example.slow'
+        connection.rate_limiter = RateLimiter()
+        connection.rate_limiter.set_rate('com.example.slow', 10, capacity=1)
+        dispatcher = Dispatcher(connection, batch_size=10)
+        futures = [Future() for i in range(3)]
+        dispatcher._queue.put((futures[0], 'slow1', {}))
+        dispatcher._queue.put((futures[1], 'slow2', {}))
+        dispatcher._queue.put((futures[2], 'fast1', {'topic': 'com.example.fast'}))
+        dispatcher._start()
+        dispatcher.shutdown(wait=True)
+        self.assertEqual([200, 200, 200], [future.result().status for future in futures])
+        self.assertEqual(
+            [('request', 'slow1'), ('request', 'fast1'), ('response', 'slow1'), ('response', 'fast1'),
+             ('request', 'slow2'), ('response', 'slow2')],
+            connection.calls)
+        connection.request_notification.assert_any_call('slow2', rate_limit=False)
+
+    @mock.patch('jwt_apns_client.dispatcher.logger')
+    def test_result_sink_errors_do_not_stop_sending(self, logger_mock):
+        result_sink = mock.Mock()
+        result_sink.add.side_effect = RuntimeError('cannot add results after close')
+        with Dispatcher(make_connection_mock(), result_sink=result_sink) as dispatcher:
+            futures = [dispatcher.submit('token%d' % i) for i in range(5)]
+            self.assertEqual([200] * 5, [future.result(timeout=5).status for future in futures])
+        self.assertEqual(5, dispatcher.result_sink_errors)
+        self.assertEqual(5, logger_mock.error.call_count)
+
+    @mock.patch('jwt_apns_client.dispatcher.logger')
+    def test_unexpected_error_fails_outstanding_notifications(self, logger_mock):
+        limiter = mock.Mock(limit=2)
+        limiter.on_response.side_effect = ValueError('bad limiter')
+        dispatcher = Dispatcher(make_connection_mock(), limiter=limiter)
+        futures = [Future() for i in range(5)]
+        for i, future in enumerate(futures):
+            dispatcher._queue.put((future, 'token%d' % i, {}))
+        dispatcher._start()
+        dispatcher._thread.join(5)
+        self.assertFalse(dispatcher._thread.is_alive())
+        for future in futures:
+            self.assertIsInstance(future.exception(timeout=5), ValueError)
+        with self.assertRaises(RuntimeError):
+            dispatcher.submit('token5')
+        self.assertEqual(1, logger_mock.error.call_count)
+
+    def test_exception_is_set_on_future(self):
+        connection = make_connection_mock()
+        connection.request_notification.side_effect = ValueError('bad')
+        with Dispatcher(connection) as dispatcher:
+            future = dispatcher.submit('asdf12345', alert='Testing')
+            self.assertIsInstance(future.exception(timeout=5), ValueError)
+
+    def test_submit_raises_when_queue_full(self):
+        connection = make_connection_mock()
+        started = threading.Event()
+        release = threading.Event()
+
+        def request_notification(device_registration_id, **kwargs):
+            started.set()
+            release.wait(5)
+            return PendingNotification(device_registration_id=device_registration_id)
+
+        connection.request_notification.side_effect = request_notification
+        dispatcher = Dispatcher(connection, max_queue_size=1, batch_size=1, block=False)
+        first = dispatcher.submit('token0')
+        self.assertTrue(started.wait(5))
+        second = dispatcher.submit('token1')
+        with self.assertRaises(QueueFullError):
+            dispatcher.submit('token2')
+        release.set()
+        dispatcher.shutdown(wait=True)
+        self.assertEqual(200, first.result().status)
+        self.assertEqual(200, second.result().status)
+
+    def test_submit_racing_shutdown_is_sent(self):
+        """
+        A notification being queued while the dispatcher shuts down should be sent rather than left queued behind
+        the stop marker.
+        """
+        dispatcher = Dispatcher(make_connection_mock())
+        dispatcher.submit('token0').result(timeout=5)
+        queue_put = dispatcher._queue.put
+        shutdown = threading.Thread(target=dispatcher.shutdown)
+
+        def put(item, *args, **kwargs):
+            # give shutdown() the chance to queue its stop marker first
+            if item is not dispatcher_module._STOP and not shutdown.is_alive():
+                shutdown.start()
+                shutdown.join(0.2)
+            return queue_put(item, *args, **kwargs)
+
+        with mock.patch.object(dispatcher._queue, 'put', side_effect=put):
+            future = dispatcher.submit('token1')
+            shutdown.join(5)
+        self.assertFalse(shutdown.is_alive())
+        self.assertTrue(future.done())
+        self.assertEqual('/3/device/token1', future.result().path)
+
+    def test_submit_after_shutdown(self):
+        dispatcher = Dispatcher(make_connection_mock())
+        dispatcher.shutdown()
+        with self.assertRaises(RuntimeError):
+            dispatcher.submit('asdf12345')
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_environments
+----------------------------------
+
+Tests for `jwt_apns_client.environments` module.
+"""
+
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client.circuitbreaker import CircuitBreaker
+from jwt_apns_client.dedup import DedupCache
+from jwt_apns_client.dispatcher import Dispatcher
+from jwt_apns_client.environments import AutoEnvironmentConnection, EnvironmentCache
+from jwt_apns_client.jwt_apns_client import DEV_API_HOST, PROD_API_HOST, APNSEnvironments
+from jwt_apns_client.utils import APNSReasons
+
+from .test_jwt_apns_client import make_http_response_mock
+
+
+class FakeTransport(object):
+    """
+    Responds with BadDeviceToken unless the token starts with 'prod' and was sent to PROD_API_HOST or starts with
+    'dev' and was sent to DEV_API_HOST.  Records the (host, token) and the apns-id of every request.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.apns_ids = []
+
+    def make_connection(self, host, port, secure=True):
+        conn = mock.Mock(host=host, port=port)
+        paths = {}
+
+        def request(method, path, body=None, headers=None):
+            stream_id = len(paths) + 1
+            paths[stream_id] = path
+            self.requests.append((host, path.rsplit('/', 1)[-1]))
+            self.apns_ids.append((headers or {}).get('apns-id'))
+            return stream_id
+
+        def get_response(stream_id):
+            token = paths[stream_id].rsplit('/', 1)[-1]
+            prefix = 'prod' if host == PROD_API_HOST else 'dev'
+            if token.startswith(prefix):
+                return make_http_response_mock()
+            return make_http_response_mock(400, APNSReasons.BAD_DEVICE_TOKEN)
+
+        conn.request.side_effect = request
+        conn.get_response.side_effect = get_response
+        return conn
+
+
+class EnvironmentCacheTest(unittest.TestCase):
+
+    def test_lru_is_bounded(self):
+        cache = EnvironmentCache(max_size=2)
+        cache.set('token0', APNSEnvironments.DEV)
+        cache.set('token1', APNSEnvironments.DEV)
+        self.assertEqual(APNSEnvironments.DEV, cache.get('token0'))
+        cache.set('token2', APNSEnvironments.PROD)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(None, cache.get('token1'))
+        self.assertEqual(APNSEnvironments.DEV, cache.get('token0'))
+        self.assertEqual(APNSEnvironments.PROD, cache.get('token2'))
+
+    def test_store(self):
+        store = {}
+        cache = EnvironmentCache(max_size=1, store=store)
+        cache.set('token0', APNSEnvironments.DEV)
+        cache.set('token1', APNSEnvironments.DEV)
+        self.assertEqual({'token0': 'dev', 'token1': 'dev'}, store)
+        store['token2'] = b'prod'
+        self.assertEqual(APNSEnvironments.PROD, cache.get('token2'))
+
+
+class AutoEnvironmentConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = FakeTransport()
+        self.connection = AutoEnvironmentConnection(provider_token=b'token', transport=self.transport)
+
+    def test_connections(self):
+        self.assertEqual(PROD_API_HOST, self.connection.connections[APNSEnvironments.PROD].api_host)
+        self.assertEqual(DEV_API_HOST, self.connection.connections[APNSEnvironments.DEV].api_host)
+
+    def test_connections_refresh_token_from_store(self):
+        token_store = mock.Mock(max_age=60)
+        token_store.get_token.return_value = (b'token1', time.time())
+        connection = AutoEnvironmentConnection(team_id='TEAMID', apns_key_id='KEYID', token_store=token_store,
+                                               transport=self.transport)
+        token_store.get_token.return_value = (b'token2', time.time() + 61)
+        with mock.patch('jwt_apns_client.jwt_apns_client.time.time', return_value=time.time() + 61):
+            for environment in (APNSEnvironments.PROD, APNSEnvironments.DEV):
+                self.assertEqual(b'token2', connection.connections[environment].get_provider_token())
+
+    def test_circuit_breaker_per_environment(self):
+        breaker = CircuitBreaker(failure_threshold=3)
+        connection = AutoEnvironmentConnection(provider_token=b'token', transport=self.transport,
+                                               circuit_breaker=breaker, dedup_cache=DedupCache())
+        prod = connection.connections[APNSEnvironments.PROD]
+        dev = connection.connections[APNSEnvironments.DEV]
+        self.assertIs(breaker, prod.circuit_breaker)
+        self.assertIsNot(breaker, dev.circuit_breaker)
+        self.assertEqual(3, dev.circuit_breaker.failure_threshold)
+        self.assertIs(prod.dedup_cache, dev.dedup_cache)
+
+    def test_default_environment(self):
+        response = self.connection.send_notification('prod12345', alert='Testing')
+        self.assertEqual(200, response.status)
+        self.assertEqual([(PROD_API_HOST, 'prod12345')], self.transport.requests)
+        self.assertEqual(0, len(self.connection.environment_cache))
+
+    def test_retries_other_environment_and_remembers(self):
+        response = self.connection.send_notification('dev12345', alert='Testing')
+        self.assertEqual(200, response.status)
+        self.assertEqual(DEV_API_HOST, response.host)
+        self.assertEqual(APNSEnvironments.DEV, self.connection.environment_cache.get('dev12345'))
+
+        response = self.connection.send_notification('dev12345', alert='Testing')
+        self.assertEqual(200, response.status)
+        self.assertEqual([(PROD_API_HOST, 'dev12345'), (DEV_API_HOST, 'dev12345'), (DEV_API_HOST, 'dev12345')],
+                         self.transport.requests)
+
+    def test_bad_token_in_both_environments(self):
+        response = self.connection.send_notification('bad12345', alert='Testing')
+        self.assertEqual(APNSReasons.BAD_DEVICE_TOKEN, response.reason)
+        self.assertEqual(2, len(self.transport.requests))
+        self.assertEqual(None, self.connection.environment_cache.get('bad12345'))
+
+    def test_retry_keeps_apns_id_with_dedup_cache(self):
+        connection = AutoEnvironmentConnection(provider_token=b'token', transport=self.transport,
+                                               dedup_cache=DedupCache())
+        response = connection.send_notification('dev12345', alert='Testing', apns_id='id1')
+        self.assertEqual(200, response.status)
+        self.assertEqual(['id1', 'id1'], self.transport.apns_ids)
+        self.assertIn('id1', connection.connections[APNSEnvironments.PROD].dedup_cache)
+
+    def test_retry_reuses_generated_apns_id(self):
+        connection = AutoEnvironmentConnection(provider_token=b'token', transport=self.transport,
+                                               generate_apns_id=True)
+        response = connection.send_notification('dev12345', alert='Testing')
+        self.assertEqual(200, response.status)
+        first, retry = self.transport.apns_ids
+        self.assertIsNotNone(first)
+        self.assertEqual(first, retry)
+
+    def test_dispatcher(self):
+        with Dispatcher(self.connection) as dispatcher:
+            futures = [dispatcher.submit(token, alert='Testing') for token in ('prod1', 'dev1', 'prod2')]
+            statuses = [future.result(timeout=5).status for future in futures]
+        self.assertEqual([200, 200, 200], statuses)
+        self.assertEqual(APNSEnvironments.DEV, self.connection.environment_cache.get('dev1'))
@@ -10,8 +10,10 @@ Tests for `jwt_apns_client` module.
 """
 
 
+import json
 import os
 import sys
+import threading
 import unittest
 from contextlib import contextmanager
 from click.testing import CliRunner
@@ -25,7 +27,8 @@ except ImportError:
     import mock
 
 from jwt_apns_client import jwt_apns_client, cli
-from jwt_apns_client.utils import APNSReasons
+from jwt_apns_client.ratelimit import RateLimiter
+from jwt_apns_client.utils import APNSReasons, JSON_ENCODERS, get_json_encoder
 
 
 class TestJwt_apns_client(unittest.TestCase):
@@ -88,6 +91,44 @@ class AlertTest(unittest.TestCase):
         }
         self.assertEqual(expected, alert.get_payload_dict())
 
+    def test_slots(self):
+        alert = jwt_apns_client.Alert(title='title')
+        self.assertFalse(hasattr(alert, '__dict__'))
+        with self.assertRaises(AttributeError):
+            alert.subtitle = 'subtitle'
+
+    def test_payload_cached_until_changed(self):
+        alert = jwt_apns_client.Alert(title='title', body='body')
+        encoder = mock.Mock(side_effect=get_json_encoder('json'))
+        payload = alert.get_payload_dict()
+        self.assertIs(payload, alert.get_payload_dict())
+        self.assertEqual(b'{"title":"title","body":"body"}', alert.get_payload_json(encoder))
+        alert.get_payload_json(encoder)
+        self.assertEqual(1, encoder.call_count)
+
+        alert.body = 'changed'
+        self.assertEqual({'title': 'title', 'body': 'changed'}, alert.get_payload_dict())
+        self.assertEqual(b'{"title":"title","body":"changed"}', alert.get_payload_json(encoder))
+        self.assertEqual(2, encoder.call_count)
+
+
+class JsonEncoderTest(unittest.TestCase):
+
+    def test_get_json_encoder_by_name(self):
+        encoder = get_json_encoder('json')
+        self.assertEqual('{"a":[1,2],"b":"é"}'.encode('utf-8'), encoder({'a': [1, 2], 'b': 'é'}))
+
+    def test_get_json_encoder_default(self):
+        """
+        The default encoder should produce the same compact json as the stdlib fallback.
+        """
+        data = {'aps': {'alert': {'title': 'title', 'loc-args': ['a/b', 1]}, 'badge': 1}}
+        self.assertEqual(get_json_encoder('json')(data), get_json_encoder()(data))
+
+    def test_get_json_encoder_unknown(self):
+        with self.assertRaises(ValueError):
+            get_json_encoder('notjson')
+
 
 class NotificationResponseTest(unittest.TestCase):
     def test_init_params(self):
@@ -96,7 +137,8 @@ class NotificationResponseTest(unittest.TestCase):
         """
         notification = jwt_apns_client.NotificationResponse(status=400, reason='reason', host='api.example.org', port=80,
                                                             path='/api/3/device/12345asdf', payload='payload',
-                                                            headers={'h': '1'})
+                                                            headers={'h': '1'},
+                                                            device_registration_id='12345asdf')
         self.assertEqual(400, notification.status)
         self.assertEqual('reason', notification.reason)
         self.assertEqual('api.example.org', notification.host)
@@ -104,6 +146,7 @@ class NotificationResponseTest(unittest.TestCase):
         self.assertEqual('/api/3/device/12345asdf', notification.path)
         self.assertEqual('payload', notification.payload)
         self.assertEqual({'h': '1'}, notification.headers)
+        self.assertEqual('12345asdf', notification.device_registration_id)
 
     def test_init_params_default(self):
         """
@@ -117,6 +160,7 @@ class NotificationResponseTest(unittest.TestCase):
         self.assertEqual('', notification.path)
         self.assertEqual(None, notification.payload)
         self.assertEqual(None, notification.headers)
+        self.assertEqual('', notification.device_registration_id)
 
 
 class APNSConnectionTest(unittest.TestCase):
@@ -171,7 +215,7 @@ class APNSConnectionTest(unittest.TestCase):
         self.assertEqual('', connection.secret)
         self.assertEqual(None, connection._conn)
 
-    @mock.patch('jwt_apns_client.jwt_apns_client.HTTPConnection')
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
     def test_send_notification_good(self, HTTPConnectionMock):
         HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock()
         connection = jwt_apns_client.APNSConnection(
@@ -180,9 +224,61 @@ class APNSConnectionTest(unittest.TestCase):
             apns_key_path=self.KEY_FILE_PATH)
         response = connection.send_notification(device_registration_id='asdf12345', alert='Testing')
         self.assertTrue(isinstance(response, jwt_apns_client.NotificationResponse))
+        self.assertEqual('asdf12345', response.device_registration_id)
         self.assertEqual(1, HTTPConnectionMock.call_count)
 
-    @mock.patch('jwt_apns_client.jwt_apns_client.HTTPConnection')
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_send_notification_over_http11(self, HTTPConnectionMock):
+        """
+        hyper sends the first plaintext request over HTTP/1.1, which returns no stream id and whose response is
+        read without one.
+        """
+        HTTPConnectionMock.return_value.request.return_value = None
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock()
+        connection = jwt_apns_client.APNSConnection(provider_token=b'token', secure=False)
+        response = connection.send_notification(device_registration_id='asdf12345', alert='Testing')
+        self.assertEqual(200, response.status)
+        HTTPConnectionMock.return_value.get_response.assert_called_once_with()
+
+        HTTPConnectionMock.return_value.request.return_value = 3
+        connection.send_notification(device_registration_id='asdf12345', alert='Testing')
+        HTTPConnectionMock.return_value.get_response.assert_called_with(3)
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_send_notification_with_payload(self, HTTPConnectionMock):
+        """
+        A pre-built payload should be sent as is.
+        """
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock()
+        connection = jwt_apns_client.APNSConnection(
+            team_id='TEAMID',
+            apns_key_id='KEYID',
+            apns_key_path=self.KEY_FILE_PATH)
+        template = connection.make_payload_template(alert='Hi {name}')
+        response = connection.send_notification(device_registration_id='asdf12345', payload=template.render(name='Jo'))
+        self.assertEqual(b'{"aps":{"alert":"Hi Jo"}}', response.payload)
+        self.assertEqual(b'{"aps":{"alert":"Hi Jo"}}', HTTPConnectionMock.return_value.request.call_args[0][2])
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_send_notification_with_rate_limiter(self, HTTPConnectionMock):
+        """
+        The rate limiter should be acquired for the notification's topic and device before sending.
+        """
+        HTTPConnectionMock.return_value.get_response.return_value = make_http_response_mock()
+        rate_limiter = mock.Mock(spec=RateLimiter)
+        connection = jwt_apns_client.APNSConnection(
+            team_id='TEAMID',
+            apns_key_id='KEYID',
+            apns_key_path=self.KEY_FILE_PATH,
+            topic='com.example.default',
+            rate_limiter=rate_limiter)
+        response = connection.send_notification(device_registration_id='asdf12345', alert='Testing',
+                                                topic='com.example.other', priority=5)
+        rate_limiter.acquire.assert_called_once_with('com.example.other', 'asdf12345')
+        self.assertEqual('com.example.other', response.headers['apns-topic'])
+        self.assertEqual('5', response.headers['apns-priority'])
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
     def test_send_notification_with_idle_timeout(self, HTTPConnectionMock):
         """
         Test that when an idle timeout error is received the connection is cleared/reset
@@ -201,7 +297,7 @@ class APNSConnectionTest(unittest.TestCase):
         self.assertIsNone(connection._conn)  # old connection was cleared.
 
 
-    @mock.patch('jwt_apns_client.jwt_apns_client.HTTPConnection')
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
     def test_send_notification_with_error(self, HTTPConnectionMock):
         response_mock = make_http_response_mock(status=400, reason=APNSReasons.MISSING_DEVICE_TOKEN)
         HTTPConnectionMock.return_value.get_response.return_value = response_mock
@@ -288,26 +384,137 @@ class APNSConnectionTest(unittest.TestCase):
         self.assertEqual(decoded, {'iat': issued_at, 'iss': 'TEAMID'})
 
     def test_get_request_payload(self):
-        pass
+        """
+        The payload should be compact utf-8 encoded json with no whitespace between separators.
+        """
+        connection = jwt_apns_client.APNSConnection(json_encoder='json')
+        payload = connection.get_request_payload(alert=jwt_apns_client.Alert(title='title', body='body'), badge=1)
+        self.assertEqual(b'{"aps":{"alert":{"title":"title","body":"body"},"badge":1}}', payload)
+
+    def test_get_request_payload_alert_all_encoders(self):
+        """
+        Splicing the cached json of an Alert into the payload should give the same json with every encoder.
+        """
+        alert = jwt_apns_client.Alert(title='title', body='bódy', loc_args=['a/b', 1])
+        for encoder_name, encoder in JSON_ENCODERS:
+            if encoder is None:
+                continue
+            connection = jwt_apns_client.APNSConnection(json_encoder=encoder)
+            for kwargs in ({}, {'badge': 1, 'sound': 'default'}):
+                expected = {'aps': dict(alert={'title': 'title', 'body': 'bódy', 'loc-args': ['a/b', 1]}, **kwargs)}
+                payload = connection.get_request_payload(alert=alert, **kwargs)
+                self.assertEqual(expected, json.loads(payload.decode('utf-8')), encoder_name)
+
+    def test_get_request_payload_custom_encoder(self):
+        """
+        A callable json_encoder should be used to encode the payload.
+        """
+        encoder = mock.Mock(return_value=b'{}')
+        connection = jwt_apns_client.APNSConnection(json_encoder=encoder)
+        self.assertEqual(b'{}', connection.get_request_payload(alert='Testing'))
+        encoder.assert_called_once_with({'aps': {'alert': 'Testing'}})
 
     def test_get_request_headers(self):
         pass
 
+    def test_get_request_headers_apns_id(self):
+        connection = jwt_apns_client.APNSConnection(provider_token=b'token')
+        self.assertNotIn('apns-id', connection.get_request_headers())
+        headers = connection.get_request_headers(apns_id='0ea9a7f4-3b85-4e0c-a3c5-3c43e7d2a8f7')
+        self.assertEqual('0ea9a7f4-3b85-4e0c-a3c5-3c43e7d2a8f7', headers['apns-id'])
+
+    def test_build_request_generates_apns_id(self):
+        connection = jwt_apns_client.APNSConnection(provider_token=b'token', generate_apns_id=True)
+        first = connection.build_request('asdf12345', alert='Testing')[1]['apns-id']
+        second = connection.build_request('asdf12345', alert='Testing')[1]['apns-id']
+        self.assertEqual(36, len(first))
+        self.assertNotEqual(first, second)
+        headers = connection.build_request('asdf12345', alert='Testing', apns_id='given-id')[1]
+        self.assertEqual('given-id', headers['apns-id'])
+
     def test_get_payload_data(self):
         pass
 
-    def test_connection_not_cached(self):
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_connection_not_cached(self, HTTPConnectionMock):
         """
         Test that if we do not already have a connection, self.connection creates and returns an HTTPConnection
         """
-        pass
+        connection = jwt_apns_client.APNSConnection(api_host='api.example.org', api_port=442)
+        self.assertEqual(HTTPConnectionMock.return_value, connection.connection)
+        HTTPConnectionMock.assert_called_once_with(host='api.example.org', port=442, secure=True)
 
-    def test_connection_cached(self):
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_connection_cached(self, HTTPConnectionMock):
         """
         Test that if we already have a connection, self.connection returns the existing HTTPConnection without
         creating a new one
         """
-        pass
+        connection = jwt_apns_client.APNSConnection()
+        http2conn = connection.connection
+        self.assertIs(http2conn, connection.connection)
+        self.assertEqual(1, HTTPConnectionMock.call_count)
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    @mock.patch('jwt_apns_client.transports.HTTP20Connection')
+    def test_connection_thread_safe(self, HTTP20ConnectionMock, HTTPConnectionMock):
+        """
+        A thread safe connection should use an HTTP20Connection, which supports concurrent streams, rather
+        than an HTTPConnection which upgrades itself on the first request.
+        """
+        connection = jwt_apns_client.APNSConnection(thread_safe=True)
+        self.assertEqual(HTTP20ConnectionMock.return_value, connection.connection)
+        self.assertEqual(0, HTTPConnectionMock.call_count)
+
+    @mock.patch('jwt_apns_client.transports.HTTP20Connection')
+    def test_send_notification_from_threads(self, HTTP20ConnectionMock):
+        """
+        Notifications sent from many threads should share one connection and each thread should get the
+        response for its own stream.
+        """
+        lock = threading.Lock()
+        stream_ids = iter(range(1, 1000, 2))
+        responses = {}
+
+        def request(method, path, payload, headers):
+            with lock:
+                stream_id = next(stream_ids)
+            token = path.rsplit('/', 1)[1]
+            responses[stream_id] = make_http_response_mock(status=200 if token.endswith('0') else 410,
+                                                           reason='' if token.endswith('0') else 'Unregistered')
+            return stream_id
+
+        HTTP20ConnectionMock.return_value.request.side_effect = request
+        HTTP20ConnectionMock.return_value.get_response.side_effect = lambda stream_id: responses[stream_id]
+        connection = jwt_apns_client.APNSConnection(
+            team_id='TEAMID',
+            apns_key_id='KEYID',
+            apns_key_path=self.KEY_FILE_PATH,
+            thread_safe=True)
+        results = {}
+
+        def send(token):
+            results[token] = connection.send_notification(device_registration_id=token, alert='Testing')
+
+        threads = [threading.Thread(target=send, args=('token%d' % i,)) for i in range(50)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(1, HTTP20ConnectionMock.call_count)
+        for token, response in results.items():
+            self.assertTrue(response.path.endswith(token))
+            self.assertEqual(200 if token.endswith('0') else 410, response.status)
+        self.assertEqual(50, len(results))
+
+    @mock.patch('jwt_apns_client.transports.HTTPConnection')
+    def test_close(self, HTTPConnectionMock):
+        connection = jwt_apns_client.APNSConnection()
+        http2conn = connection.connection
+        connection.close()
+        http2conn.close.assert_called_once_with(error_code=None)
+        self.assertIsNone(connection._conn)
 
 
 def make_http_response_mock(status=200, reason=''):
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_loadtest
+----------------------------------
+
+Tests for `jwt_apns_client.loadtest` module.
+"""
+
+import unittest
+
+from click.testing import CliRunner
+
+from jwt_apns_client import cli
+from jwt_apns_client.jwt_apns_client import APNSConnection
+from jwt_apns_client.loadtest import LoadTestResult, make_alert, make_token, run_load_test
+from jwt_apns_client.summary import OutcomeSummary
+from jwt_apns_client.transports import H2Transport
+
+from .h2server import H2TestServer
+
+
+class LoadTestResultTest(unittest.TestCase):
+
+    def test_measurements(self):
+        result = LoadTestResult(count=100, elapsed=2.0, cpu_time=0.5, latencies=[i / 1000.0 for i in range(100, 0, -1)],
+                                summary=OutcomeSummary())
+        self.assertEqual(50.0, result.requests_per_second)
+        self.assertEqual(0.005, result.cpu_per_message)
+        self.assertEqual(0.05, result.percentile(50))
+        self.assertEqual(0.099, result.percentile(99))
+        self.assertEqual(0.001, result.percentile(0))
+        self.assertIn('Requests/sec:  50.0', result.report())
+
+    def test_synthetic_values(self):
+        self.assertEqual(64, len(make_token(12345)))
+        self.assertNotEqual(make_token(1), make_token(2))
+        self.assertEqual(100, len(make_alert(1, 100)))
+
+
+class RunLoadTestTest(unittest.TestCase):
+
+    def test_run_load_test(self):
+        with H2TestServer() as server:
+            connections = [APNSConnection(api_host=server.host, api_port=server.port, secure=False,
+                                          provider_token=b'token', topic='com.example.app',
+                                          transport=H2Transport(timeout=5))
+                           for i in range(2)]
+            result = run_load_test(connections, 50, concurrency=10)
+            for connection in connections:
+                connection.close()
+        self.assertEqual(50, result.count)
+        self.assertEqual(50, len(result.latencies))
+        self.assertEqual(50, result.summary.succeeded)
+        self.assertEqual(50, len(server.requests))
+        self.assertEqual(2, server.connections)
+
+    def test_cli(self):
+        with H2TestServer() as server:
+            result = CliRunner().invoke(cli.loadtest, [
+                '--host', server.host, '--port', str(server.port), '--insecure', '--count', '20', '--rate', '1000'])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('Notifications: 20', result.output)
+        self.assertIn('Succeeded:     20', result.output)
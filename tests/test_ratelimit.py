@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_ratelimit
+----------------------------------
+
+Tests for `jwt_apns_client.ratelimit` module.
+"""
+
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client.ratelimit import RateLimiter, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    @mock.patch('jwt_apns_client.ratelimit.monotonic', return_value=100.0)
+    def test_reserve(self, monotonic_mock):
+        """
+        A full bucket allows a burst of `capacity` and then spaces tokens `1 / rate` apart.
+        """
+        bucket = TokenBucket(rate=10, capacity=2)
+        self.assertEqual(0, bucket.reserve(100.0))
+        self.assertEqual(0, bucket.reserve(100.0))
+        self.assertAlmostEqual(0.1, bucket.reserve(100.0))
+        self.assertAlmostEqual(0.2, bucket.reserve(100.0))
+        # refilled by the time the reserved tokens are used
+        self.assertAlmostEqual(0, bucket.reserve(100.3))
+
+    @mock.patch('jwt_apns_client.ratelimit.monotonic', return_value=100.0)
+    def test_set_rate(self, monotonic_mock):
+        bucket = TokenBucket(rate=10, capacity=1)
+        bucket.reserve(100.0)
+        bucket.set_rate(1)
+        self.assertAlmostEqual(1.0, bucket.reserve(100.0))
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    @mock.patch('jwt_apns_client.ratelimit.monotonic', return_value=100.0)
+    def test_rate_per_topic(self, monotonic_mock):
+        limiter = RateLimiter(rates={'com.example.a': 1})
+        self.assertEqual(0, limiter.reserve('com.example.a'))
+        self.assertAlmostEqual(1.0, limiter.reserve('com.example.a'))
+        # no limit on other topics
+        self.assertEqual(0, limiter.reserve('com.example.b'))
+        self.assertEqual(0, limiter.reserve('com.example.b'))
+
+    @mock.patch('jwt_apns_client.ratelimit.monotonic', return_value=100.0)
+    def test_default_rate(self, monotonic_mock):
+        limiter = RateLimiter(default_rate=2)
+        limiter.reserve('com.example.a')
+        limiter.reserve('com.example.a')
+        self.assertAlmostEqual(0.5, limiter.reserve('com.example.a'))
+        self.assertEqual(0, limiter.reserve('com.example.b'))
+
+    @mock.patch('jwt_apns_client.ratelimit.monotonic', return_value=100.0)
+    def test_set_rate_at_runtime(self, monotonic_mock):
+        limiter = RateLimiter(rates={'com.example.a': 1})
+        limiter.reserve('com.example.a')
+        limiter.set_rate('com.example.a', None)
+        self.assertEqual(0, limiter.reserve('com.example.a'))
+        limiter.set_rate('com.example.a', 4, capacity=1)
+        limiter.reserve('com.example.a')
+        self.assertAlmostEqual(0.25, limiter.reserve('com.example.a'))
+
+    @mock.patch('jwt_apns_client.ratelimit.monotonic', return_value=100.0)
+    def test_set_default_rate_at_runtime(self, monotonic_mock):
+        limiter = RateLimiter(rates={'com.example.b': 1}, default_rate=2)
+        limiter.reserve('com.example.a')
+        limiter.reserve('com.example.a')
+        limiter.reserve('com.example.b')
+        # topics already limited by the default rate get the new rate, topics with their own rate keep it
+        limiter.set_default_rate(4, capacity=1)
+        self.assertAlmostEqual(0.25, limiter.reserve('com.example.a'))
+        self.assertAlmostEqual(1.0, limiter.reserve('com.example.b'))
+        limiter.set_default_rate(None)
+        self.assertEqual(0, limiter.reserve('com.example.a'))
+        self.assertEqual(0, limiter.reserve('com.example.c'))
+
+    @mock.patch('jwt_apns_client.ratelimit.monotonic', return_value=100.0)
+    def test_device_rate(self, monotonic_mock):
+        limiter = RateLimiter(device_rate=1, max_devices=2)
+        self.assertEqual(0, limiter.reserve('com.example.a', 'token1'))
+        self.assertAlmostEqual(1.0, limiter.reserve('com.example.a', 'token1'))
+        self.assertEqual(0, limiter.reserve('com.example.a', 'token2'))
+        self.assertEqual(0, limiter.reserve('com.example.a', 'token3'))
+        # token1 was the least recently used and was discarded
+        self.assertEqual(0, limiter.reserve('com.example.a', 'token1'))
+
+    @mock.patch('jwt_apns_client.ratelimit.time.sleep')
+    @mock.patch('jwt_apns_client.ratelimit.monotonic', return_value=100.0)
+    def test_acquire_delays(self, monotonic_mock, sleep_mock):
+        limiter = RateLimiter(rates={'com.example.a': 2})
+        limiter.acquire('com.example.a')
+        limiter.acquire('com.example.a')
+        self.assertEqual(0, sleep_mock.call_count)
+        self.assertAlmostEqual(0.5, limiter.acquire('com.example.a'))
+        self.assertEqual(1, sleep_mock.call_count)
+        self.assertAlmostEqual(0.5, sleep_mock.call_args[0][0])
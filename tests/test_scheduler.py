@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_scheduler
+----------------------------------
+
+Tests for `jwt_apns_client.scheduler` module.
+"""
+
+import threading
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client.dispatcher import Dispatcher
+from jwt_apns_client.exceptions import QueueFullError
+from jwt_apns_client.scheduler import Scheduler, TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def test_advance_releases_due_items(self):
+        wheel = TimerWheel(tick=1, slots=10, start=0)
+        wheel.add(2.5, 'a', 'A')
+        wheel.add(5, 'b', 'B')
+        wheel.add(0, 'c', 'C')
+        self.assertEqual(['C'], wheel.advance(1.5))
+        self.assertEqual([], wheel.advance(2.9))
+        self.assertEqual(['A'], wheel.advance(3.0))
+        self.assertEqual(['B'], wheel.advance(100))
+        self.assertEqual(0, len(wheel))
+
+    def test_items_beyond_one_revolution(self):
+        """
+        Items which share a bucket with nearer items should wait for their own revolution.
+        """
+        wheel = TimerWheel(tick=1, slots=10, start=0)
+        wheel.add(3, 'near', 'near')
+        wheel.add(23, 'far', 'far')
+        self.assertEqual(['near'], wheel.advance(3))
+        self.assertEqual([], wheel.advance(13))
+        self.assertEqual(['far'], wheel.advance(23))
+
+    def test_past_items_are_due_immediately(self):
+        wheel = TimerWheel(tick=1, slots=10, start=0)
+        wheel.advance(50)
+        wheel.add(10, 'late', 'late')
+        self.assertEqual(['late'], wheel.advance(50))
+
+    def test_cancel(self):
+        wheel = TimerWheel(tick=1, slots=10, start=0)
+        wheel.add(5, 'a', 'A')
+        self.assertIn('a', wheel)
+        self.assertTrue(wheel.cancel('a'))
+        self.assertFalse(wheel.cancel('a'))
+        self.assertEqual([], wheel.advance(10))
+
+    def test_duplicate_id(self):
+        wheel = TimerWheel(tick=1, slots=10, start=0)
+        wheel.add(5, 'a', 'A')
+        with self.assertRaises(ValueError):
+            wheel.add(6, 'a', 'A')
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def test_notification_is_submitted_when_due(self):
+        dispatcher = mock.Mock(spec=Dispatcher)
+        submitted = threading.Event()
+        dispatcher.submit.side_effect = lambda *args, **kwargs: submitted.set()
+        with Scheduler(dispatcher, tick=0.01) as scheduler:
+            scheduled_at = time.time()
+            scheduler.schedule_after(0.05, 'asdf12345', alert='Testing')
+            self.assertEqual(1, len(scheduler))
+            self.assertTrue(submitted.wait(5))
+            self.assertTrue(time.time() - scheduled_at >= 0.05)
+        dispatcher.submit.assert_called_once_with('asdf12345', alert='Testing')
+
+    def test_callback_gets_future(self):
+        dispatcher = mock.Mock(spec=Dispatcher)
+        called = threading.Event()
+        callback = mock.Mock(side_effect=lambda future: called.set())
+        with Scheduler(dispatcher, tick=0.01) as scheduler:
+            scheduler.schedule(time.time(), 'asdf12345', callback=callback)
+            self.assertTrue(called.wait(5))
+        callback.assert_called_once_with(dispatcher.submit.return_value)
+
+    def test_submit_errors_do_not_stop_scheduler(self):
+        dispatcher = mock.Mock(spec=Dispatcher)
+        error = QueueFullError('Notification queue is full')
+        dispatcher.submit.side_effect = [error, error, mock.sentinel.future, mock.sentinel.future]
+        errors = []
+        futures = []
+        done = threading.Event()
+
+        def callback(future):
+            futures.append(future)
+            if future is mock.sentinel.future:
+                raise ValueError('bad callback')
+
+        def on_error(e):
+            errors.append(e)
+            if len(errors) == 2:
+                done.set()
+
+        with Scheduler(dispatcher, tick=0.01, on_error=on_error) as scheduler:
+            now = time.time()
+            scheduler.schedule(now, 'token1', callback=callback)
+            scheduler.schedule(now + 0.02, 'token2')
+            scheduler.schedule(now + 0.04, 'token3', callback=callback)
+            self.assertTrue(done.wait(5))
+            scheduler.schedule(now, 'token4')
+            while dispatcher.submit.call_count < 4:
+                time.sleep(0.01)
+        self.assertEqual(4, dispatcher.submit.call_count)
+        self.assertIs(error, futures[0].exception())
+        self.assertIs(mock.sentinel.future, futures[1])
+        self.assertIs(error, errors[0])
+        self.assertIsInstance(errors[1], ValueError)
+
+    def test_cancel(self):
+        dispatcher = mock.Mock(spec=Dispatcher)
+        with Scheduler(dispatcher, tick=0.01) as scheduler:
+            notification_id = scheduler.schedule_after(0.05, 'asdf12345', notification_id='reminder-1')
+            self.assertEqual('reminder-1', notification_id)
+            self.assertTrue(scheduler.cancel('reminder-1'))
+            time.sleep(0.1)
+        self.assertEqual(0, dispatcher.submit.call_count)
+
+    def test_schedule_after_shutdown(self):
+        scheduler = Scheduler(mock.Mock(spec=Dispatcher))
+        scheduler.shutdown()
+        with self.assertRaises(RuntimeError):
+            scheduler.schedule(time.time(), 'asdf12345')
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_sharding
+----------------------------------
+
+Tests for `jwt_apns_client.sharding` module.
+"""
+
+import unittest
+
+from jwt_apns_client.loadtest import make_token
+from jwt_apns_client.sharding import HashRing, hash_key
+
+TOKENS = [make_token(i) for i in range(5000)]
+
+
+class HashRingTest(unittest.TestCase):
+
+    def test_hash_key_is_stable(self):
+        self.assertEqual(hash_key('token'), hash_key(b'token'))
+        self.assertTrue(0 <= hash_key('token') < 2 ** 64)
+        self.assertEqual(hash_key('node1'), hash_key('node1'))
+        self.assertNotEqual(hash_key('node1'), hash_key('node2'))
+
+    def test_same_routing_in_any_order(self):
+        ring = HashRing(['node1', 'node2', 'node3'])
+        other = HashRing(['node3', 'node1', 'node2'])
+        self.assertEqual([ring.get_shard(t) for t in TOKENS], [other.get_shard(t) for t in TOKENS])
+
+    def test_tokens_are_spread(self):
+        ring = HashRing(['node%d' % i for i in range(4)])
+        partitions = ring.partition(TOKENS)
+        self.assertEqual(set(ring.shards), set(partitions))
+        for tokens in partitions.values():
+            self.assertTrue(750 < len(tokens) < 1750, len(tokens))
+        self.assertEqual(sorted(TOKENS), sorted(t for tokens in partitions.values() for t in tokens))
+
+    def test_adding_shard_moves_few_tokens(self):
+        ring = HashRing(['node%d' % i for i in range(4)])
+        before = dict((t, ring.get_shard(t)) for t in TOKENS)
+        ring.add_shard('node4')
+        moved = [t for t in TOKENS if ring.get_shard(t) != before[t]]
+        self.assertTrue(len(moved) < len(TOKENS) * 0.35, len(moved))
+        self.assertEqual(set(['node4']), set(ring.get_shard(t) for t in moved))
+
+    def test_removing_shard_only_moves_its_tokens(self):
+        ring = HashRing(['node%d' % i for i in range(4)])
+        before = dict((t, ring.get_shard(t)) for t in TOKENS)
+        ring.remove_shard('node2')
+        self.assertEqual(3, len(ring))
+        for t in TOKENS:
+            if before[t] != 'node2':
+                self.assertEqual(before[t], ring.get_shard(t))
+            else:
+                self.assertNotEqual('node2', ring.get_shard(t))
+
+    def test_named_shards_and_weight(self):
+        first, second = object(), object()
+        ring = HashRing()
+        ring.add_shard(first, name='first', weight=3)
+        ring.add_shard(second, name='second')
+        partitions = ring.partition(TOKENS)
+        self.assertTrue(len(partitions['first']) > len(partitions['second']) * 2)
+        self.assertIs(first, ring.get_shard(partitions['first'][0]))
+        self.assertEqual('second', ring.get_shard_name(partitions['second'][0]))
+        self.assertEqual(partitions['second'], list(ring.filter(TOKENS, second, name='second')))
+
+    def test_route(self):
+        ring = HashRing(['node1', 'node2'])
+        routed = list(ring.route(iter(TOKENS[:10])))
+        self.assertEqual([(ring.get_shard(t), t) for t in TOKENS[:10]], routed)
+
+    def test_empty_ring(self):
+        with self.assertRaises(LookupError):
+            HashRing().get_shard('token')
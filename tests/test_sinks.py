@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_sinks
+----------------------------------
+
+Tests for `jwt_apns_client.sinks` module.
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client.dispatcher import Dispatcher
+from jwt_apns_client.jwt_apns_client import NotificationResponse
+from jwt_apns_client.sinks import BatchingSink, CallbackSink, CSVSink, JSONLinesSink, SQLiteSink
+
+from .test_dispatcher import make_connection_mock
+
+
+def make_responses(count):
+    return [NotificationResponse(status=400 if i % 2 else 200, reason='BadDeviceToken' if i % 2 else '',
+                                 device_registration_id='token%d' % i)
+            for i in range(count)]
+
+
+class FileSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_json_lines_sink(self):
+        path = os.path.join(self.dir, 'results.jsonl')
+        sink = JSONLinesSink(path)
+        sink.write_batch(make_responses(2))
+        sink.write_batch(make_responses(3)[2:])
+        sink.close()
+        with io.open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(
+            [{'device_registration_id': 'token0', 'status': 200, 'reason': ''},
+             {'device_registration_id': 'token1', 'status': 400, 'reason': 'BadDeviceToken'},
+             {'device_registration_id': 'token2', 'status': 200, 'reason': ''}],
+            records)
+
+    def test_csv_sink_writes_header_once(self):
+        path = os.path.join(self.dir, 'results.csv')
+        for i in range(2):
+            sink = CSVSink(path)
+            sink.write_batch(make_responses(2))
+            sink.close()
+        with io.open(path, encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(['device_registration_id', 'status', 'reason'], rows[0])
+        self.assertEqual(5, len(rows))
+        self.assertEqual(['token1', '400', 'BadDeviceToken'], rows[2])
+
+    def test_sqlite_sink(self):
+        path = os.path.join(self.dir, 'results.db')
+        sink = SQLiteSink(path, table='results')
+        sink.write_batch(make_responses(4))
+        sink.close()
+        db = sqlite3.connect(path)
+        self.addCleanup(db.close)
+        rows = db.execute('SELECT device_registration_id, status, reason FROM results ORDER BY rowid').fetchall()
+        self.assertEqual(4, len(rows))
+        self.assertEqual(('token1', 400, 'BadDeviceToken'), rows[1])
+
+
+class BatchingSinkTest(unittest.TestCase):
+
+    def test_flushes_full_batches(self):
+        batches = []
+        with BatchingSink(CallbackSink(batches.append), batch_size=2, flush_interval=60) as sink:
+            for response in make_responses(5):
+                sink.add(response)
+        self.assertEqual([2, 2, 1], [len(batch) for batch in batches])
+        self.assertEqual(['token%d' % i for i in range(5)],
+                         [r.device_registration_id for batch in batches for r in batch])
+
+    def test_flushes_after_interval(self):
+        flushed = threading.Event()
+        sink = BatchingSink(CallbackSink(lambda batch: flushed.set()), batch_size=100, flush_interval=0.01)
+        sink.add(make_responses(1)[0])
+        self.assertTrue(flushed.wait(5))
+        sink.close()
+
+    def test_close_closes_sink(self):
+        inner = CallbackSink(lambda batch: None)
+        closed = []
+        inner.close = lambda: closed.append(threading.current_thread())
+        sink = BatchingSink(inner)
+        sink.close()
+        self.assertEqual([sink._thread], closed)
+        with self.assertRaises(RuntimeError):
+            sink.add(make_responses(1)[0])
+
+    def test_errors_are_reported(self):
+        errors = []
+
+        def fail(batch):
+            raise ValueError('bad')
+
+        with BatchingSink(CallbackSink(fail), on_error=lambda e, batch: errors.append((e, len(batch)))) as sink:
+            sink.add(make_responses(1)[0])
+        self.assertEqual(1, len(errors))
+        self.assertIsInstance(errors[0][0], ValueError)
+        self.assertEqual(1, errors[0][1])
+
+    @mock.patch('jwt_apns_client.sinks.logger')
+    def test_errors_are_logged_and_counted(self, logger_mock):
+        def fail(batch):
+            raise ValueError('bad')
+
+        with BatchingSink(CallbackSink(fail), batch_size=2) as sink:
+            for response in make_responses(3):
+                sink.add(response)
+        self.assertEqual(2, sink.failed_batches)
+        self.assertEqual(3, sink.failed_results)
+        self.assertEqual(2, logger_mock.error.call_count)
+
+    def test_dispatcher_adds_responses(self):
+        batches = []
+        result_sink = BatchingSink(CallbackSink(batches.append))
+        with Dispatcher(make_connection_mock(), result_sink=result_sink) as dispatcher:
+            for i in range(3):
+                dispatcher.submit('token%d' % i)
+        result_sink.close()
+        self.assertEqual(3, sum(len(batch) for batch in batches))
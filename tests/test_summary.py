@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_summary
+----------------------------------
+
+Tests for `jwt_apns_client.summary` module.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from jwt_apns_client.dispatcher import Dispatcher
+from jwt_apns_client.jwt_apns_client import NotificationResponse
+from jwt_apns_client.summary import OutcomeSummary
+from jwt_apns_client.utils import APNSReasons
+
+from .test_dispatcher import make_connection_mock
+
+
+def make_response(device_registration_id, reason=''):
+    return NotificationResponse(status=400 if reason else 200, reason=reason,
+                                device_registration_id=device_registration_id)
+
+
+class OutcomeSummaryTest(unittest.TestCase):
+
+    def test_counts(self):
+        summary = OutcomeSummary()
+        summary.add(make_response('token0'))
+        summary.add(make_response('token1'))
+        summary.add(make_response('token2', APNSReasons.BAD_DEVICE_TOKEN))
+        summary.add_error('token3', ValueError('bad'))
+        self.assertEqual({
+            'total': 4,
+            'succeeded': 2,
+            'failed': 2,
+            'statuses': {200: 2, 400: 1},
+            'reasons': {APNSReasons.BAD_DEVICE_TOKEN: 1},
+            'errors': {'ValueError': 1},
+        }, summary.as_dict())
+        self.assertEqual(set(['token2', 'token3']), summary.failed_tokens)
+        self.assertEqual(['token2'], [r.device_registration_id for r in summary.sample])
+
+    def test_sample_is_bounded(self):
+        summary = OutcomeSummary(sample_size=5, random_seed=1)
+        for i in range(100):
+            summary.add(make_response('token%d' % i, APNSReasons.UNREGISTERED))
+        self.assertEqual(5, len(summary.sample))
+        self.assertEqual(5, len(set(r.device_registration_id for r in summary.sample)))
+        self.assertEqual(100, summary.reasons[APNSReasons.UNREGISTERED])
+
+    def test_failed_tokens_spill_to_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'failed.txt')
+        summary = OutcomeSummary(failed_tokens_path=path)
+        summary.write_batch([make_response('token0', APNSReasons.UNREGISTERED), make_response('token1')])
+        summary.add_error('token2', ValueError('bad'))
+        summary.close()
+        self.assertEqual(set(), summary.failed_tokens)
+        with io.open(path, encoding='utf-8') as f:
+            self.assertEqual(['token0', 'token2'], f.read().split())
+
+    def test_send_bulk(self):
+        connection = make_connection_mock()
+        with Dispatcher(connection, batch_size=3) as dispatcher:
+            summary = dispatcher.send_bulk(('token%d' % i for i in range(10)), alert='Testing')
+        self.assertEqual(10, summary.total)
+        self.assertEqual(10, summary.succeeded)
+        self.assertEqual(10, connection.request_notification.call_count)
+        connection.request_notification.assert_any_call('token9', alert='Testing')
+
+    def test_send_bulk_records_errors(self):
+        connection = make_connection_mock()
+        connection.request_notification.side_effect = ValueError('bad')
+        summary = OutcomeSummary()
+        with Dispatcher(connection) as dispatcher:
+            self.assertIs(summary, dispatcher.send_bulk(['token0', 'token1'], summary=summary))
+        self.assertEqual({'ValueError': 2}, dict(summary.errors))
+        self.assertEqual(set(['token0', 'token1']), summary.failed_tokens)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_templates
+----------------------------------
+
+Tests for `jwt_apns_client.templates` module.
+"""
+
+import json
+import unittest
+
+from jwt_apns_client.jwt_apns_client import Alert, APNSConnection
+from jwt_apns_client.templates import PayloadTemplate
+from jwt_apns_client.utils import JSON_ENCODERS, get_json_encoder
+
+
+class PayloadTemplateTest(unittest.TestCase):
+
+    def test_render_matches_full_encode(self):
+        """
+        A rendered template should be identical to encoding the fully formatted payload for every installed
+        json encoder.
+        """
+        for name, encoder in JSON_ENCODERS:
+            if encoder is None:
+                continue
+            connection = APNSConnection(json_encoder=encoder)
+            template = connection.make_payload_template(
+                alert=Alert(title='Hi {name}', body='Your order {id} shipped', loc_args=['{name}', 'static']),
+                badge=1, sound='default')
+            expected = connection.get_request_payload(
+                alert=Alert(title='Hi Jane', body='Your order 12345 shipped', loc_args=['Jane', 'static']),
+                badge=1, sound='default')
+            self.assertEqual(expected, template.render(name='Jane', id=12345), name)
+
+    def test_render_escapes_values(self):
+        template = PayloadTemplate({'aps': {'alert': 'Hi {name}'}}, json_encoder=get_json_encoder('json'))
+        payload = template.render(name='"Bobby" \\ {x}\n')
+        self.assertEqual({'aps': {'alert': 'Hi "Bobby" \\ {x}\n'}}, json.loads(payload.decode('utf-8')))
+
+    def test_render_format_spec_and_positional(self):
+        template = PayloadTemplate({'aps': {'alert': '{0} owes {amount:.2f} {{USD}}'}})
+        payload = template.render('Jane', amount=3)
+        self.assertEqual({'aps': {'alert': 'Jane owes 3.00 {USD}'}}, json.loads(payload.decode('utf-8')))
+
+    def test_field_names(self):
+        template = PayloadTemplate({'aps': {'alert': {'title': 'Hi {name}', 'body': 'Order {id}'}, 'badge': 2}})
+        self.assertEqual(['id', 'name'], sorted(template.field_names))
+
+    def test_render_missing_value(self):
+        template = PayloadTemplate({'aps': {'alert': 'Hi {name}'}})
+        with self.assertRaises(KeyError):
+            template.render()
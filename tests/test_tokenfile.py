@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_tokenfile
+----------------------------------
+
+Tests for `jwt_apns_client.tokenfile` module.
+"""
+
+import binascii
+import os
+import shutil
+import tempfile
+import unittest
+
+from jwt_apns_client.tokenfile import TokenFile
+
+TOKENS = ['%064x' % (i * 7919) for i in range(1, 101)]
+
+
+class TokenFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_lines(self):
+        path = self.write('tokens.txt', ('\n'.join(TOKENS) + '\n').encode('ascii'))
+        self.assertEqual(TOKENS, list(TokenFile(path)))
+
+    def test_lines_without_trailing_newline_and_blank_lines(self):
+        path = self.write('tokens.txt', ('\r\n'.join(TOKENS[:3]) + '\r\n\r\n' + TOKENS[3]).encode('ascii'))
+        self.assertEqual(TOKENS[:4], list(TokenFile(path)))
+
+    def test_binary_records(self):
+        path = self.write('tokens.bin', b''.join(binascii.unhexlify(t) for t in TOKENS))
+        self.assertEqual(TOKENS, list(TokenFile(path, record_size=32)))
+
+    def test_empty_file(self):
+        path = self.write('tokens.txt', b'')
+        self.assertEqual([], list(TokenFile(path)))
+        self.assertEqual([], list(TokenFile(path).shard(0, 3)))
+
+    def test_line_shards_cover_file_once(self):
+        """
+        Every token should be in exactly one shard, whatever the shard boundaries.
+        """
+        # tokens of different lengths so that shard boundaries fall in the middle of lines
+        tokens = [t[:20 + i % 40] for i, t in enumerate(TOKENS)]
+        path = self.write('tokens.txt', ('\n'.join(tokens) + '\n').encode('ascii'))
+        for count in (1, 2, 3, 7, 100, 150):
+            shards = [list(TokenFile(path).shard(i, count)) for i in range(count)]
+            self.assertEqual(tokens, [token for shard in shards for token in shard], count)
+
+    def test_binary_shards_cover_file_once(self):
+        path = self.write('tokens.bin', b''.join(binascii.unhexlify(t) for t in TOKENS))
+        for count in (1, 3, 7, 100, 150):
+            shards = [list(TokenFile(path, record_size=32).shard(i, count)) for i in range(count)]
+            self.assertEqual(TOKENS, [token for shard in shards for token in shard], count)
+
+    def test_offsets(self):
+        path = self.write('tokens.bin', b''.join(binascii.unhexlify(t) for t in TOKENS))
+        self.assertEqual(TOKENS[2:5], list(TokenFile(path, record_size=32, start=64, stop=160)))
+
+    def test_shard_index_out_of_range(self):
+        path = self.write('tokens.txt', b'abc\n')
+        with self.assertRaises(ValueError):
+            TokenFile(path).shard(3, 3)
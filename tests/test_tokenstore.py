@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_tokenstore
+----------------------------------
+
+Tests for `jwt_apns_client.tokenstore` module.
+"""
+
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client import jwt_apns_client
+from jwt_apns_client.exceptions import InsecureTokenStoreError
+from jwt_apns_client.tokenstore import FileTokenStore, get_default_directory
+
+KEY_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_files', 'apns_key.p8')
+
+
+class FileTokenStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_token_is_shared(self):
+        """
+        A second store using the same directory should reuse the stored token rather than signing a new one.
+        """
+        make_token = mock.Mock(return_value=b'token1')
+        token, issued_at = FileTokenStore(self.directory).get_token('TEAMID', 'KEYID', make_token)
+        self.assertEqual(b'token1', token)
+        make_token.assert_called_once_with(issued_at)
+
+        other_make_token = mock.Mock(return_value=b'token2')
+        self.assertEqual((b'token1', issued_at),
+                         FileTokenStore(self.directory).get_token('TEAMID', 'KEYID', other_make_token))
+        self.assertEqual(0, other_make_token.call_count)
+
+    def test_tokens_per_key(self):
+        store = FileTokenStore(self.directory)
+        store.get_token('TEAMID', 'KEYID', lambda issued_at: b'token1')
+        token, issued_at = store.get_token('TEAMID', 'OTHERKEY', lambda issued_at: 'token2')
+        self.assertEqual(b'token2', token)
+
+    def test_expired_token_is_replaced(self):
+        store = FileTokenStore(self.directory, max_age=60)
+        store.get_token('TEAMID', 'KEYID', lambda issued_at: b'token1')
+        with mock.patch('jwt_apns_client.tokenstore.time.time', return_value=time.time() + 61):
+            token, issued_at = store.get_token('TEAMID', 'KEYID', lambda issued_at: b'token2')
+        self.assertEqual(b'token2', token)
+
+    def test_creates_directory(self):
+        directory = os.path.join(self.directory, 'tokens')
+        FileTokenStore(directory).get_token('TEAMID', 'KEYID', lambda issued_at: b'token1')
+        self.assertTrue(os.path.exists(FileTokenStore(directory).get_path('TEAMID', 'KEYID')))
+
+    @unittest.skipUnless(hasattr(os, 'geteuid'), 'File ownership is only checked on posix')
+    def test_files_are_private(self):
+        directory = os.path.join(self.directory, 'tokens')
+        store = FileTokenStore(directory)
+        store.get_token('TEAMID', 'KEYID', lambda issued_at: b'token1')
+        self.assertEqual(0, os.stat(directory).st_mode & 0o077)
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(store.get_path('TEAMID', 'KEYID')).st_mode))
+
+    def test_default_directory_is_per_user(self):
+        self.assertEqual(get_default_directory(), FileTokenStore().directory)
+        self.assertNotEqual(os.path.join(tempfile.gettempdir(), 'jwt_apns_client'), FileTokenStore().directory)
+
+    @unittest.skipUnless(hasattr(os, 'geteuid'), 'File ownership is only checked on posix')
+    def test_rejects_shared_directory(self):
+        os.chmod(self.directory, 0o777)
+        with self.assertRaises(InsecureTokenStoreError):
+            FileTokenStore(self.directory).get_token('TEAMID', 'KEYID', lambda issued_at: b'token1')
+
+        link = os.path.join(tempfile.gettempdir(), 'jwt_apns_client_test_link_%d' % os.getpid())
+        os.chmod(self.directory, 0o700)
+        os.symlink(self.directory, link)
+        try:
+            with self.assertRaises(InsecureTokenStoreError):
+                FileTokenStore(link).get_token('TEAMID', 'KEYID', lambda issued_at: b'token1')
+        finally:
+            os.remove(link)
+
+    @unittest.skipUnless(hasattr(os, 'O_NOFOLLOW'), 'Symlinks are only refused where O_NOFOLLOW is supported')
+    def test_does_not_follow_symlinked_token_file(self):
+        store = FileTokenStore(self.directory)
+        target = os.path.join(self.directory, 'target')
+        os.symlink(target, store.get_path('TEAMID', 'KEYID'))
+        with self.assertRaises(OSError):
+            store.get_token('TEAMID', 'KEYID', lambda issued_at: b'token1')
+        self.assertFalse(os.path.exists(target))
+
+
+class APNSConnectionTokenStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_connection(self, **kwargs):
+        return jwt_apns_client.APNSConnection(team_id='TEAMID', apns_key_id='KEYID', apns_key_path=KEY_FILE_PATH,
+                                              **kwargs)
+
+    def test_connections_share_token(self):
+        first = self.make_connection(token_store=FileTokenStore(self.directory))
+        second = self.make_connection(token_store=FileTokenStore(self.directory))
+        self.assertEqual(first.provider_token, second.provider_token)
+        self.assertEqual(first.provider_token, first.get_request_headers()['authorization'][7:].encode('ascii'))
+
+    def test_token_rotation(self):
+        connection = self.make_connection(token_store=FileTokenStore(self.directory, max_age=60))
+        token = connection.provider_token
+        with mock.patch('jwt_apns_client.jwt_apns_client.time.time', return_value=time.time() + 61), \
+                mock.patch('jwt_apns_client.tokenstore.time.time', return_value=time.time() + 61):
+            self.assertNotEqual(token, connection.get_provider_token())
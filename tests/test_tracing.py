@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_tracing
+----------------------------------
+
+Tests for `jwt_apns_client.tracing` module.
+"""
+
+import socket
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from jwt_apns_client.jwt_apns_client import APNSConnection
+from jwt_apns_client.tracing import SlowRequestLog, TraceEvent, TraceEvents, Tracer
+from jwt_apns_client.transports import H2Transport
+
+from .h2server import H2TestServer
+
+
+class TracerTest(unittest.TestCase):
+
+    def test_subscribe_and_unsubscribe(self):
+        tracer = Tracer()
+        self.assertFalse(tracer.active)
+        events = []
+        tracer.subscribe(events.append)
+        self.assertTrue(tracer.active)
+        event = TraceEvent(TraceEvents.TOKEN_REFRESH, 1.0)
+        tracer.emit(event)
+        tracer.unsubscribe(events.append)
+        self.assertFalse(tracer.active)
+        tracer.emit(event)
+        self.assertEqual([event], events)
+
+    def test_unsampled_events(self):
+        tracer = Tracer(sample_rate=0)
+        self.assertFalse(tracer.sample())
+        sampled, everything = [], []
+        tracer.subscribe(sampled.append)
+        tracer.subscribe(everything.append, sampled=False)
+        ok = TraceEvent(TraceEvents.RESPONSE_RECEIVED, 1.0, status=200)
+        rejected = TraceEvent(TraceEvents.RESPONSE_RECEIVED, 1.0, status=400)
+        error = TraceEvent(TraceEvents.REQUEST_ERROR, 1.0, error=ValueError('bad'))
+        for event in (ok, rejected, error):
+            tracer.emit(event, sampled=False)
+        self.assertEqual([rejected, error], sampled)
+        self.assertEqual([ok, rejected, error], everything)
+
+    def test_slow_request_log(self):
+        tracer = Tracer(sample_rate=0)
+        log = SlowRequestLog(threshold=0.5, max_entries=2).attach(tracer)
+        for duration in (0.1, 0.6, 0.7, 0.8):
+            tracer.emit(TraceEvent(TraceEvents.RESPONSE_RECEIVED, 1.0, duration=duration, status=200), sampled=False)
+        tracer.emit(TraceEvent(TraceEvents.HEADERS_SENT, 1.0, duration=1.0), sampled=False)
+        self.assertEqual([0.7, 0.8], [event.duration for event in log.entries])
+
+
+class APNSConnectionTracingTest(unittest.TestCase):
+
+    def make_connection(self, server, tracer):
+        return APNSConnection(api_host=server.host, api_port=server.port, secure=False, provider_token=b'token',
+                              topic='com.example.app', transport=H2Transport(timeout=5), tracer=tracer)
+
+    def test_request_events(self):
+        tracer = Tracer()
+        events = []
+        tracer.subscribe(events.append)
+        with H2TestServer() as server:
+            connection = self.make_connection(server, tracer)
+            connection.send_notification('token1', alert='Testing')
+            connection.close()
+
+        self.assertEqual([TraceEvents.REQUEST_START, TraceEvents.CONNECTION_OPEN, TraceEvents.HEADERS_SENT,
+                          TraceEvents.RESPONSE_RECEIVED, TraceEvents.CONNECTION_CLOSE],
+                         [event.name for event in events])
+        start, opened, sent, received, closed = events
+        self.assertEqual('token1', start.device_registration_id)
+        self.assertEqual(server.port, opened.port)
+        self.assertEqual(sent.stream_id, received.stream_id)
+        self.assertEqual(200, received.status)
+        self.assertEqual(received.timestamp - start.timestamp, received.duration)
+        timestamps = [event.timestamp for event in events]
+        self.assertEqual(sorted(timestamps), timestamps)
+
+    def test_connection_open_includes_connecting(self):
+        """
+        Transports connect during the first request, so the open event should come after it and include its time.
+        """
+        tracer = Tracer()
+        events = []
+        tracer.subscribe(events.append)
+        transport = mock.Mock()
+        conn = transport.make_connection.return_value
+
+        def request(*args, **kwargs):
+            time.sleep(0.05)
+            if conn.request.call_count == 1:
+                raise socket.error('Connection refused')
+            return conn.request.call_count
+
+        conn.request.side_effect = request
+        connection = APNSConnection(provider_token=b'token', transport=transport, tracer=tracer)
+        with self.assertRaises(socket.error):
+            connection.request_notification('token1', alert='Testing')
+        self.assertNotIn(TraceEvents.CONNECTION_OPEN, [event.name for event in events])
+        connection.request_notification('token1', alert='Testing')
+        connection.request_notification('token2', alert='Testing')
+        opened = [event for event in events if event.name == TraceEvents.CONNECTION_OPEN]
+        self.assertEqual(1, len(opened))
+        self.assertTrue(opened[0].duration >= 0.1)
+
+    def test_errors_are_traced_when_not_sampled(self):
+        tracer = Tracer(sample_rate=0)
+        events = []
+        tracer.subscribe(events.append)
+        log = SlowRequestLog(threshold=0).attach(tracer)
+        with H2TestServer() as server:
+            connection = self.make_connection(server, tracer)
+            connection.send_notification('token1', alert='Testing')
+            connection.send_notification('bad1', alert='Testing')
+            connection.close()
+        requests = [event for event in events if event.device_registration_id is not None]
+        self.assertEqual([(TraceEvents.RESPONSE_RECEIVED, 'bad1')],
+                         [(event.name, event.device_registration_id) for event in requests])
+        self.assertEqual(['token1', 'bad1'], [event.device_registration_id for event in log.entries])
+
+    def test_token_refresh(self):
+        tracer = Tracer()
+        events = []
+        tracer.subscribe(events.append)
+        token_store = mock.Mock(max_age=3000)
+        token_store.get_token.return_value = (b'token', time.time())
+        APNSConnection(team_id='TEAMID', apns_key_id='KEYID', token_store=token_store, tracer=tracer)
+        self.assertEqual([TraceEvents.TOKEN_REFRESH], [event.name for event in events])
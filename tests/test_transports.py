@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+"""
+test_transports
+----------------------------------
+
+Tests for `jwt_apns_client.transports` module.
+"""
+
+import json
+import shutil
+import ssl
+import tempfile
+import threading
+import unittest
+
+from jwt_apns_client.exceptions import ConnectionClosedError
+from jwt_apns_client.jwt_apns_client import APNSConnection, NotificationResponse
+from jwt_apns_client.transports import H2SocketConnection, H2Transport, TLSSessionCache, make_ssl_context
+from jwt_apns_client.utils import APNSReasons
+
+from .h2server import H2TestServer, make_certificate
+
+
+class H2TransportTest(unittest.TestCase):
+
+    def make_connection(self, server):
+        return APNSConnection(api_host=server.host, api_port=server.port, secure=False, provider_token=b'token',
+                              topic='com.example.app', transport=H2Transport(timeout=5))
+
+    def test_send_notification(self):
+        with H2TestServer() as server:
+            connection = self.make_connection(server)
+            response = connection.send_notification('token1', alert='Testing')
+            connection.close()
+        self.assertEqual(200, response.status)
+        self.assertEqual('', response.reason)
+        headers, body = server.requests[0]
+        self.assertEqual('/3/device/token1', headers[':path'])
+        self.assertEqual('POST', headers[':method'])
+        self.assertEqual('com.example.app', headers['apns-topic'])
+        self.assertEqual('bearer token', headers['authorization'])
+        self.assertEqual({'aps': {'alert': 'Testing'}}, json.loads(body.decode('utf-8')))
+
+    def test_error_reason(self):
+        with H2TestServer() as server:
+            connection = self.make_connection(server)
+            response = connection.send_notification('bad1', alert='Testing')
+            connection.close()
+        self.assertEqual(400, response.status)
+        self.assertEqual(APNSReasons.BAD_DEVICE_TOKEN, response.reason)
+
+    def test_pipelined_requests(self):
+        """
+        Responses read in a different order than the requests were sent should match their own streams.
+        """
+        with H2TestServer() as server:
+            connection = self.make_connection(server)
+            pending = [connection.request_notification(token, alert='Testing') for token in ('a', 'bad', 'c')]
+            responses = [connection.get_notification_response(p) for p in reversed(pending)]
+            connection.close()
+        self.assertEqual([200, 400, 200], [r.status for r in responses])
+        self.assertEqual(1, server.connections)
+
+    def test_threads_share_connection(self):
+        with H2TestServer() as server:
+            connection = self.make_connection(server)
+            results = {}
+
+            def send(token):
+                results[token] = connection.send_notification(token, alert='Testing')
+
+            tokens = ['token%d' % i if i % 3 else 'bad%d' % i for i in range(30)]
+            threads = [threading.Thread(target=send, args=(token,)) for token in tokens]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            connection.close()
+
+        self.assertEqual(1, server.connections)
+        for token in tokens:
+            self.assertTrue(results[token].path.endswith(token))
+            self.assertEqual(400 if token.startswith('bad') else 200, results[token].status)
+
+    def test_large_payload_flow_control(self):
+        """
+        A body larger than the max frame size should be split into several frames.
+        """
+        with H2TestServer() as server:
+            conn = H2SocketConnection(server.host, server.port, secure=False, timeout=5)
+            body = b'x' * 100000
+            response = conn.get_response(conn.request('POST', '/3/device/token1', body, {}))
+            conn.close()
+        self.assertEqual(200, response.status)
+        self.assertEqual(body, server.requests[0][1])
+
+    def test_reset_while_pending(self):
+        """
+        A connection which was dropped, such as after a GOAWAY, should fail its pending requests and stay closed
+        rather than reusing their stream ids on a new socket.
+        """
+        with H2TestServer() as server:
+            conn = H2SocketConnection(server.host, server.port, secure=False, timeout=5)
+            first = conn.request('POST', '/3/device/bad1', b'{}')
+            conn._reset(ConnectionClosedError('Connection terminated by server'))
+            self.assertTrue(conn.closed)
+            with self.assertRaises(ConnectionClosedError):
+                conn.request('POST', '/3/device/token1', b'{}')
+            with self.assertRaises(ConnectionClosedError):
+                conn.get_response(first)
+
+    def test_closed_connection_is_replaced(self):
+        with H2TestServer() as server:
+            connection = self.make_connection(server)
+            pending = connection.request_notification('bad1', alert='Testing')
+            conn = connection.connection
+            conn._reset(ConnectionClosedError('Connection terminated by server'))
+            with self.assertRaises(ConnectionClosedError):
+                connection.get_notification_response(pending)
+            self.assertIsNot(conn, connection.connection)
+            self.assertEqual(200, connection.send_notification('token1', alert='Testing').status)
+            connection.close()
+        self.assertEqual(2, server.connections)
+
+
+class SansIOTest(unittest.TestCase):
+
+    def test_build_request(self):
+        connection = APNSConnection(provider_token=b'token', topic='com.example.app')
+        path, headers, payload = connection.build_request('token1', alert='Testing', priority=5)
+        self.assertEqual('/3/device/token1', path)
+        self.assertEqual('5', headers['apns-priority'])
+        self.assertEqual(b'{"aps":{"alert":"Testing"}}', payload)
+
+    def test_make_notification_response(self):
+        connection = APNSConnection()
+        response = connection.make_notification_response(410, b'{"reason":"Unregistered"}', host='h', port=1,
+                                                         path='/3/device/token1')
+        self.assertTrue(isinstance(response, NotificationResponse))
+        self.assertEqual(410, response.status)
+        self.assertEqual(APNSReasons.UNREGISTERED, response.reason)
+        self.assertEqual('/3/device/token1', response.path)
+
+
+class TLSSessionResumptionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        cert_path, key_path = make_certificate(self.directory)
+        self.cert_path = cert_path
+        self.server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.server_context.load_cert_chain(cert_path, key_path)
+        self.server_context.set_alpn_protocols(['h2'])
+        self.client_context = make_ssl_context()
+        self.client_context.load_verify_locations(cert_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_reconnect_resumes_session(self):
+        transport = H2Transport(ssl_context=self.client_context, timeout=5)
+        with H2TestServer(ssl_context=self.server_context) as server:
+            connection = APNSConnection(api_host=server.host, api_port=server.port, provider_token=b'token',
+                                        transport=transport)
+            for i in range(3):
+                self.assertEqual(200, connection.send_notification('token1', alert='Testing').status)
+                connection.close()
+
+        stats = transport.get_stats()
+        self.assertEqual(3, server.connections)
+        self.assertEqual(3, stats['handshakes'])
+        self.assertEqual(2, stats['resumed'])
+        self.assertAlmostEqual(2 / 3, stats['resumption_rate'])
+        self.assertTrue(stats['mean_handshake_time'] > 0)
+
+    def make_client_context(self):
+        context = make_ssl_context()
+        context.load_verify_locations(self.cert_path)
+        return context
+
+    def test_cache_shared_between_transports(self):
+        """
+        Transports with their own contexts should each resume only their own sessions from a shared cache.
+        """
+        cache = TLSSessionCache()
+        transports = [H2Transport(ssl_context=self.make_client_context(), timeout=5, session_cache=cache)
+                      for i in range(2)]
+        with H2TestServer(ssl_context=self.server_context) as server:
+            for transport in transports * 2:
+                connection = APNSConnection(api_host=server.host, api_port=server.port, provider_token=b'token',
+                                            transport=transport)
+                self.assertEqual(200, connection.send_notification('token1', alert='Testing').status)
+                connection.close()
+        self.assertEqual(4, cache.handshakes)
+        self.assertEqual(2, cache.resumed)
+
+    def test_unusable_session_falls_back_to_full_handshake(self):
+        cache = TLSSessionCache()
+        first = H2Transport(ssl_context=self.make_client_context(), timeout=5, session_cache=cache)
+        second = H2Transport(ssl_context=self.make_client_context(), timeout=5, session_cache=cache)
+        with H2TestServer(ssl_context=self.server_context) as server:
+            connection = APNSConnection(api_host=server.host, api_port=server.port, provider_token=b'token',
+                                        transport=first)
+            self.assertEqual(200, connection.send_notification('token1', alert='Testing').status)
+            connection.close()
+            # A session from another context, as a cache keyed only by host would have returned.
+            cache.set(server.host, server.port, cache.get(server.host, server.port, first.ssl_context),
+                      second.ssl_context)
+            connection = APNSConnection(api_host=server.host, api_port=server.port, provider_token=b'token',
+                                        transport=second)
+            self.assertEqual(200, connection.send_notification('token1', alert='Testing').status)
+            connection.close()
+        self.assertEqual(0, cache.resumed)
+
+    def test_session_cache_disabled(self):
+        transport = H2Transport(ssl_context=self.client_context, timeout=5, session_cache=None)
+        with H2TestServer(ssl_context=self.server_context) as server:
+            connection = APNSConnection(api_host=server.host, api_port=server.port, provider_token=b'token',
+                                        transport=transport)
+            self.assertEqual(200, connection.send_notification('token1', alert='Testing').status)
+            connection.close()
+        self.assertEqual({}, transport.get_stats())